@@ -0,0 +1,218 @@
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Achievement
+from . import live, metrics, versions
+from .stats import recent_completion_times, category_set
+from .activity import perfect_week
+
+MILESTONES = [1, 10, 50, 100, 500]
+STREAK_MILESTONES = [2, 5, 7, 30, 100]
+SPEED_MILESTONES = [5, 10]  # 5 chores in under 1 hour, 10 in under 2 hours
+VARIETY_MILESTONES = [5, 10]  # 5 and 10 unique categories
+
+
+@dataclass(frozen=True)
+class AchievementContext:
+    """What a rule predicate may look at: the user's stats, profile and the completion being handled."""
+    stats: object
+    profile: object
+    completed_at: object
+
+
+@dataclass(frozen=True)
+class AchievementRule:
+    title: str
+    description: str
+    icon: str
+    category: str
+    requirement: int
+    rarity: str
+    points: int
+    predicate: Callable[[AchievementContext], bool]
+
+    def build(self, user_id, now):
+        return Achievement(
+            user_id=user_id,
+            title=self.title,
+            description=self.description,
+            icon=self.icon,
+            category=self.category,
+            requirement=self.requirement,
+            progress=self.requirement,
+            completed=True,
+            completed_at=now,
+            rarity=self.rarity,
+            points=self.points,
+        )
+
+
+RULES = {}
+
+
+def register(rule):
+    if rule.title in RULES:
+        raise ValueError(f'Achievement rule "{rule.title}" is already registered.')
+    RULES[rule.title] = rule
+    return rule
+
+
+def evaluate(context):
+    """Return the rules whose predicate holds for the given context (no queries)."""
+    return [rule for rule in RULES.values() if rule.predicate(context)]
+
+
+def unlock_achievements(user_id, context):
+    """Persist every newly satisfied rule for a user.
+
+    One query reads the titles the user already has, one bulk insert adds the
+    new ones and, only if needed, one update completes pre-existing rows.
+    """
+    satisfied = evaluate(context)
+    if not satisfied:
+        return []
+    existing = dict(Achievement.objects.filter(user_id=user_id).values_list('title', 'completed'))
+    now = timezone.now()
+    new = [rule.build(user_id, now) for rule in satisfied if rule.title not in existing]
+    pending = [rule for rule in satisfied if existing.get(rule.title) is False]
+    if new:
+        Achievement.objects.bulk_create(new)
+    if pending:
+        Achievement.objects.filter(user_id=user_id, title__in=[rule.title for rule in pending], completed=False).update(
+            completed=True, completed_at=now, progress=F('requirement'), updated_at=now
+        )
+    if new or pending:
+        # Bulk writes skip post_save
+        versions.bump(versions.ACHIEVEMENTS, versions.user_achievements(user_id))
+        categories = [rule.category for rule in new + pending]
+        # Unlocks a rollback undoes are never counted
+        transaction.on_commit(lambda: _count_unlocks(categories))
+        live.publish(live.achievement_event(achievement) for achievement in new + [rule.build(user_id, now) for rule in pending])
+    return new
+
+
+def _count_unlocks(categories):
+    for category in categories:
+        metrics.ACHIEVEMENTS_UNLOCKED.inc(category=category)
+
+
+# --- Predicates ---
+
+def _speed(count, hours):
+    def predicate(ctx):
+        recent_times = recent_completion_times(ctx.stats)[:count]
+        if len(recent_times) < count:
+            return False
+        return (recent_times[0] - recent_times[-1]).total_seconds() / 3600.0 <= hours
+    return predicate
+
+
+def _perfect_week(ctx):
+    return perfect_week(ctx.profile, timezone.localdate(ctx.completed_at))
+
+
+# --- Registry ---
+
+for milestone in STREAK_MILESTONES:
+    register(AchievementRule(
+        title=f"{milestone}-Day Streak",
+        description=f"Completed chores {milestone} days in a row!",
+        icon="🔥",
+        category="streak",
+        requirement=milestone,
+        rarity="common" if milestone <= 5 else "rare" if milestone <= 7 else "epic" if milestone <= 30 else "legendary",
+        points=milestone * 20,
+        predicate=lambda ctx, milestone=milestone: ctx.profile.current_streak >= milestone,
+    ))
+
+for milestone in MILESTONES:
+    register(AchievementRule(
+        title=f"{milestone} Chores Completed",
+        description=f"Completed {milestone} chores!",
+        icon="🏅",
+        category="completion",
+        requirement=milestone,
+        rarity="common" if milestone <= 10 else "rare" if milestone <= 50 else "epic" if milestone <= 100 else "legendary",
+        points=milestone * 10,
+        predicate=lambda ctx, milestone=milestone: ctx.stats.total_completed >= milestone,
+    ))
+
+for milestone, hours in zip(SPEED_MILESTONES, [1, 2]):
+    register(AchievementRule(
+        title='Speed Demon' if milestone == 5 else 'Lightning Fast',
+        description=f'Complete {milestone} chores in under {hours} hour{"s" if hours > 1 else ""}',
+        icon='⚡' if milestone == 5 else '⚡⚡',
+        category='speed',
+        requirement=milestone,
+        rarity='rare' if milestone == 5 else 'epic',
+        points=milestone * 15,
+        predicate=_speed(milestone, hours),
+    ))
+
+for milestone in VARIETY_MILESTONES:
+    register(AchievementRule(
+        title='Variety Explorer' if milestone == 5 else 'Category Master',
+        description=f'Complete chores in {milestone} different categories',
+        icon='🌈' if milestone == 5 else '🎨',
+        category='variety',
+        requirement=milestone,
+        rarity='common' if milestone == 5 else 'rare',
+        points=milestone * 10,
+        predicate=lambda ctx, milestone=milestone: len(category_set(ctx.stats)) >= milestone,
+    ))
+
+# --- Special/Fun Achievements ---
+register(AchievementRule(
+    title='Perfect Week',
+    description='Complete at least one chore every day for a week.',
+    icon='✨',
+    category='special',
+    requirement=1,
+    rarity='epic',
+    points=200,
+    predicate=_perfect_week,
+))
+register(AchievementRule(
+    title='Early Bird',
+    description='Complete 5 chores before 9 AM.',
+    icon='🌅',
+    category='special',
+    requirement=5,
+    rarity='rare',
+    points=75,
+    predicate=lambda ctx: ctx.stats.early_count >= 5,
+))
+register(AchievementRule(
+    title='Night Owl',
+    description='Complete 5 chores after 8 PM.',
+    icon='🦉',
+    category='special',
+    requirement=5,
+    rarity='rare',
+    points=75,
+    predicate=lambda ctx: ctx.stats.night_count >= 5,
+))
+register(AchievementRule(
+    title='Weekend Warrior',
+    description='Complete 10 chores on weekends.',
+    icon='🏖️',
+    category='special',
+    requirement=10,
+    rarity='common',
+    points=50,
+    predicate=lambda ctx: ctx.stats.weekend_count >= 10,
+))
+register(AchievementRule(
+    title='Overdue Hero',
+    description='Complete an overdue chore.',
+    icon='🦸',
+    category='special',
+    requirement=1,
+    rarity='rare',
+    points=100,
+    predicate=lambda ctx: ctx.stats.overdue_count > 0,
+))
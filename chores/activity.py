@@ -0,0 +1,102 @@
+"""Per-user activity bitmaps.
+
+Bit i of Profile.activity_bits (little-endian) is set when the user completed
+at least one chore on activity_epoch + i days, in local time. Ten years of
+history fit in about 460 bytes, and streaks and "N of the last M days" rules
+become shifts, masks and popcounts.
+"""
+from django.utils import timezone
+
+from .models import ArchiveSegment, Chore
+
+
+def to_int(bits):
+    return int.from_bytes(bytes(bits or b''), 'little')
+
+
+def to_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def from_days(days):
+    """(epoch, packed bits) for a set of active dates."""
+    if not days:
+        return None, b''
+    epoch = min(days)
+    value = 0
+    for day in days:
+        value |= 1 << (day - epoch).days
+    return epoch, to_bytes(value)
+
+
+def mark_day(profile, day, active=True):
+    """Set or clear the bit for `day` on any object with activity_epoch/activity_bits."""
+    value, epoch = to_int(profile.activity_bits), profile.activity_epoch
+    if active:
+        if epoch is None:
+            epoch = day
+        elif day < epoch:
+            # Backdated past the start of the bitmap: move the epoch back
+            value <<= (epoch - day).days
+            epoch = day
+        value |= 1 << (day - epoch).days
+    elif epoch is not None and day >= epoch:
+        value &= ~(1 << (day - epoch).days)
+    profile.activity_epoch = epoch if value else None
+    profile.activity_bits = to_bytes(value)
+
+
+def run_ending_at(value, index):
+    """Length of the run of set bits ending at bit `index`."""
+    if index < 0:
+        return 0
+    gaps = ~value & ((1 << (index + 1)) - 1)
+    return index + 1 - gaps.bit_length()
+
+
+def longest_run(value):
+    # Each step shortens every run by one, so the number of steps is the longest run
+    length = 0
+    while value:
+        value &= value >> 1
+        length += 1
+    return length
+
+
+def streaks(profile):
+    """(current, longest) streak in days.
+
+    The current streak is the run ending at the most recent active day, as
+    before: it is only broken by the next completion after a gap.
+    """
+    value = to_int(profile.activity_bits)
+    return run_ending_at(value, value.bit_length() - 1), longest_run(value)
+
+
+def active_days_in(profile, end, days):
+    """How many of the `days` days ending at date `end` were active."""
+    if profile.activity_epoch is None:
+        return 0
+    high = (end - profile.activity_epoch).days
+    low = max(high - days + 1, 0)
+    if high < 0:
+        return 0
+    return ((to_int(profile.activity_bits) >> low) & ((1 << (high - low + 1)) - 1)).bit_count()
+
+
+def perfect_week(profile, day):
+    """Whether every day, Monday to Sunday, of the week containing `day` was active."""
+    sunday = day + timezone.timedelta(days=6 - day.weekday())
+    return active_days_in(profile, sunday, 7) == 7
+
+
+def still_active(user_id, day):
+    """Whether the user has any other completion left on `day`, live or archived."""
+    start = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()))
+    end = start + timezone.timedelta(days=1)
+    if Chore.objects.filter(assignee_id=user_id, completed_at__gte=start, completed_at__lt=end).exists():
+        return True
+    # Archived rows can't be un-completed; keep the bit if a segment may hold one of theirs
+    return ArchiveSegment.objects.filter(
+        first_completed_at__lt=end, last_completed_at__gte=start, per_user__has_key=str(user_id)
+    ).exists()
@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Chore, Achievement, Profile
+from .models import Chore, Achievement, Profile, UserStats, PushJob
 
 admin.site.register(Chore)
 admin.site.register(Achievement)
 admin.site.register(Profile)
+admin.site.register(UserStats)
+admin.site.register(PushJob)
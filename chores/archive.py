@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min, Prefetch, Sum
+from django.utils import timezone
+
+from .models import ArchiveSegment, Chore
+from .signals import coalesced_completion_changes, keeping_completion_stats
+
+ARCHIVE_DIR = Path(getattr(settings, 'ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+ARCHIVE_AFTER_DAYS = getattr(settings, 'ARCHIVE_AFTER_DAYS', 90)
+# The week and month leaderboards count live chore rows, so nothing they can see is archived
+MIN_ARCHIVE_AFTER_DAYS = 32
+BATCH_SIZE = getattr(settings, 'ARCHIVE_BATCH_SIZE', 2000)
+
+FIELDS = [
+    'id', 'title', 'description', 'assignee_id', 'due_date', 'completed_at', 'created_at', 'updated_at',
+    'is_recurring', 'recurrence_pattern', 'priority', 'category', 'series_id', 'occurrence_date',
+]
+
+
+def cutoff_for(older_than_days=None, now=None):
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    return (now or timezone.now()) - timezone.timedelta(days=max(days, MIN_ARCHIVE_AFTER_DAYS))
+
+
+def eligible(cutoff):
+    # A recurring chore that hasn't rolled over yet still carries its series forward
+    return Chore.objects.filter(completed_at__lt=cutoff).exclude(is_recurring=True, rolled_over_at__isnull=True)
+
+
+def _record(chore):
+    record = {field: getattr(chore, field) for field in FIELDS}
+    record['dependencies'] = [dependency.pk for dependency in chore.dependencies.all()]
+    return record
+
+
+def _write_segment(rows, name):
+    """Write rows as gzip NDJSON; returns (path, raw bytes, compressed bytes, sha256)."""
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = ARCHIVE_DIR / name
+    partial = path.with_name(path.name + '.partial')
+    raw_bytes = 0
+    with gzip.open(partial, 'wb') as out:
+        for row in rows:
+            line = json.dumps(_record(row), cls=DjangoJSONEncoder, separators=(',', ':')).encode() + b'\n'
+            raw_bytes += len(line)
+            out.write(line)
+    with open(partial, 'rb') as written:
+        os.fsync(written.fileno())
+        digest = hashlib.file_digest(written, 'sha256').hexdigest()
+    os.replace(partial, path)
+    return path, raw_bytes, path.stat().st_size, digest
+
+
+def read_segment(segment):
+    """Yield the archived chores of a segment as dicts."""
+    with gzip.open(ARCHIVE_DIR / segment.path, 'rt') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def archive_completed(older_than_days=None, batch_size=BATCH_SIZE, now=None):
+    """Move completed chores older than the cutoff into gzip NDJSON segments.
+
+    Each batch is one bounded transaction: lock the oldest completed rows,
+    write them to a segment file, record the segment and delete the rows.
+    Deletions go through the regular signals, coalesced, so tombstones and
+    dependency flags follow, but per-user stats are kept: the completions
+    still count for badges, streaks and the all-time leaderboard.
+    Returns the segments written.
+    """
+    now = now or timezone.now()
+    cutoff = cutoff_for(older_than_days, now)
+    segments = []
+    while True:
+        path = None
+        try:
+            with transaction.atomic(), coalesced_completion_changes(), keeping_completion_stats():
+                rows = list(
+                    eligible(cutoff).select_for_update(skip_locked=True)
+                    .prefetch_related(Prefetch('dependencies', queryset=Chore.objects.only('id')))
+                    .order_by('completed_at', 'id')[:batch_size]
+                )
+                if not rows:
+                    break
+                path, raw_bytes, compressed_bytes, digest = _write_segment(rows, f'chores-{now:%Y%m%dT%H%M%S}-{rows[0].pk}.ndjson.gz')
+                segment = ArchiveSegment.objects.create(
+                    path=path.name,
+                    chore_count=len(rows),
+                    first_completed_at=rows[0].completed_at,
+                    last_completed_at=rows[-1].completed_at,
+                    raw_bytes=raw_bytes,
+                    compressed_bytes=compressed_bytes,
+                    sha256=digest,
+                    per_user={str(user_id): count for user_id, count in Counter(row.assignee_id for row in rows if row.assignee_id).items()},
+                )
+                Chore.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        except BaseException:
+            # The rows stay in the table, so the file must not outlive the transaction
+            if path is not None:
+                path.unlink(missing_ok=True)
+            raise
+        segments.append(segment)
+    return segments
+
+
+def archive_stats(user=None, now=None):
+    totals = ArchiveSegment.objects.aggregate(
+        segments=Count('id'),
+        archived_chores=Sum('chore_count'),
+        raw_bytes=Sum('raw_bytes'),
+        compressed_bytes=Sum('compressed_bytes'),
+        oldest_completed_at=Min('first_completed_at'),
+        newest_completed_at=Max('last_completed_at'),
+        last_archived_at=Max('created_at'),
+    )
+    for key in ('archived_chores', 'raw_bytes', 'compressed_bytes'):
+        totals[key] = totals[key] or 0
+    # Serialized size minus file size. Not disk space freed: SQLite keeps the
+    # deleted rows' pages in its free list until the database is vacuumed
+    totals['compression_savings_bytes'] = totals['raw_bytes'] - totals['compressed_bytes']
+    totals['compression_ratio'] = round(totals['raw_bytes'] / totals['compressed_bytes'], 2) if totals['compressed_bytes'] else None
+    totals['archive_after_days'] = max(ARCHIVE_AFTER_DAYS, MIN_ARCHIVE_AFTER_DAYS)
+    totals['eligible_chores'] = eligible(cutoff_for(now=now)).count()
+    if user is not None:
+        key = str(user.pk)
+        totals['my_archived_chores'] = sum(per_user.get(key, 0) for per_user in ArchiveSegment.objects.values_list('per_user', flat=True))
+    return totals
@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# Ahead of the router, so these URLs resolve to the async views first
+urlpatterns = [
+    path('chores/', async_views.chore_list, name='chore-list'),
+    path('achievements/', async_views.achievement_list, name='achievement-list'),
+    path('profiles/me/', async_views.profile_me, name='profile-me'),
+    path('profiles/leaderboard/', async_views.profile_leaderboard, name='profile-leaderboard'),
+    path('events/', async_views.live_events, name='live-events'),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,173 @@
+"""Async versions of the hottest read endpoints, for the ASGI deployment.
+
+With ASYNC_READ_VIEWS on (the default under asgi.py), chores/async_urls.py
+routes GETs of the chore list, profiles/me, the leaderboard and the
+achievement list here. They authenticate the JWT and read through the async
+ORM, so a request waiting on the database doesn't hold a worker thread.
+Responses, ETags and 304s are the same as the DRF viewsets' (JSON only, no
+browsable API). Every other method is handed to the viewset itself.
+
+The live event stream (/api/events/) only exists here, since each open
+stream would hold a whole thread under WSGI.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .authentication import acached_user, aprofile_of
+from .models import Achievement
+from .filters import filter_chores
+from .pagination import KeysetCursorPagination
+from .serializers import AchievementSerializer, ChoreSerializer, ProfileSerializer
+from .views import AchievementViewSet, ChoreViewSet, ProfileViewSet, leaderboard_payload
+from . import leaderboard, live, versions
+
+_jwt = JWTAuthentication()
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+async def authenticate(request, query_token=False):
+    """The active user behind the request's JWT, like CachedJWTAuthentication but through the async ORM.
+
+    With `query_token`, a ?token= parameter is accepted too, for clients
+    that can't set headers (EventSource).
+    """
+    header = _jwt.get_header(request)
+    raw_token = _jwt.get_raw_token(header) if header is not None else None
+    if raw_token is None and query_token and request.GET.get('token'):
+        raw_token = request.GET['token'].encode()
+    if raw_token is None:
+        raise NotAuthenticated()
+    return await acached_user(_jwt.get_validated_token(raw_token))
+
+
+def error_response(request, exc):
+    # Same bodies and headers as DRF's exception handler
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    response = render(detail, exc.status_code)
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        response['WWW-Authenticate'] = _jwt.authenticate_header(request)
+    return response
+
+
+def async_read(viewset, actions):
+    """Serve GETs with the decorated coroutine and everything else with `viewset`.
+
+    The coroutine gets a DRF Request (for query_params and serializer
+    context) whose user is already authenticated. The view carries the
+    viewset and actions, so metrics label it like the router's view.
+    """
+    fallback = sync_to_async(viewset.as_view(actions))
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await fallback(request, *args, **kwargs)
+            try:
+                user = await authenticate(request)
+                drf_request = Request(request)
+                drf_request.user = user
+                return await handler(drf_request, *args, **kwargs)
+            except APIException as exc:
+                return error_response(request, exc)
+
+        view.cls = viewset
+        view.actions = actions
+        return view
+    return decorator
+
+
+async def conditional_get(request, scopes, handler):
+    """ConditionalGetMixin.conditional_get() for the async views."""
+    etag = await versions.aetag_for(request, request.user, scopes)
+    if versions.not_modified(request, etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = await handler()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    return versions.mark_conditional(response, etag)
+
+
+@async_read(ChoreViewSet, {'get': 'list', 'post': 'create'})
+async def chore_list(request):
+    async def page():
+        queryset = filter_chores(ChoreViewSet.queryset.all(), request.query_params, request.user)
+        paginator = KeysetCursorPagination()
+        rows = await paginator.apaginate_queryset(queryset, request)
+        data = ChoreSerializer(rows, many=True, context={'request': request}).data
+        return render({'next': paginator.get_next_link(), 'results': data})
+    return await conditional_get(request, [versions.CHORES], page)
+
+
+@async_read(ProfileViewSet, {'get': 'me'})
+async def profile_me(request):
+    async def me():
+        profile = await aprofile_of(request.user, request.data_versions.get(versions.PROFILES))
+        if profile is None:
+            return render({'detail': 'Profile not found.'}, status.HTTP_404_NOT_FOUND)
+        return render(ProfileSerializer(profile, context={'request': request}).data)
+    return await conditional_get(request, [versions.PROFILES], me)
+
+
+@async_read(ProfileViewSet, {'get': 'leaderboard'})
+async def profile_leaderboard(request):
+    window = request.query_params.get('window', leaderboard.DEFAULT_WINDOW)
+    if window not in leaderboard.WINDOWS:
+        return render({'detail': f'Unknown window. Use one of: {", ".join(leaderboard.WINDOWS)}.'}, status.HTTP_400_BAD_REQUEST)
+    board = await leaderboard.aget_board(window, getattr(request.user, 'data_versions', None))
+    try:
+        return render(leaderboard_payload(request, window, board))
+    except ValueError:
+        return render({'detail': 'page and page_size must be integers.'}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_read(AchievementViewSet, {'get': 'list', 'post': 'create'})
+async def achievement_list(request):
+    # The web client asks for ?user=<id> to get one user's badges
+    user_id = request.query_params.get('user', '')
+    queryset = Achievement.objects.select_related('user')
+    scopes = [versions.ACHIEVEMENTS]
+    if user_id.isdigit():
+        queryset = queryset.filter(user_id=int(user_id))
+        scopes = [versions.user_achievements(int(user_id))]
+
+    async def achievements():
+        rows = [achievement async for achievement in queryset]
+        return render(AchievementSerializer(rows, many=True, context={'request': request}).data)
+    return await conditional_get(request, scopes, achievements)
+
+
+@csrf_exempt
+async def live_events(request):
+    """Server-Sent Events of chore changes and badge unlocks (see chores.live).
+
+    Browsers resume with the Last-Event-ID header on their own; other
+    clients can pass ?last_event_id=.
+    """
+    if request.method != 'GET':
+        return render({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        user = await authenticate(request, query_token=True)
+    except APIException as exc:
+        return error_response(request, exc)
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_id is not None and not last_id.isdigit():
+        return render({'detail': 'Last-Event-ID must be an event id.'}, status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(live.stream(user, int(last_id) if last_id else None), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,211 @@
+"""JWT authentication that remembers who each token belongs to.
+
+Access tokens live for a day, so resolving the same token to the same user
+row on every request is wasted work. CachedJWTAuthentication keeps the user,
+with their profile joined in, in a bounded per-process LRU keyed by the
+token's jti, for at most AUTH_CACHE_TTL_SECONDS and never past the token's
+expiry. Each entry is stamped with the user's account data version (see
+versions.user_account), which every save or delete of the user or their
+profile bumps, so a deactivation or password change made in any process takes effect everywhere
+on the next request. A hit reads that version together with the household
+versions, which the request's ETag then uses, so it costs the one query a
+conditional GET made anyway. Raw queryset .update() calls bypass the bump.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import DataVersion, Profile
+from . import versions
+
+CACHE_SIZE = getattr(settings, 'AUTH_CACHE_SIZE', 10000)
+CACHE_TTL_SECONDS = getattr(settings, 'AUTH_CACHE_TTL_SECONDS', 60)
+
+
+class UserCache:
+    """LRU of token key -> user, with a TTL per entry. Thread-safe.
+
+    Entries remember the generation (the user's account data version) they
+    were filled under; a lookup under any other generation is a miss, so
+    invalidation is a bump of the shared version rather than a hunt for the
+    user's entries in every process.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, filled_under, expires = entry
+            if expires <= now or filled_under != generation:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Requests may set attributes on their user; give each its own
+        return copy.copy(user)
+
+    def put(self, key, user, generation, lifetime=None):
+        """Remember `user`, loaded under `generation` (read in the same query that loaded it)."""
+        ttl = self.ttl if lifetime is None else min(self.ttl, lifetime)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (user, generation, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        # Lets callers skip reading the generation when there is nothing to check it against
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def token_key(validated_token):
+    jti = validated_token.get(api_settings.JTI_CLAIM)
+    return jti if jti else hashlib.sha256(bytes(validated_token.token)).hexdigest()
+
+
+def token_lifetime(validated_token):
+    exp = validated_token.get('exp')
+    return exp - time.time() if exp else None
+
+
+def user_id_of(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError as e:
+        raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+
+def _version(scope):
+    return Coalesce(Subquery(DataVersion.objects.filter(scope=scope).values('version')[:1]), 0)
+
+
+def user_queryset(user_id):
+    # The profile comes along in the same query, stamped with the profiles
+    # data version it was read at, so profile_of() can tell if it's current;
+    # the account version is what the cache entry is filled under
+    return User.objects.select_related('profile').annotate(
+        profiles_version=_version(versions.PROFILES),
+        account_version=_version(versions.user_account(user_id)),
+    ).filter(**{api_settings.USER_ID_FIELD: user_id})
+
+
+def check_user(user, validated_token):
+    """The checks JWTAuthentication.get_user() makes on the user it loaded."""
+    if user is None:
+        raise AuthenticationFailed(_("User not found"), code="user_not_found")
+    if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+    if api_settings.CHECK_REVOKE_TOKEN:
+        if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+    return user
+
+
+def _with_versions(user, known):
+    # Read before the user, so the request's ETag can be built from them too
+    if user is not None and known is not None:
+        user.data_versions = known
+    return user
+
+
+def cached_user(validated_token):
+    """The user for a validated token: a version read and the cache, or one query."""
+    key = token_key(validated_token)
+    user_id = user_id_of(validated_token)
+    user = known = None
+    if key in user_cache:
+        # The account version decides whether the entry is still good
+        scopes = versions.user_scopes(user_id)
+        known = dict(zip(scopes, versions.current(scopes)))
+        user = user_cache.get(key, known[versions.user_account(user_id)])
+    if user is None:
+        user = user_queryset(user_id).first()
+        if user is not None:
+            user_cache.put(key, user, user.account_version, token_lifetime(validated_token))
+            user = copy.copy(user)
+    return check_user(_with_versions(user, known), validated_token)
+
+
+async def acached_user(validated_token):
+    """cached_user() for the async views, through the async ORM."""
+    key = token_key(validated_token)
+    user_id = user_id_of(validated_token)
+    user = known = None
+    if key in user_cache:
+        # The account version decides whether the entry is still good
+        scopes = versions.user_scopes(user_id)
+        known = dict(zip(scopes, await versions.acurrent(scopes)))
+        user = user_cache.get(key, known[versions.user_account(user_id)])
+    if user is None:
+        user = await user_queryset(user_id).afirst()
+        if user is not None:
+            user_cache.put(key, user, user.account_version, token_lifetime(validated_token))
+            user = copy.copy(user)
+    return check_user(_with_versions(user, known), validated_token)
+
+
+def _has_current_profile(user, profiles_version):
+    return profiles_version is not None and getattr(user, 'profiles_version', None) == profiles_version
+
+
+def _joined_profile(user):
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        return None
+
+
+def profile_of(user, profiles_version=None):
+    """The user's profile.
+
+    Pass the current PROFILES data version (views behind ConditionalGetMixin
+    have it in request.data_versions): while it matches the one the profile
+    joined in by authentication was read at, that profile is returned
+    without a query.
+    """
+    if _has_current_profile(user, profiles_version):
+        return _joined_profile(user)
+    return Profile.objects.select_related('user').filter(user=user).first()
+
+
+async def aprofile_of(user, profiles_version=None):
+    """profile_of() for the async views."""
+    if _has_current_profile(user, profiles_version):
+        return _joined_profile(user)
+    return await Profile.objects.select_related('user').filter(user=user).afirst()
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication backed by the per-process user cache."""
+
+    def get_user(self, validated_token):
+        return cached_user(validated_token)
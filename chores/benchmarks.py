@@ -0,0 +1,377 @@
+"""Latency and query-count benchmarks for the hot API paths.
+
+Each scenario issues real requests through the URL conf, authenticated with
+a JWT like the web client, against a generated dataset. Query counts are
+compared exactly against the budgets in benchmark_budgets.json; latencies
+get the file's relative tolerance plus a few milliseconds of absolute slack
+on top, since they depend on the machine and sub-millisecond timings jitter.
+"""
+import asyncio
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import Chore, Profile, PushSubscription
+from .recompute import apply_results, finish, recompute_range, user_ranges
+from .rollups import rebuild
+from .synthetic import generate
+from . import graph as dependency_graph
+
+BUDGET_FILE = Path(__file__).with_name('benchmark_budgets.json')
+DEVICES = 4
+
+
+def _device_endpoint(user, index):
+    return f'https://push.example.com/bench/{user.pk}/{index}'
+
+
+def _list_chores(client, user, fixtures):
+    return client.get('/api/chores/')
+
+
+def _complete_chore(client, user, fixtures):
+    chore_id = next(fixtures['pending'])
+    return client.patch(f'/api/chores/{chore_id}/', {'completed_at': timezone.now().isoformat()}, format='json')
+
+
+def _leaderboard(client, user, fixtures):
+    return client.get('/api/profiles/leaderboard/')
+
+
+def _me(client, user, fixtures):
+    return client.get('/api/profiles/me/')
+
+
+def _bootstrap(client, user, fixtures):
+    return client.get('/api/bootstrap/')
+
+
+def _upsert_push_subscription(client, user, fixtures):
+    # The client re-registers on every app start, so the common case is an existing device
+    i = next(fixtures['devices'])
+    return client.post('/api/push-subscriptions/', {
+        'endpoint': _device_endpoint(user, i % DEVICES),
+        'keys': {'p256dh': f'key-{i}', 'auth': f'auth-{i}'},
+    }, format='json')
+
+
+SCENARIOS = {
+    'chores.list': _list_chores,
+    'chores.complete': _complete_chore,
+    'profiles.leaderboard': _leaderboard,
+    'profiles.me': _me,
+    'push_subscriptions.upsert': _upsert_push_subscription,
+    'bootstrap': _bootstrap,
+}
+
+
+def load_budgets(path=BUDGET_FILE):
+    with open(path) as budget_file:
+        return json.load(budget_file)
+
+
+def write_budgets(results, budgets, path=BUDGET_FILE):
+    budgets = dict(budgets, endpoints={
+        name: {'queries': result['queries'], 'p50_ms': result['p50_ms'], 'p95_ms': result['p95_ms']}
+        for name, result in sorted(results.items())
+    })
+    with open(path, 'w') as budget_file:
+        json.dump(budgets, budget_file, indent=2)
+        budget_file.write('\n')
+
+
+def build_dataset(users, chores_per_user, seed=0, **distribution):
+    """Generate the dataset and derive stats, badges and rollups inline; returns the user to benchmark as."""
+    generate(users, chores_per_user, seed=seed, prefix='bench', **distribution)
+    changed = {}
+    for low, high in user_ranges(1):
+        changed.update(apply_results(recompute_range(low, high)))
+    finish(changed)
+    rebuild()
+    # The busiest member, so list pages are full and there is plenty left to complete
+    return Profile.objects.filter(user__username__startswith=f'bench-{seed}-', role='member').order_by('-current_streak', 'user_id').first().user
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _completable(user, needed):
+    graph = dependency_graph.load()
+    blocked = dependency_graph.blocked_ids(graph)
+    pending = Chore.objects.filter(assignee=user, completed_at__isnull=True, is_recurring=False).order_by('id').values_list('id', flat=True)
+    ready = [pk for pk in pending if pk not in blocked]
+    if len(ready) < needed:
+        raise ValueError(f'Only {len(ready)} completable chores for {user.username}; generate a bigger dataset or run fewer iterations.')
+    return iter(ready)
+
+
+def run(user, iterations=50, warmup=5, names=None):
+    """Time every scenario; returns {name: {'p50_ms', 'p95_ms', 'queries', 'iterations'}}.
+
+    `queries` is the most any single request issued.
+    """
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    fixtures = {'pending': _completable(user, iterations + warmup), 'devices': count()}
+    for index in range(DEVICES):
+        PushSubscription.objects.get_or_create(user=user, endpoint=_device_endpoint(user, index), defaults={'p256dh': 'key', 'auth': 'auth'})
+    results = {}
+    for name in names or SCENARIOS:
+        scenario = SCENARIOS[name]
+        timings, queries = [], 0
+        for i in range(warmup + iterations):
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = scenario(client, user, fixtures)
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise AssertionError(f'{name}: HTTP {response.status_code}: {response.content[:200]!r}')
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries = max(queries, len(ctx.captured_queries))
+        results[name] = {
+            'p50_ms': round(_percentile(timings, 0.5), 2),
+            'p95_ms': round(_percentile(timings, 0.95), 2),
+            'queries': queries,
+            'iterations': iterations,
+        }
+    return results
+
+
+def check(results, budgets, latency=True):
+    """Return a description of every budget the results exceed."""
+    tolerance, slack = budgets.get('tolerance', 0.5), budgets.get('slack_ms', 5)
+    regressions = []
+    for name, result in results.items():
+        budget = budgets['endpoints'].get(name)
+        if budget is None:
+            regressions.append(f'{name}: no budget; run the benchmark with --update-budgets')
+            continue
+        if result['queries'] > budget['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, budget {budget['queries']}")
+        if not latency:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            limit = budget[key] * (1 + tolerance) + slack
+            if result[key] > limit:
+                regressions.append(f'{name}: {key} {result[key]:.2f}, budget {budget[key]:.2f} (limit {limit:.2f})')
+    return regressions
+
+
+# Throughput under concurrency: a closed loop of clients against an in-process
+# WSGI handler (on a fixed pool of worker threads, like a threaded WSGI
+# server) or ASGI handler (on one event loop, like an ASGI server)
+
+HOST = 'testserver'
+
+
+def concurrency_paths(user):
+    return ['/api/chores/', '/api/profiles/me/', '/api/profiles/leaderboard/', f'/api/achievements/?user={user.pk}']
+
+
+def _wsgi_request(handler, path, token, method='GET', data=None):
+    path, _, query = path.partition('?')
+    body = json.dumps(data).encode() if data is not None else b''
+    environ = {
+        'REQUEST_METHOD': method, 'SCRIPT_NAME': '', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+        'HTTP_AUTHORIZATION': f'Bearer {token}', 'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    status = []
+    body = handler(environ, lambda code, headers, exc_info=None: status.append(int(code.split()[0])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        getattr(body, 'close', lambda: None)()
+    return status[0]
+
+
+async def _asgi_request(handler, path, token):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+    }
+    done, status, received = asyncio.Event(), [], []
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Like a client that keeps the connection open until it has the response
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    try:
+        await handler(scope, receive, send)
+    finally:
+        done.set()
+    return status[0]
+
+
+async def _closed_loop(request, paths, concurrency, total):
+    """`concurrency` clients each sending their next request as soon as the last one answers."""
+    samples = {path: [] for path in paths}
+    errors = {path: 0 for path in paths}
+    issued = count()
+
+    async def client():
+        while (n := next(issued)) < total:
+            path = paths[n % len(paths)]
+            started = time.perf_counter()
+            code = await request(path)
+            samples[path].append((time.perf_counter() - started) * 1000)
+            if code >= 400:
+                errors[path] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - started
+
+
+def _latencies(samples):
+    return {
+        'requests': len(samples),
+        'p50_ms': round(_percentile(samples, 0.5), 2),
+        'p95_ms': round(_percentile(samples, 0.95), 2),
+        'p99_ms': round(_percentile(samples, 0.99), 2),
+    }
+
+
+def load_test(mode, user, concurrency=64, total=2000, threads=8, paths=None):
+    """Drive `total` GETs over the hot read paths through the WSGI or ASGI handler.
+
+    Returns throughput and latency percentiles, overall and per path.
+    """
+    paths = paths or concurrency_paths(user)
+    token = str(AccessToken.for_user(user))
+    if mode == 'wsgi':
+        handler, pool = WSGIHandler(), ThreadPoolExecutor(max_workers=threads)
+
+        async def request(path):
+            return await asyncio.get_running_loop().run_in_executor(pool, _wsgi_request, handler, path, token)
+    else:
+        handler, pool = ASGIHandler(), None
+
+        async def request(path):
+            return await _asgi_request(handler, path, token)
+
+    async def measure():
+        # Warm caches and connections first, so both modes start from the same place
+        for path in paths:
+            await request(path)
+        return await _closed_loop(request, paths, concurrency, total)
+
+    try:
+        samples, errors, elapsed = asyncio.run(measure())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    everything = [sample for path in paths for sample in samples[path]]
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'threads': threads if mode == 'wsgi' else None,
+        'elapsed_s': round(elapsed, 3),
+        'throughput': round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        'errors': sum(errors.values()),
+        'overall': _latencies(everything),
+        'paths': {path: dict(_latencies(samples[path]), errors=errors[path]) for path in paths},
+    }
+
+
+# Concurrent writes: threads completing chores at the same time, each request
+# on its own database connection, like the workers of a threaded WSGI server
+
+
+def writer_users(writers, completions):
+    """`writers` dataset members with at least `completions` completable chores each."""
+    users = []
+    for profile in Profile.objects.filter(role='member').select_related('user').order_by('-current_streak', 'user_id'):
+        try:
+            _completable(profile.user, completions)
+        except ValueError:
+            continue
+        users.append(profile.user)
+        if len(users) == writers:
+            return users
+    raise ValueError(f'Only {len(users)} members with {completions} completable chores; generate a bigger dataset.')
+
+
+def write_test(users, completions):
+    """Have one thread per user complete `completions` of their chores back to back.
+
+    Returns throughput and latency percentiles, failed requests, and how many
+    of the failures were SQLite lock errors.
+    """
+    handler = WSGIHandler()
+    locked = []
+
+    def record_lock_error(sender, **kwargs):
+        # Sent from inside the handler's except block
+        error = sys.exc_info()[1]
+        if isinstance(error, OperationalError) and 'locked' in str(error):
+            locked.append(error)
+
+    def writer(user, chore_ids):
+        token = str(AccessToken.for_user(user))
+        samples, failed = [], 0
+        try:
+            for chore_id in chore_ids:
+                started = time.perf_counter()
+                code = _wsgi_request(handler, f'/api/chores/{chore_id}/', token, 'PATCH', {'completed_at': timezone.now().isoformat()})
+                samples.append((time.perf_counter() - started) * 1000)
+                failed += code >= 400
+        finally:
+            connections.close_all()
+        return samples, failed
+
+    work = []
+    for user in users:
+        ready = _completable(user, completions)
+        work.append((user, [next(ready) for _ in range(completions)]))
+    got_request_exception.connect(record_lock_error)
+    try:
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            started = time.perf_counter()
+            outcomes = list(pool.map(lambda args: writer(*args), work))
+            elapsed = time.perf_counter() - started
+    finally:
+        got_request_exception.disconnect(record_lock_error)
+    everything = [sample for samples, _ in outcomes for sample in samples]
+    return {
+        'writers': len(users),
+        'completions': len(everything),
+        'elapsed_s': round(elapsed, 3),
+        'throughput': round(len(everything) / elapsed, 1) if elapsed else 0.0,
+        'errors': sum(failed for _, failed in outcomes),
+        'lock_errors': len(locked),
+        'overall': _latencies(everything),
+    }
@@ -0,0 +1,56 @@
+"""Everything the app needs on launch, in one response (/api/bootstrap/).
+
+The payload is built from a fixed set of queries however big the household
+is: the caller's open chores, their recent completions, the dependency ids
+of both, their unlocked badges and the household's users, plus the profile
+and leaderboard when the auth cache and leaderboard cache can't answer.
+It depends only on the CHORES, PROFILES, LEADERBOARD and caller's
+achievement versions, so a client relaunching with the ETag it got last
+time gets a 304 from the version table alone until one of them moves.
+"""
+from django.contrib.auth.models import User
+from django.db.models import F, Prefetch, prefetch_related_objects
+
+from .authentication import profile_of
+from .models import Achievement, Chore
+from .serializers import AchievementSerializer, ChoreSerializer, ProfileSerializer, UserSerializer
+from . import leaderboard, versions
+
+OPEN_CHORES_LIMIT = 200
+RECENT_COMPLETIONS_LIMIT = 20
+
+
+def version_scopes(user):
+    return [versions.CHORES, versions.PROFILES, versions.LEADERBOARD, versions.user_achievements(user.pk)]
+
+
+def _chores(user):
+    # Both lists walk chore_assignee_done_idx; one prefetch fills in the dependencies of both
+    mine = Chore.objects.select_related('assignee').filter(assignee_id=user.pk)
+    # One row past the limit tells whether the client should page through /api/chores/ for the rest
+    open_chores = list(mine.filter(completed_at__isnull=True).order_by(F('due_date').asc(nulls_last=True), 'id')[:OPEN_CHORES_LIMIT + 1])
+    recent = list(mine.filter(completed_at__isnull=False).order_by('-completed_at', '-id')[:RECENT_COMPLETIONS_LIMIT])
+    truncated = len(open_chores) > OPEN_CHORES_LIMIT
+    open_chores = open_chores[:OPEN_CHORES_LIMIT]
+    prefetch_related_objects(open_chores + recent, Prefetch('dependencies', queryset=Chore.objects.only('id')))
+    return open_chores, truncated, recent
+
+
+def build(user, data_versions, context=None):
+    """The bootstrap payload for `user`, read at `data_versions` (scope -> version)."""
+    open_chores, truncated, recent = _chores(user)
+    profile = profile_of(user, data_versions.get(versions.PROFILES))
+    rank = leaderboard.rank_of(leaderboard.DEFAULT_WINDOW, user.pk, leaderboard.get_board(leaderboard.DEFAULT_WINDOW, data_versions))
+    return {
+        'profile': ProfileSerializer(profile, context=context).data if profile else None,
+        'open_chores': ChoreSerializer(open_chores, many=True, context=context).data,
+        'open_chores_truncated': truncated,
+        'recent_completions': ChoreSerializer(recent, many=True, context=context).data,
+        'achievements': AchievementSerializer(
+            Achievement.objects.select_related('user').filter(user_id=user.pk, completed=True).order_by('-completed_at', 'id'),
+            many=True, context=context,
+        ).data,
+        'users': UserSerializer(User.objects.order_by('id'), many=True, context=context).data,
+        'leaderboard': dict(rank, window=leaderboard.DEFAULT_WINDOW) if rank else None,
+    }
+
@@ -0,0 +1,233 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Chore, Profile
+from .push import notify_users
+from .serializers import ChoreSerializer
+from . import graph as dependency_graph, live, rollups, versions
+from .signals import coalesced_completion_changes, record_completion_changes, record_dependency_change, record_live_events, record_rollup_changes
+from .stats import chore_completion_changes
+
+DependencyEdge = Chore.dependencies.through
+
+
+def run_bulk_operation(action, ids=None, chores=None, assignee_id=None, completed_at=None):
+    """Apply one bulk action in a single transaction.
+
+    Rows are written with bulk_create/bulk_update, and stats, badges and push
+    notifications are produced once per affected user, not once per chore.
+    Returns the affected chore ids.
+    """
+    with transaction.atomic(), coalesced_completion_changes():
+        if action == 'create':
+            return _create(chores)
+        if action == 'update':
+            return _update(chores)
+        if action == 'delete':
+            return _delete(ids)
+        loaded = _load(ids)
+        if action == 'complete':
+            return _complete(loaded, completed_at or timezone.now())
+        return _reassign(loaded, assignee_id)
+
+
+def _load(ids):
+    chores = Chore.objects.select_for_update().in_bulk(ids)
+    missing = sorted(set(ids) - set(chores))
+    if missing:
+        raise ValidationError({'ids': f'Unknown chore ids: {missing}'})
+    return [chores[pk] for pk in dict.fromkeys(ids)]
+
+
+def _save(chores, fields):
+    """bulk_update the given fields and feed the completion diffs to the signal pipeline."""
+    if not chores:
+        return
+    now = timezone.now()
+    changes = []
+    for chore in chores:
+        chore.updated_at = now
+        current = chore.completion_state()
+        previous = getattr(chore, '_completion_snapshot', None)
+        changes.extend(chore_completion_changes(previous, current))
+        record_rollup_changes(rollups.chore_deltas(previous, current))
+        record_live_events(live.chore_events(chore, previous, current))
+        chore._completion_snapshot = current
+    Chore.objects.bulk_update(chores, sorted(set(fields) | {'updated_at'}))
+    versions.bump(versions.CHORES)
+    record_completion_changes(changes)
+
+
+def _set_dependencies(dependencies_by_chore, replace=False):
+    changed = {dependency.pk for dependencies in dependencies_by_chore.values() for dependency in dependencies}
+    if replace and dependencies_by_chore:
+        removed = DependencyEdge.objects.filter(from_chore_id__in=list(dependencies_by_chore))
+        changed.update(removed.values_list('to_chore_id', flat=True))
+        removed.delete()
+    DependencyEdge.objects.bulk_create([
+        DependencyEdge(from_chore_id=chore_id, to_chore_id=dependency.pk)
+        for chore_id, dependencies in dependencies_by_chore.items()
+        for dependency in dependencies
+    ])
+    if changed:
+        record_dependency_change(changed)
+
+
+def _preloaded(items):
+    """Load every user and chore referenced by the items in two queries, for the serializers."""
+    def ids(values):
+        return {value for value in values if isinstance(value, int) and not isinstance(value, bool)}
+    user_ids = ids(item.get('assignee_id') for item in items)
+    chore_ids = ids(pk for item in items for pk in (item.get('dependencies') or []))
+    return {'preloaded': {
+        User: User.objects.in_bulk(user_ids) if user_ids else {},
+        Chore: Chore.objects.only('id').in_bulk(chore_ids) if chore_ids else {},
+    }}
+
+
+def _create(items):
+    serializer = ChoreSerializer(data=items, many=True, context=_preloaded(items))
+    serializer.is_valid(raise_exception=True)
+    chores, dependencies = [], []
+    for attrs in serializer.validated_data:
+        attrs = dict(attrs)
+        dependencies.append(attrs.pop('dependencies', []))
+        chores.append(Chore(**attrs))
+    dependency_graph.check_completable({
+        f'chores[{index}]': [dependency.pk for dependency in deps]
+        for index, (chore, deps) in enumerate(zip(chores, dependencies)) if chore.completed_at and deps
+    })
+    Chore.objects.bulk_create(chores)
+    versions.bump(versions.CHORES)
+    _set_dependencies({chore.pk: deps for chore, deps in zip(chores, dependencies) if deps})
+    changes = []
+    for chore in chores:
+        chore._completion_snapshot = chore.completion_state()
+        changes.extend(chore_completion_changes(None, chore._completion_snapshot))
+        record_rollup_changes(rollups.chore_deltas(None, chore._completion_snapshot))
+        record_live_events(live.chore_events(chore, None, chore._completion_snapshot))
+    record_completion_changes(changes)
+    _notify_assigned(chores)
+    _notify_completed([chore for chore in chores if chore.completed_at])
+    return [chore.pk for chore in chores]
+
+
+def _update(items):
+    chores = {chore.pk: chore for chore in _load([item['id'] for item in items])}
+    fields, dependencies, errors = set(), {}, {}
+    context = _preloaded(items)
+    was_completed = {pk for pk, chore in chores.items() if chore.completed_at}
+    previous_assignees = {pk: chore.assignee_id for pk, chore in chores.items()}
+    for item in items:
+        chore = chores[item['id']]
+        serializer = ChoreSerializer(chore, data={k: v for k, v in item.items() if k != 'id'}, partial=True, context=context)
+        if not serializer.is_valid():
+            errors[chore.pk] = serializer.errors
+            continue
+        for attr, value in serializer.validated_data.items():
+            if attr == 'dependencies':
+                dependencies[chore.pk] = value
+                continue
+            setattr(chore, attr, value)
+            fields.add(attr)
+    if errors:
+        raise ValidationError({'chores': errors})
+    _check_dependencies(chores, dependencies, was_completed)
+    _save(list(chores.values()), fields)
+    _set_dependencies(dependencies, replace=True)
+    _notify_assigned([chore for pk, chore in chores.items() if chore.assignee_id and chore.assignee_id != previous_assignees[pk]])
+    _notify_completed([chore for pk, chore in chores.items() if chore.completed_at and pk not in was_completed])
+    return list(chores)
+
+
+def _check_dependencies(chores, dependencies, was_completed):
+    completing = {pk for pk, chore in chores.items() if chore.completed_at and pk not in was_completed}
+    if not dependencies and not completing:
+        return
+    graph = dependency_graph.load()
+    if dependencies:
+        dependency_graph.check_acyclic({pk: [d.pk for d in deps] for pk, deps in dependencies.items()}, graph)
+    dependency_graph.check_completable({
+        pk: [d.pk for d in dependencies[pk]] if pk in dependencies else graph.dependencies_of(pk)
+        for pk in completing
+    }, completing)
+
+
+def _complete(chores, completed_at):
+    newly_completed = [chore for chore in chores if not chore.completed_at]
+    if newly_completed:
+        graph = dependency_graph.load()
+        completing = {chore.pk for chore in newly_completed}
+        dependency_graph.check_completable({pk: graph.dependencies_of(pk) for pk in completing}, completing)
+    for chore in newly_completed:
+        chore.completed_at = completed_at
+    _save(newly_completed, ['completed_at'])
+    _notify_completed(newly_completed)
+    return [chore.pk for chore in chores]
+
+
+def _reassign(chores, assignee):
+    assignee_id = assignee.pk if assignee else None
+    moved = [chore for chore in chores if chore.assignee_id != assignee_id]
+    for chore in moved:
+        chore.assignee_id = assignee_id
+    _save(moved, ['assignee'])
+    _notify_assigned(moved)
+    return [chore.pk for chore in chores]
+
+
+def _delete(ids):
+    deleted = list(Chore.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    missing = sorted(set(ids) - set(deleted))
+    if missing:
+        raise ValidationError({'ids': f'Unknown chore ids: {missing}'})
+    # Deletion goes through the regular post_delete handler; the coalescing
+    # block collects the reverted completions and applies them per user.
+    Chore.objects.filter(pk__in=deleted).delete()
+    return deleted
+
+
+# --- One notification per affected user ---
+
+def _group_by_assignee(chores):
+    groups = {}
+    for chore in chores:
+        if chore.assignee_id:
+            groups.setdefault(chore.assignee_id, []).append(chore)
+    return groups
+
+
+def _notify_assigned(chores):
+    for assignee_id, assigned in _group_by_assignee(chores).items():
+        if len(assigned) == 1:
+            body = f'You have been assigned a new chore: {assigned[0].title}'
+        else:
+            body = f'You have been assigned {len(assigned)} new chores.'
+        notify_users([assignee_id], {
+            'title': 'New Chore Assigned',
+            'body': body,
+            'tag': 'chore-assigned',
+            'data': {'chore_ids': [chore.id for chore in assigned]},
+        })
+
+
+def _notify_completed(chores):
+    groups = _group_by_assignee(chores)
+    if not groups:
+        return
+    names = dict(Profile.objects.filter(user_id__in=list(groups)).values_list('user_id', 'display_name'))
+    admins = User.objects.filter(profile__role='admin')
+    for assignee_id, completed in groups.items():
+        name = names.get(assignee_id, 'someone')
+        if len(completed) == 1:
+            body = f'Chore "{completed[0].title}" was completed by {name}.'
+        else:
+            body = f'{name} completed {len(completed)} chores.'
+        notify_users(admins, {
+            'title': 'Chore Completed',
+            'body': body,
+            'tag': 'chore-completed',
+            'data': {'chore_ids': [chore.id for chore in completed]},
+        })
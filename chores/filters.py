@@ -0,0 +1,83 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Chore
+
+STATUSES = ('pending', 'completed', 'overdue')
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def _param(params, *names):
+    # The web client sends camelCase (assigneeId), other callers snake_case
+    for name in names:
+        value = params.get(name)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _parse_moment(value, name, end_of_day=False):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+        moment = timezone.datetime.combine(day, timezone.datetime.max.time() if end_of_day else timezone.datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _choice(value, name, choices):
+    if value not in choices:
+        raise ValidationError({name: f'Expected one of: {", ".join(choices)}.'})
+    return value
+
+
+def filter_chores(queryset, params, user=None):
+    """Apply the chore list query parameters.
+
+    Every filter maps onto one of the Chore indexes: (assignee, completed_at),
+    due_date, category and the partial index over pending chores.
+    """
+    assignee = _param(params, 'assignee', 'assigneeId', 'assignee_id')
+    if assignee is not None:
+        if assignee == 'none':
+            queryset = queryset.filter(assignee__isnull=True)
+        elif assignee == 'me' and user is not None:
+            queryset = queryset.filter(assignee_id=user.pk)
+        elif assignee.isdigit():
+            queryset = queryset.filter(assignee_id=int(assignee))
+        else:
+            raise ValidationError({'assignee': 'Expected a user id, "me" or "none".'})
+
+    status = _param(params, 'status')
+    if status is not None:
+        status = _choice(status, 'status', STATUSES)
+    if (_param(params, 'overdue') or '').lower() in TRUE_VALUES:
+        status = 'overdue'
+    elif (_param(params, 'pending') or '').lower() in TRUE_VALUES and status is None:
+        status = 'pending'
+    if status == 'completed':
+        queryset = queryset.filter(completed_at__isnull=False)
+    elif status == 'pending':
+        queryset = queryset.filter(completed_at__isnull=True)
+    elif status == 'overdue':
+        queryset = queryset.filter(completed_at__isnull=True, due_date__lt=timezone.now())
+
+    priority = _param(params, 'priority')
+    if priority is not None:
+        queryset = queryset.filter(priority=_choice(priority, 'priority', [key for key, _ in Chore._meta.get_field('priority').choices]))
+
+    category = _param(params, 'category')
+    if category is not None:
+        queryset = queryset.filter(category=category)
+
+    due_after = _param(params, 'due_after', 'dueAfter')
+    if due_after is not None:
+        queryset = queryset.filter(due_date__gte=_parse_moment(due_after, 'due_after'))
+    due_before = _param(params, 'due_before', 'dueBefore')
+    if due_before is not None:
+        queryset = queryset.filter(due_date__lte=_parse_moment(due_before, 'due_before', end_of_day=True))
+    return queryset
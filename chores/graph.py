@@ -0,0 +1,181 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Chore
+from . import versions
+
+DependencyEdge = Chore.dependencies.through
+
+CACHE_TIMEOUT = getattr(settings, 'CHORE_GRAPH_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+class DependencyGraph:
+    """The chore dependency edges with their transitive closure and a topological order.
+
+    Only chores that take part in at least one edge are nodes; a chore with
+    no edges has no dependencies and blocks nothing.
+    """
+
+    def __init__(self, edges):
+        self.requires, self.required_by = {}, {}
+        for chore_id, dependency_id in edges:
+            self.requires.setdefault(chore_id, set()).add(dependency_id)
+            self.required_by.setdefault(dependency_id, set()).add(chore_id)
+        self.nodes = set(self.requires) | set(self.required_by)
+        self.order = self._topological_order()
+        self.all_requires = {node: self._reachable(node, self.requires) for node in self.requires}
+        self.all_blocks = {node: self._reachable(node, self.required_by) for node in self.required_by}
+
+    def _topological_order(self):
+        # Kahn's algorithm, dependencies first; ties broken by id so the order is stable
+        remaining = {node: len(self.requires.get(node, ())) for node in self.nodes}
+        ready = sorted(node for node, count in remaining.items() if count == 0)
+        order = []
+        while ready:
+            node = ready.pop(0)
+            order.append(node)
+            for dependent in sorted(self.required_by.get(node, ())):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        # Rows written before cycles were rejected can't be ordered; keep them last
+        order.extend(sorted(self.nodes - set(order)))
+        return order
+
+    @staticmethod
+    def _reachable(start, adjacency):
+        seen, stack = set(), list(adjacency.get(start, ()))
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                stack.extend(adjacency.get(node, ()))
+        seen.discard(start)
+        return frozenset(seen)
+
+    def dependencies_of(self, chore_id):
+        return self.requires.get(chore_id, set())
+
+    def blocked_by(self, chore_id):
+        """Every chore that transitively depends on `chore_id`."""
+        return self.all_blocks.get(chore_id, frozenset())
+
+    def find_cycle(self, changes):
+        """Return a dependency cycle the given {chore id: dependency ids} replacements would create, or None.
+
+        Any new cycle runs through a changed chore, so only those are searched.
+        """
+        requires = dict(self.requires)
+        requires.update({chore_id: set(ids) for chore_id, ids in changes.items()})
+        for start in changes:
+            # Depth-first search for a path from start back to itself
+            stack = [(start, [start])]
+            seen = set()
+            while stack:
+                node, path = stack.pop()
+                for dependency in requires.get(node, ()):
+                    if dependency == start:
+                        return path + [start]
+                    if dependency not in seen:
+                        seen.add(dependency)
+                        stack.append((dependency, path + [dependency]))
+        return None
+
+    def longest_chain(self, pending, end=None):
+        """The longest chain of pending chores, dependencies first.
+
+        With `end`, the longest chain of pending prerequisites ending at that chore.
+        """
+        length, previous = {}, {}
+        for node in self.order:
+            if node not in pending:
+                continue
+            best = max((d for d in self.requires.get(node, ()) if d in length), key=lambda d: (length[d], -d), default=None)
+            length[node] = length[best] + 1 if best is not None else 1
+            previous[node] = best
+        if end is None:
+            end = max(length, key=lambda node: (length[node], -node), default=None)
+        chain = []
+        while end in length:
+            chain.append(end)
+            end = previous[end]
+        return chain[::-1]
+
+
+_memo = {'version': None, 'graph': None}
+
+
+def load():
+    """The current graph: one version lookup, rebuilt from the edge table only after edges change."""
+    if connection.in_atomic_block:
+        # A bump inside a transaction that rolls back would let its version
+        # number be reused for different edges, so don't cache what we see here
+        return _build()
+    version = versions.current([versions.DEPENDENCIES])[0]
+    if _memo['version'] == version:
+        return _memo['graph']
+    key = f'chore-graph:{version}'
+    graph = cache.get(key)
+    if graph is None:
+        graph = _build()
+        cache.set(key, graph, CACHE_TIMEOUT)
+    _memo.update(version=version, graph=graph)
+    return graph
+
+
+def _build():
+    return DependencyGraph(DependencyEdge.objects.values_list('from_chore_id', 'to_chore_id'))
+
+
+def pending_ids(chore_ids):
+    chore_ids = set(chore_ids)
+    if not chore_ids:
+        return set()
+    return set(Chore.objects.filter(pk__in=chore_ids, completed_at__isnull=True).values_list('pk', flat=True))
+
+
+def blocked_ids(graph=None):
+    """Pending or not, every chore that has at least one pending dependency."""
+    graph = graph or load()
+    pending = pending_ids(graph.required_by)
+    return {chore_id for chore_id, dependencies in graph.requires.items() if dependencies & pending}
+
+
+def check_acyclic(changes, graph=None):
+    cycle = (graph or load()).find_cycle(changes)
+    if cycle:
+        raise ValidationError({'dependencies': f'Circular dependency: {" -> ".join(map(str, cycle))}.'})
+
+
+def check_completable(requirements, completing=()):
+    """Reject completing chores whose dependencies are still pending.
+
+    `requirements` maps each chore being completed to its dependency ids;
+    dependencies completed in the same operation (`completing`) count as met.
+    """
+    completing = set(completing)
+    pending = pending_ids({dependency for ids in requirements.values() for dependency in ids}) - completing
+    unmet = {chore_id: sorted(set(ids) & pending) for chore_id, ids in requirements.items() if set(ids) & pending}
+    if unmet:
+        raise ValidationError({'dependencies': {
+            str(chore_id): f'Complete chores {ids} first.' for chore_id, ids in unmet.items()
+        }})
+
+
+def dependencies_changed(chore_ids=None):
+    """Refresh blocks_others after edges changed and invalidate the cached graph.
+
+    `chore_ids` are the dependency ends of the changed edges; None, when
+    they're unknown, sweeps every chore flagged as blocking.
+    """
+    now = timezone.now()
+    has_dependents = Exists(DependencyEdge.objects.filter(to_chore_id=OuterRef('pk')))
+    candidates = Chore.objects.all() if chore_ids is None else Chore.objects.filter(pk__in=chore_ids)
+    if chore_ids is not None:
+        candidates.filter(blocks_others=False).filter(has_dependents).update(blocks_others=True, updated_at=now)
+    candidates.filter(blocks_others=True).exclude(has_dependents).update(blocks_others=False, updated_at=now)
+    versions.bump(versions.DEPENDENCIES, versions.CHORES)
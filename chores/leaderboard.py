@@ -0,0 +1,184 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import DataVersion, Profile
+from . import versions
+
+WINDOWS = ('week', 'month', 'all')
+DEFAULT_WINDOW = 'all'
+CACHE_TIMEOUT = getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 300)
+# Moves with every change a board shows: completions, streaks and members. Title edits,
+# new chores and the like leave it alone.
+VERSION_SCOPE = versions.LEADERBOARD
+
+
+def window_start(window, now=None):
+    """Start of the current calendar window (Monday for weeks, the 1st for months)."""
+    if window == 'all':
+        return None
+    now = timezone.localtime(now or timezone.now())
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == 'week':
+        return midnight - timezone.timedelta(days=midnight.weekday())
+    return midnight.replace(day=1)
+
+
+def _cache_key(window, start):
+    return f"leaderboard:{window}:{start.date().isoformat() if start else 'all'}"
+
+
+def _sort_key(entry):
+    return (-entry['completed_chores'], entry['user_id'])
+
+
+def build_board(window):
+    """Compute the ranked board for a window with a single aggregated query.
+
+    The board records the leaderboard version it was read at. It comes from
+    the same statement as the rows, so it is never newer or older than them.
+    """
+    start = window_start(window)
+    version = DataVersion.objects.filter(scope=VERSION_SCOPE).values('version')[:1]
+    profiles = Profile.objects.annotate(board_version=Coalesce(Subquery(version), Value(0)))
+    if start is None:
+        # Lifetime totals are kept incrementally in UserStats
+        profiles = profiles.annotate(completed=Coalesce('user__completion_stats__total_completed', Value(0)))
+    else:
+        profiles = profiles.annotate(completed=Count('user__chores', filter=Q(user__chores__completed_at__gte=start)))
+    rows = list(profiles.order_by('-completed', 'user_id').values(
+        'user_id', 'user__username', 'display_name', 'completed', 'current_streak', 'longest_streak', 'board_version'
+    ))
+    entries = [
+        {
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'display_name': row['display_name'],
+            'completed_chores': row['completed'],
+            'streak': row['current_streak'],
+            'longest_streak': row['longest_streak'],
+        }
+        for row in rows
+    ]
+    return {
+        'entries': entries,
+        'ranks': {entry['user_id']: index for index, entry in enumerate(entries)},
+        'version': rows[0]['board_version'] if rows else versions.current([VERSION_SCOPE])[0],
+    }
+
+
+def _version(data_versions):
+    # Callers that already read the versions for their ETag pass them in
+    if data_versions and VERSION_SCOPE in data_versions:
+        return data_versions[VERSION_SCOPE]
+    return versions.current([VERSION_SCOPE])[0]
+
+
+def get_board(window, data_versions=None):
+    """The ranked board for a window, patched in place as completions commit.
+
+    A cached board is served as long as it is at the current leaderboard
+    version, whichever process patched it; one left behind (by a write that
+    couldn't be patched in, or patched in another process's cache) is
+    rebuilt. `data_versions` (scope -> version) saves the version read.
+    """
+    key = _cache_key(window, window_start(window))
+    board = cache.get(key)
+    if board is None or board['version'] < _version(data_versions):
+        board = build_board(window)
+        cache.set(key, board, CACHE_TIMEOUT)
+    return board
+
+
+async def aget_board(window, data_versions=None):
+    """get_board() for the async views: only a rebuild leaves the event loop."""
+    key = _cache_key(window, window_start(window))
+    board = await cache.aget(key)
+    if data_versions and VERSION_SCOPE in data_versions:
+        version = data_versions[VERSION_SCOPE]
+    else:
+        version = (await versions.acurrent([VERSION_SCOPE]))[0]
+    if board is None or board['version'] < version:
+        board = await sync_to_async(build_board)(window)
+        await cache.aset(key, board, CACHE_TIMEOUT)
+    return board
+
+
+def page(window, offset=0, limit=None, board=None):
+    board = board or get_board(window)
+    entries = board['entries'][offset:None if limit is None else offset + limit]
+    return len(board['entries']), [dict(entry, rank=offset + index + 1) for index, entry in enumerate(entries)]
+
+
+def rank_of(window, user_id, board=None):
+    board = board or get_board(window)
+    index = board['ranks'].get(user_id)
+    if index is None:
+        return None
+    return dict(board['entries'][index], rank=index + 1)
+
+
+def _reposition(board, index):
+    """Move the entry at index to its sorted position, fixing up ranks in between."""
+    entries, ranks = board['entries'], board['ranks']
+    entry = entries[index]
+    key = _sort_key(entry)
+    while index > 0 and _sort_key(entries[index - 1]) > key:
+        entries[index] = entries[index - 1]
+        ranks[entries[index]['user_id']] = index
+        index -= 1
+    while index < len(entries) - 1 and _sort_key(entries[index + 1]) < key:
+        entries[index] = entries[index + 1]
+        ranks[entries[index]['user_id']] = index
+        index += 1
+    entries[index] = entry
+    ranks[entry['user_id']] = index
+
+
+def record_changes(completions, streaks):
+    """Patch the cached boards once the current transaction commits.
+
+    `completions` are (user_id, completed_at, +1 or -1) and `streaks` map a
+    user id to their (current, longest) streak. The leaderboard version is
+    bumped here and read back while the transaction holds the write lock,
+    so each patch knows exactly which board version it applies to. A patch
+    only lands on a board at the version just before its own; anything else
+    (a rollback, a board another change got to first, a patch arriving out
+    of order) leaves the board behind the version, and the next read
+    rebuilds it. Racing writers can cost a rebuild, never a wrong count.
+    """
+    if not completions and not streaks:
+        return
+    with transaction.atomic():
+        version = versions.advance(VERSION_SCOPE)
+    if not connection.in_atomic_block:
+        # The stats already committed on their own; a board read in between would count them twice
+        return
+    transaction.on_commit(lambda: _patch(version, completions, streaks))
+
+
+def _patch(version, completions, streaks):
+    for window in WINDOWS:
+        start = window_start(window)
+        key = _cache_key(window, start)
+        board = cache.get(key)
+        if board is None or board['version'] != version - 1:
+            continue
+        ranks = board['ranks']
+        if any(user_id not in ranks for user_id, _, _ in completions) or any(user_id not in ranks for user_id in streaks):
+            continue
+        for user_id, completed_at, sign in completions:
+            if start is not None and completed_at < start:
+                continue
+            entry = board['entries'][ranks[user_id]]
+            entry['completed_chores'] = max(entry['completed_chores'] + sign, 0)
+            _reposition(board, ranks[user_id])
+        for user_id, (current, longest) in streaks.items():
+            entry = board['entries'][ranks[user_id]]
+            entry['streak'], entry['longest_streak'] = current, longest
+        board['version'] = version
+        cache.set(key, board, CACHE_TIMEOUT)
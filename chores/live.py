@@ -0,0 +1,210 @@
+"""Live events for /api/events/: chore changes and badge unlocks, pushed over Server-Sent Events.
+
+Events are rows in LiveEvent, written once the transaction that caused them
+commits, so a stream resuming from Last-Event-ID replays exactly what it
+missed, whichever process wrote it. Streams don't poll the table per
+connection: they sleep on a Notifier that wakes them right away for events
+published in this process, and once per LIVE_POLL_SECONDS when a single
+per-process check sees a newer id written by another process.
+
+Resuming after an id relies on ids being assigned in commit order. That holds
+on SQLite, where writes are serialized, but not on databases that hand out
+sequence values before commit (PostgreSQL): a slower transaction can commit
+an id below one a stream has already passed, and that event is skipped. Moving
+off SQLite means re-reading a short window behind the last id, or ordering by
+a commit sequence instead.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import LiveEvent
+
+POLL_SECONDS = getattr(settings, 'LIVE_POLL_SECONDS', 2)
+HEARTBEAT_SECONDS = getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# which also re-checks the access token
+STREAM_MAX_SECONDS = getattr(settings, 'LIVE_STREAM_MAX_SECONDS', 10 * 60)
+RETENTION_HOURS = getattr(settings, 'LIVE_EVENT_RETENTION_HOURS', 24)
+RETRY_MS = 3000
+PAGE_SIZE = 100
+
+# Chore events carry just enough for a client to patch its list or refetch the chore
+CHORE_FIELDS = ('assignee_id', 'completed_at', 'due_date', 'priority', 'category')
+
+
+def _json(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def chore_events(chore, previous, current):
+    """Unsaved LiveEvents for one chore going from `previous` to `current` (completion_state() snapshots)."""
+    if current is None:
+        return []
+    data = dict({field: _json(current[field]) for field in CHORE_FIELDS}, id=chore.pk, title=chore.title)
+    if previous is None:
+        kind = 'chore.created'
+    elif current['completed_at'] and not previous['completed_at']:
+        kind = 'chore.completed'
+    else:
+        kind = 'chore.updated'
+    events = [LiveEvent(kind=kind, data=data)]
+    if current['assignee_id'] and (previous is None or previous['assignee_id'] != current['assignee_id']):
+        # Also on the assignee's own stream, so their client can tell them
+        events.append(LiveEvent(user_id=current['assignee_id'], kind='chore.assigned', data=data))
+    return events
+
+
+def deleted_event(chore_id):
+    return LiveEvent(kind='chore.deleted', data={'id': chore_id})
+
+
+def achievement_event(achievement):
+    # Titles are unique per user; rows completed by an UPDATE have no id at hand
+    return LiveEvent(kind='achievement.unlocked', data={
+        'user_id': achievement.user_id,
+        'title': achievement.title,
+        'icon': achievement.icon,
+        'category': achievement.category,
+        'rarity': achievement.rarity,
+        'points': achievement.points,
+    })
+
+
+class Notifier:
+    """Wakes the streams waiting in this process when newer events may exist. Thread-safe."""
+
+    def __init__(self):
+        self.latest = 0
+        self._waiters = set()
+        self._pollers = {}
+        self._lock = threading.Lock()
+
+    def notify(self, event_id):
+        with self._lock:
+            self.latest = max(self.latest, event_id)
+            waiters = list(self._waiters)
+        for loop, woken in waiters:
+            loop.call_soon_threadsafe(woken.set)
+
+    async def wait(self, after, timeout):
+        """Wait until an event newer than `after` may exist; False if `timeout` seconds pass first."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+            if loop not in self._pollers:
+                self._pollers[loop] = loop.create_task(self._poll(loop))
+        try:
+            if self.latest > after:
+                return True
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    async def _poll(self, loop):
+        # One query per interval for every stream of this loop, while any are waiting
+        try:
+            while True:
+                await asyncio.sleep(POLL_SECONDS)
+                with self._lock:
+                    if not any(waiter_loop is loop for waiter_loop, _ in self._waiters):
+                        self._pollers.pop(loop, None)
+                        return
+                newest = (await LiveEvent.objects.aaggregate(newest=Max('id')))['newest'] or 0
+                if newest > self.latest:
+                    self.notify(newest)
+        except BaseException:
+            with self._lock:
+                self._pollers.pop(loop, None)
+            raise
+
+
+notifier = Notifier()
+
+
+def publish(events):
+    """Write the events (and wake the streams) once the current transaction commits."""
+    events = list(events)
+    if events:
+        transaction.on_commit(lambda: _write(events))
+
+
+def _write(events):
+    if len(events) == 1:
+        # A plain INSERT; bulk_create would add a BEGIN/COMMIT around it in autocommit
+        events[0].save()
+    else:
+        LiveEvent.objects.bulk_create(events)
+    notifier.notify(max(event.pk for event in events))
+
+
+def prune(older_than_hours=RETENTION_HOURS):
+    """Delete events older than the retention; clients resuming from before that get a reset.
+
+    Run by the prune_history command, never on the write path.
+    """
+    return LiveEvent.objects.filter(created_at__lt=timezone.now() - timezone.timedelta(hours=older_than_hours)).delete()[0]
+
+
+def visible_to(user):
+    return LiveEvent.objects.filter(Q(user__isnull=True) | Q(user_id=user.pk))
+
+
+async def alatest_id():
+    return (await LiveEvent.objects.aaggregate(newest=Max('id')))['newest'] or 0
+
+
+async def amissed(after):
+    """True when events after `after` may have been pruned already."""
+    oldest = (await LiveEvent.objects.aaggregate(oldest=Min('id')))['oldest']
+    return oldest is not None and oldest > after + 1
+
+
+async def aevents_after(user, after, limit=PAGE_SIZE):
+    return [event async for event in visible_to(user).filter(id__gt=after).order_by('id')[:limit]]
+
+
+def format_event(event):
+    return f'id: {event.pk}\nevent: {event.kind}\ndata: {json.dumps(event.data, separators=(",", ":"))}\n\n'
+
+
+async def stream(user, last_id=None):
+    """The Server-Sent Events for one client, resuming after `last_id` when given.
+
+    Idle streams issue no queries: they only look for events when the
+    notifier wakes them.
+    """
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    yield f'retry: {RETRY_MS}\n\n'
+    if last_id is None:
+        last_id = await alatest_id()
+    elif await amissed(last_id):
+        # Too far behind to replay: the client refetches, then follows from here
+        last_id = await alatest_id()
+        yield f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'
+    fetch = True
+    while time.monotonic() < deadline:
+        # Read before querying, so a publish racing the query still wakes us
+        checked = notifier.latest
+        if fetch:
+            events = await aevents_after(user, last_id)
+            for event in events:
+                yield format_event(event)
+                last_id = event.pk
+            if len(events) == PAGE_SIZE:
+                continue
+        remaining = deadline - time.monotonic()
+        fetch = await notifier.wait(checked, min(HEARTBEAT_SECONDS, max(remaining, 0)))
+        if not fetch:
+            yield ': keepalive\n\n'
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chores.archive import ARCHIVE_DIR, BATCH_SIZE, archive_completed, cutoff_for, eligible
+
+
+class Command(BaseCommand):
+    help = 'Move old completed chores out of the chore table into compressed NDJSON segments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None, help='Archive chores completed this many days ago or more (ARCHIVE_AFTER_DAYS, at least 32)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Chores per transaction and segment file')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many chores would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = cutoff_for(options['older_than_days'])
+        if options['dry_run']:
+            self.stdout.write(f'{eligible(cutoff).count()} chores completed before {cutoff:%Y-%m-%d %H:%M} would be archived.')
+            return
+        started = time.monotonic()
+        segments = archive_completed(options['older_than_days'], max(options['batch_size'], 1))
+        elapsed = time.monotonic() - started
+        for segment in segments:
+            self.stdout.write(f'{segment.path}: {segment.chore_count} chores, {segment.raw_bytes} bytes -> {segment.compressed_bytes} compressed')
+        archived = sum(segment.chore_count for segment in segments)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} chores into {len(segments)} segments under {ARCHIVE_DIR} in {elapsed:.2f}s '
+            f'({archived / elapsed if elapsed else 0:.0f}/s).'
+        ))
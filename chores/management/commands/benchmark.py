@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from chores import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Measure p50/p95 latency and query counts of the hot API paths against the checked-in budgets.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budgets', default=str(benchmarks.BUDGET_FILE), help='Budget file')
+        parser.add_argument('--users', type=int, default=None, help='Dataset users (default: from the budget file)')
+        parser.add_argument('--chores-per-user', type=int, default=None, help='Dataset chores per user (default: from the budget file)')
+        parser.add_argument('--iterations', type=int, default=None, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario')
+        parser.add_argument('--tolerance', type=float, default=None, help='Allowed latency slack over budget, e.g. 0.5 for +50%%')
+        parser.add_argument('--only', action='append', choices=list(benchmarks.SCENARIOS), help='Run only this scenario (repeatable)')
+        parser.add_argument('--no-latency', action='store_true', help='Only enforce the query budgets')
+        parser.add_argument('--update-budgets', action='store_true', help='Write the measured numbers to the budget file')
+
+    def handle(self, *args, **options):
+        budgets = benchmarks.load_budgets(options['budgets'])
+        dataset = dict(budgets['dataset'])
+        for key in ('users', 'chores_per_user'):
+            if options[key] is not None:
+                dataset[key] = options[key]
+        if options['tolerance'] is not None:
+            budgets['tolerance'] = options['tolerance']
+        iterations = options['iterations'] or budgets.get('iterations', 50)
+
+        # Never touch the real database: build a throwaway one like the test runner does
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Generating {dataset['users']} users x {dataset['chores_per_user']} chores...")
+            user = benchmarks.build_dataset(**dataset)
+            results = benchmarks.run(user, iterations, options['warmup'], options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for name, result in results.items():
+            budget = budgets['endpoints'].get(name, {})
+            self.stdout.write(
+                f"{name:<28} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                f"{result['queries']:3d} queries  (budget: {budget.get('p50_ms', '-')} / {budget.get('p95_ms', '-')} ms, {budget.get('queries', '-')} queries)"
+            )
+        if options['update_budgets']:
+            benchmarks.write_budgets(results, budgets, options['budgets'])
+            self.stdout.write(self.style.SUCCESS(f"Budgets written to {options['budgets']}."))
+            return
+        regressions = benchmarks.check(results, budgets, latency=not options['no_latency'])
+        if regressions:
+            raise CommandError('Over budget:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('All scenarios within budget.'))
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from chores import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare request throughput of the hot read paths under sync WSGI and async ASGI at high concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both',
+                            help='Handler to drive; "both" runs each in its own process and compares them')
+        parser.add_argument('--users', type=int, default=20, help='Dataset users')
+        parser.add_argument('--chores-per-user', type=int, default=200, help='Dataset chores per user')
+        parser.add_argument('--seed', type=int, default=1, help='Dataset seed')
+        parser.add_argument('--concurrency', type=int, default=64, help='Clients with a request in flight at all times')
+        parser.add_argument('--requests', type=int, default=2000, help='Measured requests in total')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads (what one threaded WSGI worker would run)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            results = [self.spawn(mode, options) for mode in ('wsgi', 'asgi')]
+        else:
+            results = [self.measure(options)]
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        for result in results:
+            self.print_result(result)
+        if len(results) == 2 and results[0]['throughput']:
+            self.stdout.write(
+                f"ASGI/WSGI throughput: {results[1]['throughput'] / results[0]['throughput']:.2f}x "
+                f"at {options['concurrency']} concurrent clients"
+            )
+
+    def measure(self, options):
+        # A throwaway database like the benchmark command's, but on disk so reads do real I/O
+        if connection.vendor == 'sqlite':
+            directory = tempfile.mkdtemp(prefix='dusty-bench-')
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = benchmarks.build_dataset(options['users'], options['chores_per_user'], seed=options['seed'])
+            result = benchmarks.load_test(
+                options['mode'], user, concurrency=options['concurrency'], total=options['requests'], threads=options['threads'],
+            )
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        result['async_views'] = settings.ASYNC_READ_VIEWS
+        return result
+
+    def spawn(self, mode, options):
+        # Each mode runs in a fresh process configured the way it's deployed
+        env = dict(os.environ, DUSTY_ASYNC_READ_VIEWS=str(mode == 'asgi'))
+        command = [
+            sys.executable, '-m', 'django', 'benchmark_concurrency', '--mode', mode, '--json',
+            *(f'--{key.replace("_", "-")}={options[key]}' for key in ('users', 'chores_per_user', 'seed', 'concurrency', 'requests', 'threads')),
+        ]
+        self.stderr.write(f'Running the {mode.upper()} benchmark...')
+        finished = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if finished.returncode:
+            raise CommandError(f'The {mode} benchmark failed:\n{finished.stderr}')
+        return json.loads(finished.stdout.strip().splitlines()[-1])[0]
+
+    def print_result(self, result):
+        mode = result['mode'].upper()
+        where = f"{result['threads']} threads" if result['threads'] else 'one event loop'
+        views = 'async' if result['async_views'] else 'sync'
+        overall = result['overall']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{mode} ({views} views, {where}, {result['concurrency']} clients): "
+            f"{result['throughput']:.1f} req/s, p50 {overall['p50_ms']:.1f} ms, p95 {overall['p95_ms']:.1f} ms, "
+            f"p99 {overall['p99_ms']:.1f} ms, {result['errors']} errors"
+        ))
+        for path, stats in result['paths'].items():
+            self.stdout.write(
+                f"  {path:<32} p50 {stats['p50_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms  "
+                f"{stats['requests']} requests, {stats['errors']} errors"
+            )
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from chores import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Complete chores from many threads at once and count the SQLite "database is locked" errors.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=['both', 'tuned', 'default'], default='both',
+                            help='SQLite connection options: the configured ones, Django\'s defaults, or each in its own process')
+        parser.add_argument('--writers', type=int, default=8, help='Threads completing chores at the same time, one user each')
+        parser.add_argument('--completions', type=int, default=50, help='Chores each writer completes')
+        parser.add_argument('--users', type=int, default=20, help='Dataset users')
+        parser.add_argument('--chores-per-user', type=int, default=200, help='Dataset chores per user')
+        parser.add_argument('--seed', type=int, default=1, help='Dataset seed')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark is for the SQLite deployment (USE_SQLITE=True).')
+        if options['profile'] == 'both':
+            results = [self.spawn(profile, options) for profile in ('default', 'tuned')]
+        else:
+            results = [self.measure(options)]
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        for result in results:
+            self.print_result(result)
+
+    def measure(self, options):
+        if options['profile'] == 'default':
+            connection.settings_dict['OPTIONS'] = {}
+        # A throwaway database on disk: locking only happens between real connections to a file
+        directory = tempfile.mkdtemp(prefix='dusty-bench-')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'bench.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            benchmarks.build_dataset(options['users'], options['chores_per_user'], seed=options['seed'])
+            try:
+                users = benchmarks.writer_users(options['writers'], options['completions'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            connection.close()
+            result = benchmarks.write_test(users, options['completions'])
+        finally:
+            connection.close()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        result['profile'] = options['profile']
+        return result
+
+    def spawn(self, profile, options):
+        # Each profile gets a fresh process, so no cache outlives its database
+        command = [
+            sys.executable, '-m', 'django', 'benchmark_writes', '--profile', profile, '--json',
+            *(f'--{key.replace("_", "-")}={options[key]}' for key in ('writers', 'completions', 'users', 'chores_per_user', 'seed')),
+        ]
+        self.stderr.write(f'Running with the {profile} SQLite options...')
+        finished = subprocess.run(command, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if finished.returncode:
+            raise CommandError(f'The {profile} benchmark failed:\n{finished.stderr}')
+        return json.loads(finished.stdout.strip().splitlines()[-1])[0]
+
+    def print_result(self, result):
+        overall = result['overall']
+        style = self.style.SUCCESS if not result['errors'] else self.style.ERROR
+        self.stdout.write(style(
+            f"{result['profile']} ({result['writers']} writers): {result['completions']} completions, "
+            f"{result['throughput']:.1f}/s, p50 {overall['p50_ms']:.1f} ms, p95 {overall['p95_ms']:.1f} ms, "
+            f"p99 {overall['p99_ms']:.1f} ms, {result['errors']} failed ({result['lock_errors']} database is locked)"
+        ))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from chores.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users and chores for load tests and benchmarks. Chores are bulk inserted '
+        'without signals unless --with-signals is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Users to create')
+        parser.add_argument('--chores-per-user', type=int, default=100, help='Chores per user')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed produces the same data')
+        parser.add_argument('--prefix', default='synthetic', help='Username prefix (usernames are <prefix>-<seed>-<n>)')
+        parser.add_argument('--days', type=int, default=365, help='How far back chores are spread')
+        parser.add_argument('--completion-rate', type=float, default=0.8)
+        parser.add_argument('--recurring-rate', type=float, default=0.1)
+        parser.add_argument('--dependency-rate', type=float, default=0.05)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Chores per insert transaction')
+        parser.add_argument(
+            '--with-signals', action='store_true',
+            help='Save chores one by one through the regular signals (stats, badges, rollups, live events); much slower',
+        )
+        parser.add_argument('--recompute', action='store_true', help='Rebuild stats, streaks, badges and daily rollups afterwards')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes for --recompute')
+
+    def handle(self, *args, **options):
+        prefix = f"{options['prefix']}-{options['seed']}-"
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f'Users named {prefix}* already exist; pick another --seed or --prefix.')
+        started = time.monotonic()
+
+        def progress(created, total):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{created}/{total} chores in {elapsed:.1f}s ({created / elapsed if elapsed else 0:.0f}/s)')
+
+        users, chores, edges = generate(
+            options['users'], options['chores_per_user'], seed=options['seed'], prefix=options['prefix'],
+            batch_size=max(options['batch_size'], 1), progress=progress, days=options['days'],
+            completion_rate=options['completion_rate'], recurring_rate=options['recurring_rate'],
+            dependency_rate=options['dependency_rate'], signals=options['with_signals'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {users} users, {chores} chores and {edges} dependency edges in {time.monotonic() - started:.1f}s.'
+        ))
+        if options['recompute']:
+            extra = {'workers': options['workers']} if options['workers'] else {}
+            call_command('recompute_achievements', stdout=self.stdout, **extra)
+            call_command('rebuild_rollups', stdout=self.stdout)
+        elif not options['with_signals']:
+            self.stdout.write('Stats, streaks, badges and rollups were not computed; run recompute_achievements and rebuild_rollups.')
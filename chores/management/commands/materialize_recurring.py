@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chores.recurrence import CHUNK_SIZE, materialize_due
+
+
+class Command(BaseCommand):
+    help = 'Create the next occurrence of every recurring chore that has come due.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Due chores rolled over per transaction')
+        parser.add_argument('--loop', action='store_true', help='Keep running, checking every --interval seconds')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between runs in --loop mode')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        try:
+            while True:
+                close_old_connections()
+                started = time.monotonic()
+                rolled_over, created = materialize_due(chunk_size=chunk_size)
+                if rolled_over or not options['loop']:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f'Rolled over {rolled_over} due chores into {created} occurrences in {elapsed:.2f}s '
+                        f'({rolled_over / elapsed if elapsed else 0:.0f}/s).'
+                    )
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
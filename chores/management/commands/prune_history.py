@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chores import live, sync
+
+
+class Command(BaseCommand):
+    help = 'Delete live events and sync tombstones older than their retention.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=live.RETENTION_HOURS, help='Live event retention in hours')
+        parser.add_argument('--loop', action='store_true', help='Keep running, pruning every --interval seconds')
+        parser.add_argument('--interval', type=float, default=600.0, help='Seconds between runs in --loop mode')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                events = live.prune(older_than_hours=options['hours'])
+                tombstones = sync.prune_tombstones()
+                if events or tombstones or not options['loop']:
+                    self.stdout.write(f'Pruned {events} live events and {tombstones} tombstones.')
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
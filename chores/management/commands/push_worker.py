@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chores.push import claim_jobs, get_sender, record_results
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued web push notifications from a bounded thread pool, or an event loop with --async.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent sends (thread pool size, or sends in flight with --async)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Jobs claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the currently due jobs and exit')
+        parser.add_argument('--async', action='store_true', dest='use_async', help='Await the sends on an event loop through aiohttp instead of threads')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        sender = get_sender()
+        try:
+            if options['use_async']:
+                self.stdout.write(f'Push worker started on an event loop with {workers} sends in flight.')
+                asyncio.run(self.run_async(sender, workers, options))
+            else:
+                self.stdout.write(f'Push worker started with {workers} threads.')
+                self.run_threaded(sender, workers, options)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sender.close()
+        self.stdout.write(self.style.SUCCESS('Push worker stopped.'))
+
+    def run_threaded(self, sender, workers, options):
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                close_old_connections()
+                jobs = claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                # Only the HTTP sends run in the pool; all DB work stays on this thread
+                results = []
+                started = time.monotonic()
+                for group in self.group(jobs):
+                    report = sender.send_many([job.subscription for job in group], group[0].payload, executor=pool)
+                    results.extend((job, outcome, error) for job, (_, outcome, error) in zip(group, report.results))
+                self.report(jobs, time.monotonic() - started, record_results(results))
+
+    async def run_async(self, sender, workers, options):
+        # The DB work runs on one thread next to the loop; the sends never leave the loop
+        claim, record, close = sync_to_async(claim_jobs), sync_to_async(record_results), sync_to_async(close_old_connections)
+        async with sender.async_session() as session:
+            while True:
+                await close()
+                jobs = await claim(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    await asyncio.sleep(options['poll_interval'])
+                    continue
+                results = []
+                started = time.monotonic()
+                for group in self.group(jobs):
+                    report = await sender.send_many_async([job.subscription for job in group], group[0].payload, concurrency=workers, session=session)
+                    results.extend((job, outcome, error) for job, (_, outcome, error) in zip(group, report.results))
+                self.report(jobs, time.monotonic() - started, await record(results))
+
+    def group(self, jobs):
+        # Jobs queued by the same fan-out share a payload and go out as one batch
+        groups = {}
+        for job in jobs:
+            groups.setdefault(json.dumps(job.payload, sort_keys=True), []).append(job)
+        return list(groups.values())
+
+    def report(self, jobs, elapsed, summary):
+        self.stdout.write(
+            f"Batch of {len(jobs)} in {elapsed:.2f}s ({len(jobs) / elapsed if elapsed else 0:.1f}/s): "
+            f"{summary['sent']} sent, {summary['retried']} retried, {summary['pruned']} subscriptions pruned."
+        )
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chores.rollups import rebuild
+from chores import versions
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily stats rollups from the chore table and the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per insert')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = rebuild(max(options['batch_size'], 1))
+        # /api/stats/ ETags follow the chore version
+        versions.bump(versions.CHORES)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} rollup rows in {time.monotonic() - started:.2f}s.'))
@@ -0,0 +1,64 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from chores.recompute import apply_results, finish, recompute_range, user_ranges
+
+
+def _init_worker():
+    # Needed under the spawn start method; a no-op for forked workers
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild completion stats, streaks and achievements by replaying every completion.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes (1 replays in this process)')
+        parser.add_argument('--shards', type=int, default=None, help='User id ranges to split the work into (default: 4 per worker)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip while streaming completions')
+        parser.add_argument('--dry-run', action='store_true', help='Print what would change without writing')
+        parser.add_argument('--revoke', action='store_true', help='Also take back badges the history no longer earns')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        ranges = user_ranges(options['shards'] or workers * 4)
+        self.started = time.monotonic()
+        self.users = self.completions = self.shards_done = 0
+        changed = {}
+        if workers == 1:
+            for low, high in ranges:
+                changed.update(self.apply(recompute_range(low, high, options['chunk_size']), options, len(ranges)))
+        else:
+            # Forked workers must open their own database connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+                futures = [pool.submit(recompute_range, low, high, options['chunk_size']) for low, high in ranges]
+                for future in as_completed(futures):
+                    changed.update(self.apply(future.result(), options, len(ranges)))
+
+        for user_id, changes in sorted(changed.items()):
+            self.stdout.write(f'user {user_id}: ' + '; '.join(changes))
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Dry run: {len(changed)} of {self.users} users would change.'))
+            return
+        finish(changed)
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {self.users} users, {len(changed)} changed.'))
+
+    def apply(self, results, options, total):
+        diff = apply_results(results, dry_run=options['dry_run'], revoke=options['revoke'])
+        self.users += len(results)
+        self.completions += sum(result['completions'] for result in results)
+        self.shards_done += 1
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f'[{self.shards_done}/{total}] {self.users} users, {self.completions} completions '
+            f'in {elapsed:.1f}s ({self.completions / elapsed if elapsed else 0:.0f} completions/s)'
+        )
+        return diff
@@ -1,6 +1,11 @@
+from collections import Counter
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from chores.models import Profile, Chore
+from chores.recompute import apply_results, finish, recompute_range
+from chores import rollups, versions
+from chores.synthetic import bulk_create_chores
 from django.utils import timezone
 
 class Command(BaseCommand):
@@ -21,89 +26,90 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f'Profile for {username} does not exist.'))
             return
         now = timezone.now()
+        chores = []
         # --- Completion Milestones ---
         for i in range(1, 501):
             completed_at = now - timezone.timedelta(days=500 - i)
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Completion Chore {i}',
                 assignee=user,
                 completed_at=completed_at,
                 created_at=completed_at,
                 updated_at=completed_at,
                 category='general'
-            )
+            ))
         # --- Streaks: 100-day streak ---
         for i in range(100):
             completed_at = now - timezone.timedelta(days=100 - i)
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Streak Chore {i+1}',
                 assignee=user,
                 completed_at=completed_at,
                 created_at=completed_at,
                 updated_at=completed_at,
                 category='general'
-            )
+            ))
         # --- Speed: 10 chores in under 2 hours ---
         for i in range(10):
             completed_at = now - timezone.timedelta(hours=2 - (i * 0.2))
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Speed Chore {i+1}',
                 assignee=user,
                 completed_at=completed_at,
                 created_at=completed_at,
                 updated_at=completed_at,
                 category='general'
-            )
+            ))
         # --- Variety: 10 unique categories ---
         for i in range(10):
             completed_at = now - timezone.timedelta(days=10 - i)
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Variety Chore {i+1}',
                 assignee=user,
                 completed_at=completed_at,
                 created_at=completed_at,
                 updated_at=completed_at,
                 category=f'cat{i+1}'
-            )
+            ))
         # --- Special: Early Bird, Night Owl, Weekend Warrior, Overdue Hero, Perfect Week ---
         # Early Bird: 5 chores before 9am
         for i in range(5):
             dt = now.replace(hour=8, minute=0, second=0, microsecond=0) - timezone.timedelta(days=i)
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Early Bird Chore {i+1}',
                 assignee=user,
                 completed_at=dt,
                 created_at=dt,
                 updated_at=dt,
                 category='special'
-            )
+            ))
         # Night Owl: 5 chores after 8pm
         for i in range(5):
             dt = now.replace(hour=21, minute=0, second=0, microsecond=0) - timezone.timedelta(days=i)
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Night Owl Chore {i+1}',
                 assignee=user,
                 completed_at=dt,
                 created_at=dt,
                 updated_at=dt,
                 category='special'
-            )
+            ))
         # Weekend Warrior: 10 chores on weekends
         for i in range(10):
             # Saturday (6) or Sunday (7)
             day = 6 if i % 2 == 0 else 7
             dt = now - timezone.timedelta(days=(now.weekday() - day + i))
-            Chore.objects.create(
+            chores.append(Chore(
                 title=f'Weekend Warrior Chore {i+1}',
                 assignee=user,
                 completed_at=dt,
                 created_at=dt,
                 updated_at=dt,
                 category='special'
-            )
+            ))
         # Overdue Hero: 1 overdue chore
         dt = now - timezone.timedelta(days=2)
-        Chore.objects.create(
+        chores.append(Chore(
             title='Overdue Hero Chore',
             assignee=user,
             completed_at=now,
@@ -111,5 +117,15 @@ class Command(BaseCommand):
             updated_at=now,
             due_date=dt,
             category='special'
-        )
+        ))
+        # One bulk insert, then a single replay instead of a signal run per chore
+        bulk_create_chores(chores)
+        # bulk_create skips the signals that keep the rollups and the chore list ETags current
+        deltas = Counter()
+        for chore in chores:
+            deltas.update(rollups.chore_deltas(None, chore.completion_state()))
+        rollups.apply_deltas(deltas)
+        versions.bump(versions.CHORES)
+        changed = apply_results(recompute_range(user.pk, user.pk))
+        finish(changed)
         self.stdout.write(self.style.SUCCESS(f'Simulated all badge types for {username}.')) 
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""Counters and histograms, exported in the Prometheus text format.
+
+Values live in a per-process dict behind a lock, so recording is cheap.
+With METRICS_DIR set, each process also writes its totals to its own file
+there every METRICS_FLUSH_SECONDS, and the export sums every file, so any
+worker can answer for the whole fleet. Files of exited processes are kept,
+which keeps the totals from going backwards; clear the directory on deploy.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_SECONDS = getattr(settings, 'METRICS_FLUSH_SECONDS', 5)
+
+
+def _directory():
+    directory = getattr(settings, 'METRICS_DIR', None)
+    return Path(directory) if directory else None
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker must not report its parent's numbers a second time
+            os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._flushed_at = time.monotonic()
+        self._file = f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'Metric "{metric.name}" is already registered.')
+        self.metrics[metric.name] = metric
+        return metric
+
+    def add(self, name, labels, values):
+        """Add `values` element-wise to the series `name`/`labels`."""
+        key = (name, labels)
+        with self._lock:
+            current = self._values.get(key)
+            if current is None:
+                self._values[key] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    current[index] += value
+            due = time.monotonic() - self._flushed_at >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(values) for key, values in self._values.items()}
+
+    def flush(self):
+        directory = _directory()
+        if directory is None:
+            return
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            rows = [[name, list(labels), values] for (name, labels), values in self._values.items()]
+        if not rows:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        partial = directory / (self._file + '.partial')
+        partial.write_text(json.dumps(rows))
+        os.replace(partial, directory / self._file)
+
+    def collect(self):
+        """Totals of every process: this one live, the others from their last flush."""
+        totals = self.snapshot()
+        directory = _directory()
+        if directory is not None and directory.is_dir():
+            for path in directory.glob('metrics-*.json'):
+                if path.name == self._file:
+                    continue
+                try:
+                    rows = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    continue  # being replaced, or from an older layout
+                for name, labels, values in rows:
+                    key = (name, tuple(labels))
+                    if key not in totals:
+                        totals[key] = values
+                    elif len(totals[key]) == len(values):
+                        totals[key] = [a + b for a, b in zip(totals[key], values)]
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            # The text format names counters after their _total sample
+            exposed = f'{name}_total' if metric.kind == 'counter' else name
+            lines.append(f'# HELP {exposed} {metric.help}')
+            lines.append(f'# TYPE {exposed} {metric.kind}')
+            for (series, labels), values in sorted(totals.items()):
+                if series == name:
+                    lines.extend(metric.samples(dict(zip(metric.labelnames, labels)), values))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        registry.add(self.name, tuple(str(labels[label]) for label in self.labelnames), [amount])
+
+    def samples(self, labels, values):
+        yield f'{self.name}_total{_labels(labels)} {_number(values[0])}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        # Per-bucket counts (not cumulative), then +Inf, sum and count
+        values = [0] * (len(self.buckets) + 1) + [value, 1]
+        values[next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] = 1
+        registry.add(self.name, tuple(str(labels[label]) for label in self.labelnames), values)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self, labels, values):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), values):
+            cumulative += count
+            le = bound if bound == '+Inf' else _number(float(bound))
+            yield f'{self.name}_bucket{_labels(labels, ("le", le))} {cumulative}'
+        yield f'{self.name}_sum{_labels(labels)} {_number(float(values[-2]))}'
+        yield f'{self.name}_count{_labels(labels)} {values[-1]}'
+
+
+REQUEST_SECONDS = Histogram(
+    'dusty_request_duration_seconds', 'API request latency by viewset action.', ['view', 'action', 'method', 'status'],
+)
+COMPLETION_SECONDS = Histogram(
+    'dusty_completion_milestones_seconds', 'Time spent updating stats, streaks and badges after completion changes.',
+)
+BADGE_SECONDS = Histogram(
+    'dusty_badge_evaluation_seconds', 'Time spent evaluating and storing badges for one completion.',
+)
+ACHIEVEMENTS_UNLOCKED = Counter(
+    'dusty_achievements_unlocked', 'Achievements unlocked, by category.', ['category'],
+)
+PUSH_SECONDS = Histogram(
+    'dusty_push_send_seconds', 'Web push send latency by push service origin and outcome.', ['origin', 'outcome'],
+)
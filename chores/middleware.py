@@ -0,0 +1,171 @@
+import logging
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('chores.queries')
+
+# Collapse literal lists so `IN (%s, %s)` and `IN (%s, %s, %s)` are the same shape
+IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+APP_DIR = str(settings.BASE_DIR)
+
+
+def query_shape(sql):
+    return IN_LIST.sub('(...)', sql)
+
+
+def _caller():
+    """The innermost frame in our own code that led to a query."""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and 'site-packages' not in frame.filename and not frame.filename.endswith('middleware.py'):
+            return f'{frame.filename[len(APP_DIR) + 1:]}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def _header_text(text, limit=80):
+    text = ' '.join(text.split())[:limit]
+    return text.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps per-request query counts, timings and shapes."""
+
+    def __init__(self, repeat_threshold):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.shapes = Counter()
+        self.repeated = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            self.statements.append((elapsed, sql))
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            # Only walk the stack once a shape looks like an N+1, and only once per shape
+            if self.shapes[shape] == self.repeat_threshold:
+                self.repeated[shape] = _caller()
+
+    def slowest(self, limit):
+        return sorted(self.statements, key=lambda statement: statement[0], reverse=True)[:limit]
+
+
+class QueryInstrumentationMiddleware:
+    """Per-request SQL count, DB time and slowest statements, as Server-Timing headers.
+
+    Opt in with QUERY_INSTRUMENTATION = True. Requests over
+    QUERY_LOG_MIN_MS or QUERY_LOG_MAX_QUERIES are logged to chores.queries,
+    and so is any statement shape issued QUERY_REPEAT_THRESHOLD times or
+    more in one request, with the view and the code that issued it.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'QUERY_LOG_MIN_MS', 500)
+        self.max_queries = getattr(settings, 'QUERY_LOG_MAX_QUERIES', 50)
+        self.repeat_threshold = getattr(settings, 'QUERY_REPEAT_THRESHOLD', 5)
+        self.slowest = getattr(settings, 'QUERY_TIMING_STATEMENTS', 3)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.repeat_threshold)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = recorder.duration * 1000
+
+        timings = [
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries"',
+            f'app;dur={total_ms - db_ms:.1f}',
+        ]
+        for index, (elapsed, sql) in enumerate(recorder.slowest(self.slowest), 1):
+            timings.append(f'sql-{index};dur={elapsed * 1000:.1f};desc="{_header_text(sql)}"')
+        response['Server-Timing'] = ', '.join(timings)
+
+        view = self._view_name(request)
+        if total_ms >= self.slow_ms or recorder.count >= self.max_queries:
+            logger.warning(
+                '%s %s (%s): %.0f ms, %d queries, %.0f ms in the database; slowest: %s',
+                request.method, request.path, view, total_ms, recorder.count, db_ms,
+                '; '.join(f'{elapsed * 1000:.1f} ms {sql[:200]}' for elapsed, sql in recorder.slowest(self.slowest)),
+            )
+        for shape, caller in recorder.repeated.items():
+            logger.warning(
+                'Possible N+1 in %s %s (%s): %d identical queries from %s: %s',
+                request.method, request.path, view, recorder.shapes[shape], caller or 'unknown', shape[:200],
+            )
+        return response
+
+    def _view_name(self, request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'no view'
+        return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """Times every request into dusty_request_duration_seconds, labelled by viewset and action.
+
+    Works in both sync and async chains, so it doesn't push the async views
+    back onto a thread under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        return self._observe(request, self.get_response(request), started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        return self._observe(request, await self.get_response(request), started)
+
+    def _observe(self, request, response, started):
+        view, action = self._labels(request)
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            view=view, action=action, method=request.method, status=f'{response.status_code // 100}xx',
+        )
+        return response
+
+    def _labels(self, request):
+        # Read off the resolved view rather than in process_view, which Django
+        # would have to run on a thread for async requests
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched', ''
+        # Router-built viewset views carry their class and the method -> action map
+        cls = getattr(match.func, 'cls', None)
+        if cls is not None:
+            actions = getattr(match.func, 'actions', None) or {}
+            return cls.__name__, actions.get(request.method.lower(), request.method.lower())
+        return getattr(match.func, '__name__', 'view'), ''
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# A frozen copy of chores.stats as of this migration, so later changes to the
+# app (or to UserStats' constants) can't change what this backfill does
+
+EARLY_BEFORE_HOUR = 9
+NIGHT_FROM_HOUR = 20
+RECENT_COMPLETIONS_SIZE = 10
+RECENT_DAYS_WINDOW = 14
+
+
+def completion_facts(completed_at, category, due_date):
+    local = timezone.localtime(completed_at) if timezone.is_aware(completed_at) else completed_at
+    return {
+        'completed_at': completed_at,
+        'day': local.date().isoformat(),
+        'early': local.hour < EARLY_BEFORE_HOUR,
+        'night': local.hour >= NIGHT_FROM_HOUR,
+        'weekend': local.weekday() >= 5,
+        'overdue': due_date is not None and due_date < completed_at,
+        'category': category or '',
+    }
+
+
+def apply_completion(stats, facts):
+    stats.total_completed += 1
+    if facts['early']:
+        stats.early_count += 1
+    if facts['night']:
+        stats.night_count += 1
+    if facts['weekend']:
+        stats.weekend_count += 1
+    if facts['overdue']:
+        stats.overdue_count += 1
+    categories = dict(stats.category_counts or {})
+    categories[facts['category']] = categories.get(facts['category'], 0) + 1
+    stats.category_counts = categories
+    recent = list(stats.recent_completions or [])
+    recent.append(facts['completed_at'].isoformat())
+    recent.sort(key=parse_datetime, reverse=True)
+    stats.recent_completions = recent[:RECENT_COMPLETIONS_SIZE]
+    days = dict(stats.recent_days or {})
+    days[facts['day']] = days.get(facts['day'], 0) + 1
+    stats.recent_days = dict(sorted(days.items(), reverse=True)[:RECENT_DAYS_WINDOW])
+
+
+def backfill_user_stats(apps, schema_editor):
+    Chore = apps.get_model('chores', 'Chore')
+    UserStats = apps.get_model('chores', 'UserStats')
+    stats_by_user = {}
+    completed = Chore.objects.filter(completed_at__isnull=False, assignee__isnull=False).order_by('assignee_id', 'completed_at')
+    for assignee_id, completed_at, category, due_date in completed.values_list('assignee_id', 'completed_at', 'category', 'due_date').iterator():
+        stats = stats_by_user.get(assignee_id)
+        if stats is None:
+            stats = stats_by_user[assignee_id] = UserStats(user_id=assignee_id)
+        apply_completion(stats, completion_facts(completed_at, category, due_date))
+    UserStats.objects.bulk_create(stats_by_user.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0003_pushsubscription'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_completed', models.IntegerField(default=0)),
+                ('early_count', models.IntegerField(default=0)),
+                ('night_count', models.IntegerField(default=0)),
+                ('weekend_count', models.IntegerField(default=0)),
+                ('overdue_count', models.IntegerField(default=0)),
+                ('category_counts', models.JSONField(blank=True, default=dict)),
+                ('recent_completions', models.JSONField(blank=True, default=list)),
+                ('recent_days', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='completion_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0005_pushjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(fields=['created_at', 'id'], name='chore_created_idx'),
+        ),
+    ]
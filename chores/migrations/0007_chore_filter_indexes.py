@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0006_chore_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chore',
+            name='assignee',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(fields=['assignee', 'completed_at'], name='chore_assignee_done_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(fields=['due_date'], name='chore_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(fields=['category'], name='chore_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(condition=models.Q(('completed_at__isnull', True)), fields=['due_date'], name='chore_pending_due_idx'),
+        ),
+    ]
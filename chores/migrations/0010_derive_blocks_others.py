@@ -0,0 +1,21 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+def derive_blocks_others(apps, schema_editor):
+    Chore = apps.get_model('chores', 'Chore')
+    DependencyEdge = Chore.dependencies.through
+    has_dependents = Exists(DependencyEdge.objects.filter(to_chore_id=OuterRef('pk')))
+    Chore.objects.filter(has_dependents).update(blocks_others=True)
+    Chore.objects.exclude(has_dependents).update(blocks_others=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0009_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(derive_blocks_others, migrations.RunPython.noop),
+    ]
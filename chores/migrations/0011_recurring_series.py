@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0010_derive_blocks_others'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chore',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chore',
+            name='rolled_over_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chore',
+            name='series_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(condition=models.Q(('is_recurring', True), ('rolled_over_at__isnull', True)), fields=['due_date', 'id'], name='chore_recurring_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='chore',
+            constraint=models.UniqueConstraint(condition=models.Q(('series_id__isnull', False)), fields=('series_id', 'occurrence_date'), name='chore_series_occurrence_uniq'),
+        ),
+    ]
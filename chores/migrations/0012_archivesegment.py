@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0011_recurring_series'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('chore_count', models.IntegerField()),
+                ('first_completed_at', models.DateTimeField()),
+                ('last_completed_at', models.DateTimeField()),
+                ('raw_bytes', models.BigIntegerField()),
+                ('compressed_bytes', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('per_user', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='chore',
+            index=models.Index(condition=models.Q(('completed_at__isnull', False)), fields=['completed_at', 'id'], name='chore_completed_idx'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:07
+
+import gzip
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Frozen copies of chores.activity and chores.archive.read_segment as of this
+# migration, so later changes to the app can't change what this backfill does
+
+def to_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def from_days(days):
+    epoch = min(days)
+    value = 0
+    for day in days:
+        value |= 1 << (day - epoch).days
+    return epoch, to_bytes(value)
+
+
+def streaks(bits):
+    value = int.from_bytes(bits, 'little')
+    index = value.bit_length() - 1
+    gaps = ~value & ((1 << (index + 1)) - 1)
+    current = index + 1 - gaps.bit_length()
+    longest = 0
+    while value:
+        value &= value >> 1
+        longest += 1
+    return current, longest
+
+
+def read_segment(segment):
+    archive_dir = Path(getattr(settings, 'ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+    with gzip.open(archive_dir / segment.path, 'rt') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def backfill_activity(apps, schema_editor):
+    Chore = apps.get_model('chores', 'Chore')
+    Profile = apps.get_model('chores', 'Profile')
+    ArchiveSegment = apps.get_model('chores', 'ArchiveSegment')
+    days_by_user = {}
+    completed = Chore.objects.filter(completed_at__isnull=False, assignee__isnull=False)
+    for assignee_id, completed_at in completed.values_list('assignee_id', 'completed_at').iterator():
+        days_by_user.setdefault(assignee_id, set()).add(timezone.localdate(completed_at))
+    for segment in ArchiveSegment.objects.all():
+        try:
+            for record in read_segment(segment):
+                if record['assignee_id'] and record['completed_at']:
+                    moment = timezone.datetime.fromisoformat(record['completed_at'])
+                    days_by_user.setdefault(record['assignee_id'], set()).add(timezone.localdate(moment))
+        except FileNotFoundError:
+            pass
+    profiles = list(Profile.objects.filter(user_id__in=list(days_by_user)))
+    for profile in profiles:
+        profile.activity_epoch, profile.activity_bits = from_days(days_by_user[profile.user_id])
+        profile.current_streak, profile.longest_streak = streaks(profile.activity_bits)
+    Profile.objects.bulk_update(profiles, ['activity_epoch', 'activity_bits', 'current_streak', 'longest_streak'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0012_archivesegment'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userstats',
+            name='recent_days',
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='activity_bits',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='activity_epoch',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
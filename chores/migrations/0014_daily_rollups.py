@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:20
+
+import gzip
+import json
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+# A frozen copy of chores.rollups.build_rows (and the archive reader) as of
+# this migration, so later changes to the app can't change what this backfill does
+
+def read_segment(segment):
+    archive_dir = Path(getattr(settings, 'ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+    with gzip.open(archive_dir / segment.path, 'rt') as lines:
+        for line in lines:
+            yield json.loads(line)
+
+
+def local_day(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def contributions(state):
+    key = (state['assignee_id'] or 0, state['category'] or '', state['priority'] or '')
+    result = Counter({(local_day(state['created_at']), *key, 'created'): 1})
+    completed_at, due_date = state['completed_at'], state['due_date']
+    if completed_at:
+        result[(local_day(completed_at), *key, 'completed')] += 1
+        if due_date is not None and due_date < completed_at:
+            result[(local_day(completed_at), *key, 'completed_late')] += 1
+    elif due_date is not None:
+        result[(local_day(due_date), *key, 'due_pending')] += 1
+    return result
+
+
+def grouped(queryset, moment, **counters):
+    return queryset.values(
+        day=TruncDate(moment), user=Coalesce('assignee_id', 0), cat=F('category'), pri=F('priority'),
+    ).annotate(**counters).order_by()
+
+
+def build_rows(Chore, ArchiveSegment):
+    totals = Counter()
+    chores = Chore.objects.all()
+    for row in grouped(chores, 'created_at', n=Count('id')):
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'created')] += row['n']
+    completed = grouped(
+        chores.filter(completed_at__isnull=False), 'completed_at',
+        n=Count('id'), late=Count('id', filter=Q(due_date__lt=F('completed_at'))),
+    )
+    for row in completed:
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'completed')] += row['n']
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'completed_late')] += row['late']
+    for row in grouped(chores.filter(completed_at__isnull=True, due_date__isnull=False), 'due_date', n=Count('id')):
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'due_pending')] += row['n']
+    parse = timezone.datetime.fromisoformat
+    for segment in ArchiveSegment.objects.all():
+        try:
+            for record in read_segment(segment):
+                totals.update(contributions({
+                    'assignee_id': record['assignee_id'],
+                    'category': record['category'],
+                    'priority': record['priority'],
+                    'created_at': parse(record['created_at']),
+                    'completed_at': record['completed_at'] and parse(record['completed_at']),
+                    'due_date': record['due_date'] and parse(record['due_date']),
+                }))
+        except FileNotFoundError:
+            pass
+    rows = {}
+    for (day, assignee_id, category, priority, counter), value in totals.items():
+        if value:
+            rows.setdefault((day, assignee_id, category, priority), {})[counter] = value
+    return rows
+
+
+def backfill_rollups(apps, schema_editor):
+    DailyRollup = apps.get_model('chores', 'DailyRollup')
+    rows = build_rows(apps.get_model('chores', 'Chore'), apps.get_model('chores', 'ArchiveSegment'))
+    DailyRollup.objects.bulk_create([
+        DailyRollup(day=day, assignee_id=assignee_id, category=category, priority=priority, **counters)
+        for (day, assignee_id, category, priority), counters in rows.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chores', '0013_profile_activity_bitmap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('assignee_id', models.BigIntegerField(default=0)),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('priority', models.CharField(max_length=10)),
+                ('created', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('completed_late', models.IntegerField(default=0)),
+                ('due_pending', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['assignee_id', 'day'], name='rollup_assignee_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'assignee_id', 'category', 'priority'), name='rollup_key_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
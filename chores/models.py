@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
-from pywebpush import webpush, WebPushException
-from django.conf import settings
-import json
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -13,6 +14,15 @@ class Profile(models.Model):
     last_login_at = models.DateTimeField(blank=True, null=True)
     current_streak = models.IntegerField(default=0)
     longest_streak = models.IntegerField(default=0)
+    # Day-indexed completion bitmap, see chores.activity
+    activity_epoch = models.DateField(null=True, blank=True)
+    activity_bits = models.BinaryField(default=b'', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='profile_updated_idx'),
+        ]
 
     def __str__(self):
         return self.display_name
@@ -20,7 +30,8 @@ class Profile(models.Model):
 class Chore(models.Model):
     title = models.CharField(max_length=100)
     description = models.TextField(max_length=500, blank=True)
-    assignee = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='chores')
+    # Indexed through chore_assignee_done_idx, which leads with assignee
+    assignee = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='chores', db_index=False)
     due_date = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -31,10 +42,80 @@ class Chore(models.Model):
     category = models.CharField(max_length=50, blank=True)
     dependencies = models.ManyToManyField('self', blank=True, symmetrical=False)
     blocks_others = models.BooleanField(default=False)
+    # Recurring chores: every occurrence shares the series id (the first chore's id)
+    series_id = models.BigIntegerField(null=True, blank=True)
+    occurrence_date = models.DateField(null=True, blank=True)
+    # Set once the scheduler has created this occurrence's successor
+    rolled_over_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the chore list walks this index newest-first
+            models.Index(fields=['created_at', 'id'], name='chore_created_idx'),
+            # Delta sync walks changes in (updated_at, id) order
+            models.Index(fields=['updated_at', 'id'], name='chore_updated_idx'),
+            # Server-side list filters (see chores.filters)
+            models.Index(fields=['assignee', 'completed_at'], name='chore_assignee_done_idx'),
+            models.Index(fields=['due_date'], name='chore_due_idx'),
+            models.Index(fields=['category'], name='chore_category_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(completed_at__isnull=True), name='chore_pending_due_idx'),
+            # Archiving walks completed chores oldest first
+            models.Index(fields=['completed_at', 'id'], condition=models.Q(completed_at__isnull=False), name='chore_completed_idx'),
+            # The recurrence scheduler walks the occurrences still waiting to roll over
+            models.Index(fields=['due_date', 'id'], condition=models.Q(is_recurring=True, rolled_over_at__isnull=True), name='chore_recurring_due_idx'),
+        ]
+        constraints = [
+            # Makes materializing an occurrence idempotent
+            models.UniqueConstraint(fields=['series_id', 'occurrence_date'], condition=models.Q(series_id__isnull=False), name='chore_series_occurrence_uniq'),
+        ]
+
+    # What completion_state() reads; the stats and rollup signals diff these
+    COMPLETION_STATE_FIELDS = ('assignee_id', 'completed_at', 'category', 'due_date', 'priority', 'created_at')
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the completion-related state as loaded, so the post_save
+        # handler can tell a new completion from a re-save without a query.
+        instance._completion_snapshot = instance.completion_state()
+        return instance
+
+    def completion_state(self):
+        loaded = self.__dict__
+        if not all(name in loaded for name in self.COMPLETION_STATE_FIELDS):
+            return None
+        # to_python() normalises datetimes assigned as ISO strings before the save
+        return {
+            'assignee_id': self.assignee_id,
+            'completed_at': self._meta.get_field('completed_at').to_python(self.completed_at),
+            'category': self.category,
+            'due_date': self._meta.get_field('due_date').to_python(self.due_date),
+            # Only the daily rollups look at these two
+            'priority': self.priority,
+            'created_at': self.created_at,
+        }
+
+class UserStats(models.Model):
+    RECENT_COMPLETIONS_SIZE = 10
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='completion_stats')
+    total_completed = models.IntegerField(default=0)
+    early_count = models.IntegerField(default=0)
+    night_count = models.IntegerField(default=0)
+    weekend_count = models.IntegerField(default=0)
+    overdue_count = models.IntegerField(default=0)
+    # {category: number of completed chores}; the keys with a positive count form the category set
+    category_counts = models.JSONField(default=dict, blank=True)
+    # Ring buffer of the most recent completion timestamps (ISO 8601, newest first)
+    recent_completions = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stats for {self.user.username} ({self.total_completed} completed)"
+
 class Achievement(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements')
     title = models.CharField(max_length=100)
@@ -47,6 +128,12 @@ class Achievement(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     rarity = models.CharField(max_length=10, choices=[('common', 'Common'), ('rare', 'Rare'), ('epic', 'Epic'), ('legendary', 'Legendary')], default='common')
     points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='achievement_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} ({self.user.username})"
@@ -61,23 +148,133 @@ class PushSubscription(models.Model):
     def __str__(self):
         return f"PushSubscription for {self.user.username} ({self.endpoint[:30]}...)"
 
-# Utility function to send a web push notification
+class Tombstone(models.Model):
+    """Records a deleted row so offline clients can drop it on their next delta sync."""
+    MODEL_CHOICES = [('chore', 'Chore'), ('achievement', 'Achievement'), ('profile', 'Profile')]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    # User id for rows only their owner can see (achievements); null means household-wide.
+    # Not a foreign key: tombstones must outlive the user whose deletion produced them.
+    owner_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.model} {self.object_id}"
+
+class ArchiveSegment(models.Model):
+    """A gzip NDJSON file holding completed chores moved out of the chore table."""
+    path = models.CharField(max_length=255, unique=True)  # relative to ARCHIVE_DIR
+    chore_count = models.IntegerField()
+    first_completed_at = models.DateTimeField()
+    last_completed_at = models.DateTimeField()
+    raw_bytes = models.BigIntegerField()
+    compressed_bytes = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    # Archived completions per assignee id; their stats already count them
+    per_user = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.path} ({self.chore_count} chores)"
+
+class DataVersion(models.Model):
+    """A counter bumped whenever the data behind a scope ('chores', 'achievements:<user id>', ...) changes.
+
+    Responses derive their ETag from it, so conditional requests are answered
+    from this table alone.
+    """
+    scope = models.CharField(max_length=64, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+
+class PushJob(models.Model):
+    STATUS_CHOICES = [('pending', 'Pending'), ('failed', 'Failed')]
+
+    subscription = models.ForeignKey(PushSubscription, on_delete=models.CASCADE, related_name='jobs')
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    # Pending jobs become claimable at this time; claiming pushes it out by a lease
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='pushjob_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"PushJob {self.pk} ({self.status}, {self.attempts} attempts)"
+
+# Utility function to send a web push notification right away (the API queues
+# them instead, see chores.push and the push_worker command)
 
 def send_web_push(subscription, payload):
-    try:
-        webpush(
-            subscription_info={
-                "endpoint": subscription.endpoint,
-                "keys": {
-                    "p256dh": subscription.p256dh,
-                    "auth": subscription.auth,
-                },
-            },
-            data=json.dumps(payload),
-            vapid_private_key=getattr(settings, 'VAPID_PRIVATE_KEY', None),
-            vapid_claims={
-                "sub": "mailto:admin@example.com"
-            },
-        )
-    except WebPushException as ex:
-        print(f"Web push failed: {ex}")
+    from .push import get_sender, SENT
+    outcome, error = get_sender().send(subscription, payload)
+    if outcome != SENT:
+        logger.warning("Web push failed (%s): %s", outcome, error)
+    return outcome
+
+class DailyRollup(models.Model):
+    """Per day, assignee, category and priority counters derived from the chores (see chores.rollups).
+
+    Each chore adds to `created` on the day it was created, to `completed`
+    (and `completed_late` if it was done after its due date) on the day it
+    was completed, and, while pending, to `due_pending` on its due day.
+    Days are local dates.
+    """
+    day = models.DateField()
+    # 0 for unassigned chores. Not a foreign key: deleting a user folds their rows into 0
+    assignee_id = models.BigIntegerField(default=0)
+    category = models.CharField(max_length=50, blank=True)
+    priority = models.CharField(max_length=10)
+    created = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    completed_late = models.IntegerField(default=0)
+    due_pending = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'assignee_id', 'category', 'priority'], name='rollup_key_uniq'),
+        ]
+        indexes = [
+            # Per-user range queries; household ones use the unique index
+            models.Index(fields=['assignee_id', 'day'], name='rollup_assignee_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} user {self.assignee_id} {self.category}/{self.priority}"
+
+
+class LiveEvent(models.Model):
+    """One entry of the live event stream at /api/events/ (see chores.live).
+
+    The id doubles as the Server-Sent Events id that clients resume from.
+    Events without a user go to the whole household.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    kind = models.CharField(max_length=40)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Old events are pruned by age
+            models.Index(fields=['created_at'], name='liveevent_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
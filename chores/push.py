@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import nullcontext
+from urllib.parse import urlparse
+
+import aiohttp
+import requests
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from py_vapid import Vapid
+from pywebpush import WebPusher
+
+from .models import PushJob, PushSubscription
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'PUSH_MAX_ATTEMPTS', 6)
+BACKOFF_BASE_SECONDS = getattr(settings, 'PUSH_BACKOFF_BASE_SECONDS', 30)
+BACKOFF_MAX_SECONDS = getattr(settings, 'PUSH_BACKOFF_MAX_SECONDS', 60 * 60)
+CLAIM_LEASE_SECONDS = getattr(settings, 'PUSH_CLAIM_LEASE_SECONDS', 120)
+SEND_TIMEOUT_SECONDS = getattr(settings, 'PUSH_SEND_TIMEOUT_SECONDS', 10)
+
+# Push services answer these when a subscription has expired or been revoked
+GONE_STATUS_CODES = (404, 410)
+
+SENT, GONE, RETRY = 'sent', 'gone', 'retry'
+
+
+def enqueue_push(subscriptions, payload):
+    """Queue one delivery per subscription; never talks to a push service.
+
+    `subscriptions` is a PushSubscription queryset, so fan-out to any number
+    of devices costs one SELECT and one bulk INSERT.
+    """
+    jobs = [PushJob(subscription_id=pk, payload=payload) for pk in subscriptions.values_list('pk', flat=True)]
+    return PushJob.objects.bulk_create(jobs)
+
+
+def notify_users(users, payload):
+    """Queue a notification for every device registered by the given users (ids or a queryset)."""
+    return enqueue_push(PushSubscription.objects.filter(user__in=users), payload)
+
+
+def claim_jobs(limit):
+    """Lease up to `limit` due jobs so that other workers skip them.
+
+    A worker that dies mid-batch simply lets the lease run out and the jobs
+    become due again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = PushJob.objects.select_for_update(skip_locked=True).filter(status='pending', next_attempt_at__lte=now)
+        jobs = list(due.select_related('subscription').order_by('next_attempt_at')[:limit])
+        if jobs:
+            PushJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                next_attempt_at=now + timezone.timedelta(seconds=CLAIM_LEASE_SECONDS)
+            )
+    return jobs
+
+
+class SendReport:
+    """Outcome of a send_many() call: [(subscription, outcome, error), ...] plus timing."""
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    def count(self, outcome):
+        return sum(1 for _, result, _ in self.results if result == outcome)
+
+    @property
+    def throughput(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+
+class WebPushSender:
+    """Reusable web push sender.
+
+    The VAPID key is parsed once, signed VAPID headers are cached per push
+    service origin until shortly before they expire, and each origin gets a
+    pooled HTTP session so consecutive sends reuse the same connections.
+    Safe to share between threads.
+    """
+
+    VAPID_LIFETIME_SECONDS = 12 * 60 * 60
+    VAPID_RENEW_MARGIN_SECONDS = 5 * 60
+
+    def __init__(self, private_key=None, subject=None, timeout=SEND_TIMEOUT_SECONDS, pool_size=16, ttl=0):
+        private_key = private_key if private_key is not None else getattr(settings, 'VAPID_PRIVATE_KEY', None)
+        if not private_key:
+            self.vapid = None
+        elif os.path.isfile(private_key):
+            self.vapid = Vapid.from_file(private_key_file=private_key)
+        else:
+            self.vapid = Vapid.from_string(private_key=private_key)
+        self.subject = subject or getattr(settings, 'VAPID_SUBJECT', 'mailto:admin@example.com')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self._headers = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def origin(endpoint):
+        url = urlparse(endpoint)
+        return f"{url.scheme}://{url.netloc}"
+
+    def vapid_headers(self, origin):
+        if self.vapid is None:
+            return {}
+        now = time.time()
+        with self._lock:
+            cached = self._headers.get(origin)
+            if cached and cached[1] - self.VAPID_RENEW_MARGIN_SECONDS > now:
+                return cached[0]
+            expires = int(now) + self.VAPID_LIFETIME_SECONDS
+            headers = self.vapid.sign({'sub': self.subject, 'aud': origin, 'exp': expires})
+            self._headers[origin] = (headers, expires)
+            return headers
+
+    def session(self, origin):
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(origin, adapter)
+                self._sessions[origin] = session
+            return session
+
+    def send(self, subscription, payload, data=None):
+        """Send one notification. Returns (outcome, error message)."""
+        origin = self.origin(subscription.endpoint)
+        started = time.perf_counter()
+        outcome, error = self._send(origin, subscription, payload, data)
+        metrics.PUSH_SECONDS.observe(time.perf_counter() - started, origin=origin, outcome=outcome)
+        return outcome, error
+
+    @staticmethod
+    def subscription_info(subscription):
+        return {
+            "endpoint": subscription.endpoint,
+            "keys": {
+                "p256dh": subscription.p256dh,
+                "auth": subscription.auth,
+            },
+        }
+
+    def _send(self, origin, subscription, payload, data):
+        try:
+            response = WebPusher(self.subscription_info(subscription), requests_session=self.session(origin)).send(
+                data if data is not None else json.dumps(payload),
+                dict(self.vapid_headers(origin)),
+                ttl=self.ttl,
+                timeout=self.timeout,
+            )
+        except Exception as ex:  # network errors, bad subscription keys...
+            return RETRY, repr(ex)
+        if response.status_code in GONE_STATUS_CODES:
+            return GONE, f"{response.status_code} {response.reason}"
+        if response.status_code > 202:
+            return RETRY, f"{response.status_code} {response.reason}: {response.text[:500]}"
+        return SENT, ''
+
+    def async_session(self):
+        """An aiohttp session for send_async(), keeping up to pool_size connections per push service."""
+        return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size))
+
+    async def send_async(self, subscription, payload, data=None, session=None):
+        """send() on the event loop, through aiohttp. Returns (outcome, error message)."""
+        origin = self.origin(subscription.endpoint)
+        started = time.perf_counter()
+        outcome, error = await self._send_async(origin, subscription, payload, data, session)
+        metrics.PUSH_SECONDS.observe(time.perf_counter() - started, origin=origin, outcome=outcome)
+        return outcome, error
+
+    async def _send_async(self, origin, subscription, payload, data, session):
+        try:
+            response = await WebPusher(self.subscription_info(subscription), aiohttp_session=session).send_async(
+                data if data is not None else json.dumps(payload),
+                dict(self.vapid_headers(origin)),
+                ttl=self.ttl,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            text = await response.text()
+        except Exception as ex:  # network errors, bad subscription keys...
+            return RETRY, repr(ex)
+        if response.status in GONE_STATUS_CODES:
+            return GONE, f"{response.status} {response.reason}"
+        if response.status > 202:
+            return RETRY, f"{response.status} {response.reason}: {text[:500]}"
+        return SENT, ''
+
+    async def send_many_async(self, subscriptions, payload, concurrency=None, session=None):
+        """send_many() on the event loop, with up to `concurrency` (default pool_size) sends in flight."""
+        data = json.dumps(payload)
+        subscriptions = list(subscriptions)
+        limit = asyncio.Semaphore(concurrency or self.pool_size)
+        started = time.monotonic()
+
+        async def send(subscription, session):
+            async with limit:
+                return await self.send_async(subscription, payload, data=data, session=session)
+
+        async with self.async_session() if session is None else nullcontext(session) as session:
+            outcomes = await asyncio.gather(*(send(subscription, session) for subscription in subscriptions))
+        return SendReport(
+            [(subscription, outcome, error) for subscription, (outcome, error) in zip(subscriptions, outcomes)],
+            time.monotonic() - started,
+        )
+
+    def send_many(self, subscriptions, payload, executor=None):
+        """Send the same payload to many subscriptions, concurrently if an executor is given."""
+        data = json.dumps(payload)
+        subscriptions = list(subscriptions)
+        started = time.monotonic()
+        mapper = executor.map if executor is not None else map
+        outcomes = list(mapper(lambda subscription: self.send(subscription, payload, data=data), subscriptions))
+        return SendReport(
+            [(subscription, outcome, error) for subscription, (outcome, error) in zip(subscriptions, outcomes)],
+            time.monotonic() - started,
+        )
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """Process-wide sender built from settings on first use."""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = WebPushSender()
+        return _sender
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timezone.timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def record_results(results):
+    """Persist the outcome of a delivered batch: [(job, outcome, error), ...]."""
+    sent = [job.pk for job, outcome, _ in results if outcome == SENT]
+    gone = {job.subscription_id for job, outcome, _ in results if outcome == GONE}
+    now = timezone.now()
+    retried = []
+    for job, outcome, error in results:
+        if outcome != RETRY:
+            continue
+        job.attempts += 1
+        job.last_error = error[:2000]
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = 'failed'
+            logger.warning('Giving up on push job %s after %s attempts: %s', job.pk, job.attempts, error)
+        job.next_attempt_at = now + backoff_delay(job.attempts)
+        retried.append(job)
+    with transaction.atomic():
+        if sent:
+            PushJob.objects.filter(pk__in=sent).delete()
+        if gone:
+            # Deleting the subscription cascades to its queued jobs
+            PushSubscription.objects.filter(pk__in=gone).delete()
+        if retried:
+            PushJob.objects.bulk_update(retried, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+    return {'sent': len(sent), 'pruned': len(gone), 'retried': len(retried)}
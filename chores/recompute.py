@@ -0,0 +1,196 @@
+"""Rebuild stats, streaks and badges from the completion history.
+
+The signal path only ever sees one change at a time. This replays every
+completion of every user in memory instead, in (assignee, completed_at)
+order, and writes the results back in bulk.
+"""
+import itertools
+from datetime import date
+from heapq import merge
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .achievements import RULES, AchievementContext
+from .activity import mark_day, run_ending_at, streaks, to_int
+from .models import Achievement, ArchiveSegment, Chore, Profile, UserStats
+from .stats import apply_completion, completion_facts
+from . import versions
+
+STATS_FIELDS = ['total_completed', 'early_count', 'night_count', 'weekend_count', 'overdue_count', 'category_counts', 'recent_completions']
+PROFILE_FIELDS = ['current_streak', 'longest_streak', 'activity_epoch', 'activity_bits']
+
+
+def user_ranges(shards):
+    """Split the user ids into up to `shards` contiguous [low, high] ranges of similar size."""
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    size = max(-(-len(user_ids) // max(shards, 1)), 1)
+    return [(chunk[0], chunk[-1]) for chunk in (user_ids[i:i + size] for i in range(0, len(user_ids), size))]
+
+
+def _archived(low, high):
+    from .archive import read_segment
+    archived = {}
+    for segment in ArchiveSegment.objects.order_by('first_completed_at', 'id'):
+        if not any(low <= int(user_id) <= high for user_id in segment.per_user):
+            continue
+        for record in read_segment(segment):
+            if record['assignee_id'] and low <= record['assignee_id'] <= high and record['completed_at']:
+                due_date = record['due_date'] and timezone.datetime.fromisoformat(record['due_date'])
+                archived.setdefault(record['assignee_id'], []).append(
+                    (timezone.datetime.fromisoformat(record['completed_at']), record['category'], due_date)
+                )
+    for completions in archived.values():
+        completions.sort(key=lambda completion: completion[0])
+    return archived
+
+
+def replay(user_id, completions, with_badges=True):
+    """Replay one user's completions, oldest first, the way the signals would have seen them."""
+    stats = UserStats(user_id=user_id)
+    scratch = Profile(user_id=user_id)
+    unlocked, count = {}, 0
+    for completed_at, category, due_date in completions:
+        count += 1
+        facts = completion_facts(completed_at, category, due_date)
+        apply_completion(stats, facts)
+        mark_day(scratch, date.fromisoformat(facts['day']))
+        if not with_badges:
+            continue
+        value = to_int(scratch.activity_bits)
+        scratch.current_streak = run_ending_at(value, value.bit_length() - 1)
+        context = AchievementContext(stats=stats, profile=scratch, completed_at=completed_at)
+        for title, rule in RULES.items():
+            if title not in unlocked and rule.predicate(context):
+                unlocked[title] = completed_at
+    current, longest = streaks(scratch)
+    return {
+        'user_id': user_id,
+        'completions': count,
+        'stats': {field: getattr(stats, field) for field in STATS_FIELDS},
+        'profile': {
+            'current_streak': current,
+            'longest_streak': longest,
+            'activity_epoch': scratch.activity_epoch,
+            'activity_bits': scratch.activity_bits,
+        },
+        'unlocked': unlocked,
+    }
+
+
+def recompute_range(low, high, chunk_size=2000):
+    """Replay every user with an id in [low, high]. Runs in a worker process.
+
+    Completions are streamed with .iterator() through chore_assignee_done_idx
+    and merged with the user's archived ones, so memory stays bounded by the
+    busiest user rather than the table.
+    """
+    user_ids = list(User.objects.filter(id__gte=low, id__lte=high).order_by('id').values_list('id', flat=True))
+    with_profile = set(Profile.objects.filter(user_id__gte=low, user_id__lte=high).values_list('user_id', flat=True))
+    archived = _archived(low, high)
+    live = (
+        Chore.objects.filter(assignee_id__gte=low, assignee_id__lte=high, completed_at__isnull=False)
+        .order_by('assignee_id', 'completed_at')
+        .values_list('assignee_id', 'completed_at', 'category', 'due_date')
+        .iterator(chunk_size=chunk_size)
+    )
+    results = []
+    # Both sequences are ordered by user id; walk them side by side
+    rows_by_user = itertools.groupby(live, key=lambda row: row[0])
+    group = next(rows_by_user, None)
+    for user_id in user_ids:
+        rows = ()
+        if group is not None and group[0] == user_id:
+            rows = (row[1:] for row in group[1])
+            group = None
+        completions = merge(rows, archived.get(user_id, ()), key=lambda completion: completion[0])
+        results.append(replay(user_id, completions, with_badges=user_id in with_profile))
+        if group is None:
+            group = next(rows_by_user, None)
+    return results
+
+
+def _differs(profile, expected):
+    return any(
+        bytes(profile.activity_bits or b'') != bytes(value or b'') if field == 'activity_bits' else getattr(profile, field) != value
+        for field, value in expected.items()
+    )
+
+
+def apply_results(results, dry_run=False, revoke=False):
+    """Write one batch of replayed users back with bulk_update/bulk_create.
+
+    Returns {user_id: [change descriptions]} for the users that differed.
+    """
+    user_ids = [result['user_id'] for result in results]
+    diff = {}
+    with transaction.atomic():
+        stats = {row.user_id: row for row in UserStats.objects.select_for_update().filter(user_id__in=user_ids)}
+        profiles = {row.user_id: row for row in Profile.objects.select_for_update().filter(user_id__in=user_ids)}
+        achievements = {}
+        for row in Achievement.objects.filter(user_id__in=user_ids, title__in=list(RULES)):
+            achievements.setdefault(row.user_id, {})[row.title] = row
+        stats_create, stats_update, profile_update, badge_create, badge_update = [], [], [], [], []
+        now = timezone.now()
+        for result in results:
+            user_id, changes = result['user_id'], []
+            row = stats.get(user_id)
+            if row is None:
+                if result['completions']:
+                    stats_create.append(UserStats(user_id=user_id, **result['stats']))
+                    changes.append(f"stats: created ({result['stats']['total_completed']} completed)")
+            elif any(getattr(row, field) != value for field, value in result['stats'].items()):
+                changes.append(f"stats: total {row.total_completed} -> {result['stats']['total_completed']}")
+                for field, value in result['stats'].items():
+                    setattr(row, field, value)
+                row.updated_at = now
+                stats_update.append(row)
+
+            profile = profiles.get(user_id)
+            if profile is not None:
+                expected = result['profile']
+                if (profile.current_streak, profile.longest_streak) != (expected['current_streak'], expected['longest_streak']):
+                    changes.append(
+                        f"streak: {profile.current_streak}/{profile.longest_streak} -> {expected['current_streak']}/{expected['longest_streak']}"
+                    )
+                if _differs(profile, expected):
+                    for field, value in expected.items():
+                        setattr(profile, field, value)
+                    profile.updated_at = now
+                    profile_update.append(profile)
+
+                held = achievements.get(user_id, {})
+                for title, completed_at in result['unlocked'].items():
+                    badge = held.get(title)
+                    if badge is None:
+                        badge_create.append(RULES[title].build(user_id, completed_at))
+                        changes.append(f'+ {title}')
+                    elif not badge.completed:
+                        badge.completed, badge.completed_at, badge.progress, badge.updated_at = True, completed_at, badge.requirement, now
+                        badge_update.append(badge)
+                        changes.append(f'+ {title}')
+                for title, badge in held.items():
+                    if badge.completed and title not in result['unlocked']:
+                        changes.append(f'- {title}' if revoke else f'? {title} (no longer earned, kept)')
+                        if revoke:
+                            badge.completed, badge.completed_at, badge.updated_at = False, None, now
+                            badge_update.append(badge)
+            if changes:
+                diff[user_id] = changes
+
+        if not dry_run:
+            UserStats.objects.bulk_create(stats_create, batch_size=500)
+            if stats_update:
+                UserStats.objects.bulk_update(stats_update, STATS_FIELDS + ['updated_at'], batch_size=500)
+            if profile_update:
+                Profile.objects.bulk_update(profile_update, PROFILE_FIELDS + ['updated_at'], batch_size=500)
+            Achievement.objects.bulk_create(badge_create, batch_size=500)
+            if badge_update:
+                Achievement.objects.bulk_update(badge_update, ['completed', 'completed_at', 'progress', 'updated_at'], batch_size=500)
+    return diff
+
+
+def finish(changed_user_ids):
+    """Bulk writes skip the signals: bump the data versions the caches are keyed by."""
+    versions.bump(versions.PROFILES, versions.LEADERBOARD, versions.ACHIEVEMENTS, *(versions.user_achievements(user_id) for user_id in changed_user_ids))
@@ -0,0 +1,124 @@
+import calendar
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Chore
+from .signals import record_live_events, record_rollup_changes
+from . import live, rollups, versions
+
+CHUNK_SIZE = getattr(settings, 'RECURRENCE_CHUNK_SIZE', 500)
+PATTERNS = ('daily', 'weekly', 'monthly')
+# Copied from an occurrence to the next one
+COPIED_FIELDS = ['title', 'description', 'assignee_id', 'is_recurring', 'recurrence_pattern', 'priority', 'category']
+
+
+def _add_months(moment, months):
+    month = moment.month - 1 + months
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    # Jan 31 + 1 month is the last day of February
+    return moment.replace(year=year, month=month, day=min(moment.day, calendar.monthrange(year, month)[1]))
+
+
+def _advance(moment, pattern, steps):
+    if pattern == 'daily':
+        return moment + timezone.timedelta(days=steps)
+    if pattern == 'weekly':
+        return moment + timezone.timedelta(weeks=steps)
+    return _add_months(moment, steps)
+
+
+def next_occurrence(due_date, pattern, now):
+    """The first due date of the series after `now`.
+
+    Periods missed while the scheduler wasn't running are skipped, not
+    back-filled. Steps are counted from `due_date` in local time, so monthly
+    series keep their day of month and daily ones their wall-clock time.
+    """
+    local = timezone.localtime(due_date).replace(tzinfo=None)
+    local_now = timezone.localtime(now).replace(tzinfo=None)
+    if pattern == 'monthly':
+        steps = max((local_now.year - local.year) * 12 + local_now.month - local.month, 1)
+    else:
+        period = timezone.timedelta(days=1 if pattern == 'daily' else 7)
+        steps = max((local_now - local) // period, 1)
+    while _advance(local, pattern, steps) <= local_now:
+        steps += 1
+    return timezone.make_aware(_advance(local, pattern, steps))
+
+
+def _next(chore, now):
+    due_date = next_occurrence(chore.due_date, chore.recurrence_pattern, now)
+    return Chore(
+        **{field: getattr(chore, field) for field in COPIED_FIELDS},
+        due_date=due_date,
+        series_id=chore.series_id or chore.pk,
+        occurrence_date=timezone.localdate(due_date),
+    )
+
+
+def _record_created(occurrences):
+    """Feed the rollups and live events the occurrences this run wrote, and return how many there were.
+
+    With ignore_conflicts no pk comes back. A row is ours when it also has the
+    created_at bulk_create stamped on our instance, so occurrences another
+    scheduler (or a rerun) wrote first aren't counted or announced again.
+    """
+    if not occurrences:
+        return 0
+    written = {
+        (series_id, occurrence_date, created_at): pk
+        for pk, series_id, occurrence_date, created_at in Chore.objects.filter(
+            series_id__in={chore.series_id for chore in occurrences},
+            occurrence_date__in={chore.occurrence_date for chore in occurrences},
+            created_at__in={chore.created_at for chore in occurrences},
+        ).values_list('id', 'series_id', 'occurrence_date', 'created_at')
+    }
+    ours = [chore for chore in occurrences if (chore.series_id, chore.occurrence_date, chore.created_at) in written]
+    deltas, events = Counter(), []
+    for chore in ours:
+        chore.pk = written[chore.series_id, chore.occurrence_date, chore.created_at]
+        state = chore.completion_state()
+        deltas.update(rollups.chore_deltas(None, state))
+        events.extend(live.chore_events(chore, None, state))
+    record_rollup_changes(deltas)
+    record_live_events(events)
+    return len(ours)
+
+
+def materialize_due(now=None, chunk_size=CHUNK_SIZE):
+    """Create the next occurrence of every recurring chore that has come due.
+
+    Due occurrences are read in chunks through chore_recurring_due_idx and
+    their successors written with one bulk_create per chunk. The unique
+    (series_id, occurrence_date) constraint makes a rerun, or two schedulers
+    racing, harmless. Returns (due chores rolled over, occurrences written).
+    """
+    now = now or timezone.now()
+    rolled_over = created = 0
+    while True:
+        with transaction.atomic():
+            due = list(
+                Chore.objects.select_for_update(skip_locked=True)
+                .filter(is_recurring=True, rolled_over_at__isnull=True, due_date__lte=now)
+                .order_by('due_date', 'id')[:chunk_size]
+            )
+            if not due:
+                break
+            occurrences = [_next(chore, now) for chore in due if chore.recurrence_pattern in PATTERNS]
+            Chore.objects.bulk_create(occurrences, ignore_conflicts=True)
+            # bulk_create skips the signals
+            written = _record_created(occurrences)
+            # Rows without a usable pattern are marked too, so they aren't picked up again
+            Chore.objects.filter(pk__in=[chore.pk for chore in due]).update(
+                rolled_over_at=now, series_id=Coalesce(F('series_id'), F('id'))
+            )
+            versions.bump(versions.CHORES)
+        rolled_over += len(due)
+        created += written
+    return rolled_over, created
@@ -0,0 +1,201 @@
+"""Daily rollups behind /api/stats/.
+
+Every chore state maps to a few (day, assignee, category, priority, counter)
+contributions. A save or delete applies the difference between the old and
+new contributions, so the table always equals what a rebuild from the chore
+table (plus the archive) would produce, and a date-range question is a sum
+over at most (days x assignees x categories x priorities) rows.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import ArchiveSegment, Chore, DailyRollup
+
+COUNTERS = ['created', 'completed', 'completed_late', 'due_pending']
+
+
+def _day(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def contributions(state):
+    """Counter of (day, assignee_id, category, priority, counter) -> 1 for one chore state."""
+    if not state or not state.get('created_at'):
+        return Counter()
+    key = (state['assignee_id'] or 0, state['category'] or '', state['priority'] or '')
+    result = Counter()
+    result[(_day(state['created_at']), *key, 'created')] += 1
+    completed_at, due_date = state['completed_at'], state['due_date']
+    if completed_at:
+        result[(_day(completed_at), *key, 'completed')] += 1
+        # Same rule as the Overdue Hero stats
+        if due_date is not None and due_date < completed_at:
+            result[(_day(completed_at), *key, 'completed_late')] += 1
+    elif due_date is not None:
+        result[(_day(due_date), *key, 'due_pending')] += 1
+    return result
+
+
+def chore_deltas(previous, current):
+    """What changed between two Chore.completion_state() snapshots, as {contribution: delta}."""
+    deltas = contributions(current)
+    deltas.subtract(contributions(previous))
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def _upsert_sql(count):
+    table = DailyRollup._meta.db_table
+    columns = ['day', 'assignee_id', 'category', 'priority', *COUNTERS]
+    row = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    return (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row] * count)} '
+        f'ON CONFLICT (day, assignee_id, category, priority) DO UPDATE SET '
+        + ', '.join(f'{counter} = {table}.{counter} + excluded.{counter}' for counter in COUNTERS)
+    )
+
+
+def apply_deltas(deltas, batch_size=500):
+    """Add the deltas to the rollup rows.
+
+    Each batch is a single INSERT ... ON CONFLICT DO UPDATE (SQLite and
+    PostgreSQL) that adds to existing rows and creates missing ones, so the
+    cost doesn't depend on how many rows a change touches or whether they
+    exist yet, and concurrent writers can't lose each other's increments.
+    """
+    rows = {}
+    for (day, assignee_id, category, priority, counter), delta in deltas.items():
+        if delta:
+            rows.setdefault((day, assignee_id, category, priority), Counter())[counter] += delta
+    adapt = connection.ops.adapt_datefield_value
+    items = [
+        (adapt(day), assignee_id, category, priority, *(changes[counter] for counter in COUNTERS))
+        for (day, assignee_id, category, priority), changes in rows.items() if any(changes.values())
+    ]
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            cursor.execute(_upsert_sql(len(batch)), [value for item in batch for value in item])
+
+
+def fold_user(user_id):
+    """Move a deleted user's rows to the unassigned ones, as their chores become unassigned."""
+    deltas = Counter()
+    for row in DailyRollup.objects.filter(assignee_id=user_id):
+        for counter in COUNTERS:
+            value = getattr(row, counter)
+            if value:
+                deltas[(row.day, user_id, row.category, row.priority, counter)] -= value
+                deltas[(row.day, 0, row.category, row.priority, counter)] += value
+    apply_deltas(deltas)
+    DailyRollup.objects.filter(assignee_id=user_id).delete()
+
+
+def _grouped(queryset, moment, **counters):
+    return queryset.values(
+        day=TruncDate(moment), user=Coalesce('assignee_id', 0), cat=F('category'), pri=F('priority'),
+    ).annotate(**counters).order_by()
+
+
+def build_rows():
+    """Recompute every contribution from scratch: grouped queries on the chores plus the archive."""
+    from .archive import read_segment
+    totals = Counter()
+    chores = Chore.objects.all()
+    for row in _grouped(chores, 'created_at', n=Count('id')):
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'created')] += row['n']
+    completed = _grouped(
+        chores.filter(completed_at__isnull=False), 'completed_at',
+        n=Count('id'), late=Count('id', filter=Q(due_date__lt=F('completed_at'))),
+    )
+    for row in completed:
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'completed')] += row['n']
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'completed_late')] += row['late']
+    for row in _grouped(chores.filter(completed_at__isnull=True, due_date__isnull=False), 'due_date', n=Count('id')):
+        totals[(row['day'], row['user'], row['cat'], row['pri'], 'due_pending')] += row['n']
+
+    parse = timezone.datetime.fromisoformat
+    for segment in ArchiveSegment.objects.all():
+        try:
+            for record in read_segment(segment):
+                totals.update(contributions({
+                    'assignee_id': record['assignee_id'],
+                    'category': record['category'],
+                    'priority': record['priority'],
+                    'created_at': parse(record['created_at']),
+                    'completed_at': record['completed_at'] and parse(record['completed_at']),
+                    'due_date': record['due_date'] and parse(record['due_date']),
+                }))
+        except FileNotFoundError:
+            pass
+
+    rows = {}
+    for (day, assignee_id, category, priority, counter), value in totals.items():
+        if value:
+            rows.setdefault((day, assignee_id, category, priority), {})[counter] = value
+    return rows
+
+
+def rebuild(batch_size=1000):
+    """Replace the whole table with a recomputation; returns the number of rows written."""
+    rows = build_rows()
+    with transaction.atomic():
+        DailyRollup.objects.all().delete()
+        DailyRollup.objects.bulk_create([
+            DailyRollup(day=day, assignee_id=assignee_id, category=category, priority=priority, **counters)
+            for (day, assignee_id, category, priority), counters in rows.items()
+        ], batch_size=batch_size)
+    return len(rows)
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def summarize(start=None, end=None, assignee_id=None):
+    """Totals, per-category, per-priority and per-day breakdowns for [start, end], from rollups only."""
+    rows = DailyRollup.objects.all()
+    if assignee_id is not None:
+        rows = rows.filter(assignee_id=assignee_id)
+    # Pending work is a running total since the beginning, not a range question
+    pending = rows.aggregate(
+        created=Coalesce(Sum('created'), 0), completed=Coalesce(Sum('completed'), 0),
+        overdue=Coalesce(Sum('due_pending', filter=Q(day__lt=timezone.localdate())), 0),
+    )
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+    sums = {counter: Coalesce(Sum(counter), 0) for counter in COUNTERS[:3]}
+
+    def breakdown(field):
+        return {
+            row[field]: dict(
+                {counter: row[counter] for counter in COUNTERS[:3]},
+                completion_rate=_rate(row['completed'], row['created']),
+                late_ratio=_rate(row['completed_late'], row['completed']),
+            )
+            for row in rows.values(field).annotate(**sums).order_by(field)
+        }
+
+    totals = rows.aggregate(**sums)
+    return {
+        'from': start,
+        'to': end,
+        'totals': dict(
+            totals,
+            completion_rate=_rate(totals['completed'], totals['created']),
+            late_ratio=_rate(totals['completed_late'], totals['completed']),
+            pending=pending['created'] - pending['completed'],
+            overdue=pending['overdue'],
+        ),
+        'by_category': breakdown('category'),
+        'by_priority': breakdown('priority'),
+        'by_day': [
+            {'day': row['day'], **{counter: row[counter] for counter in COUNTERS[:3]}}
+            for row in rows.values('day').annotate(**sums).order_by('day')
+        ],
+    }
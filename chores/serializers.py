@@ -13,15 +13,35 @@ class ProfileSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['id', 'user', 'display_name', 'role', 'avatar_url', 'created_at', 'last_login_at', 'current_streak', 'longest_streak']
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves ids from objects preloaded into context['preloaded'][Model] when present.
+
+    Bulk writes preload every referenced row in one query instead of one per item.
+    """
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.get_queryset().model)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return preloaded[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
 class ChoreSerializer(serializers.ModelSerializer):
     assignee = UserSerializer(read_only=True)
-    assignee_id = serializers.PrimaryKeyRelatedField(
+    assignee_id = PreloadedPrimaryKeyRelatedField(
         queryset=User.objects.all(), source='assignee', write_only=True, required=False, allow_null=True
     )
-    dependencies = serializers.PrimaryKeyRelatedField(many=True, queryset=Chore.objects.all(), required=False)
+    dependencies = PreloadedPrimaryKeyRelatedField(many=True, queryset=Chore.objects.all(), required=False)
     class Meta:
         model = Chore
         fields = ['id', 'title', 'description', 'assignee', 'assignee_id', 'due_date', 'completed_at', 'created_at', 'updated_at', 'is_recurring', 'recurrence_pattern', 'priority', 'category', 'dependencies', 'blocks_others']
+        # Maintained from the dependency edges (see chores.graph)
+        read_only_fields = ['blocks_others']
 
 class AchievementSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -33,4 +53,27 @@ class PushSubscriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = PushSubscription
         fields = ['id', 'user', 'endpoint', 'p256dh', 'auth', 'created_at']
-        read_only_fields = ['id', 'created_at', 'user'] 
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'user']
+
+
+class BulkChoreOperationSerializer(serializers.Serializer):
+    MAX_ITEMS = 500
+    ACTIONS = ['create', 'update', 'complete', 'reassign', 'delete']
+
+    action = serializers.ChoiceField(choices=ACTIONS)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False, max_length=MAX_ITEMS)
+    chores = serializers.ListField(child=serializers.DictField(), required=False, allow_empty=False, max_length=MAX_ITEMS)
+    assignee_id = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), required=False, allow_null=True)
+    completed_at = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        action = attrs['action']
+        if action in ('create', 'update') and 'chores' not in attrs:
+            raise serializers.ValidationError({'chores': f'Required for {action}.'})
+        if action in ('complete', 'reassign', 'delete') and 'ids' not in attrs:
+            raise serializers.ValidationError({'ids': f'Required for {action}.'})
+        if action == 'reassign' and 'assignee_id' not in attrs:
+            raise serializers.ValidationError({'assignee_id': 'Required for reassign.'})
+        if action == 'update' and any(not isinstance(item.get('id'), int) for item in attrs['chores']):
+            raise serializers.ValidationError({'chores': 'Every item needs an integer id.'})
+        return attrs
@@ -1,299 +1,254 @@
-from django.db.models.signals import post_save
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, m2m_changed
+from django.db import transaction
+from django.db.models import Q
 from django.dispatch import receiver
-from .models import Chore, Achievement, Profile
+from .models import Chore, Profile, Achievement, Tombstone
+from .stats import chore_completion_changes, update_stats
+from .achievements import AchievementContext, unlock_achievements
+from . import activity, graph, leaderboard, live, metrics, rollups, versions
 from django.utils import timezone
-from django.db import models
 
-MILESTONES = [1, 10, 50, 100, 500]
-STREAK_MILESTONES = [2, 5, 7, 30, 100]
-SPEED_MILESTONES = [5, 10]  # 5 chores in under 1 hour, 10 in under 2 hours
-VARIETY_MILESTONES = [5, 10]  # 5 and 10 unique categories
+# What check_milestones() saves on a profile
+STREAK_FIELDS = ['current_streak', 'longest_streak', 'activity_epoch', 'activity_bits', 'updated_at']
+
+@receiver(pre_save, sender=Chore)
+def remember_previous_completion(sender, instance, raw=False, **kwargs):
+    # Instances loaded from the database already carry a snapshot (see Chore.from_db);
+    # only fall back to a query for partially loaded or hand-built instances.
+    if raw or instance._state.adding or getattr(instance, '_completion_snapshot', None) is not None:
+        return
+    instance._completion_snapshot = Chore.objects.filter(pk=instance.pk).values(*Chore.COMPLETION_STATE_FIELDS).first()
+
+@receiver(post_save, sender=Chore)
+def check_completion_milestones(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_completion_snapshot', None)
+    current = instance.completion_state()
+    instance._completion_snapshot = current
+    # Ahead of the completion changes, so the chore's events come before any badge it unlocks
+    record_live_events(live.chore_events(instance, previous, current))
+    record_completion_changes(chore_completion_changes(previous, current))
+    record_rollup_changes(rollups.chore_deltas(previous, current))
+
+@receiver(pre_delete, sender=Chore)
+def remember_deleted_edges(sender, instance, **kwargs):
+    # The cascade removes the chore's edges without m2m_changed
+    edges = Chore.dependencies.through.objects.filter(Q(from_chore_id=instance.pk) | Q(to_chore_id=instance.pk))
+    instance._deleted_edges = list(edges.values_list('from_chore_id', 'to_chore_id'))
+
+@receiver(post_delete, sender=Chore)
+def revert_deleted_completion(sender, instance, **kwargs):
+    # Archiving isn't a change anyone needs to see live
+    if not getattr(_batch, 'keep_stats', False):
+        record_completion_changes(chore_completion_changes(instance.completion_state(), None))
+        record_rollup_changes(rollups.chore_deltas(instance.completion_state(), None))
+        record_live_events([live.deleted_event(instance.pk)])
+    record_tombstone('chore', instance.pk)
+    edges = instance.__dict__.pop('_deleted_edges', ())
+    if edges:
+        # Its dependencies may have lost their last dependent; its dependents only lost an edge
+        record_dependency_change({to_id for from_id, to_id in edges if from_id == instance.pk})
+
+@receiver(post_delete, sender=Achievement)
+def remember_deleted_achievement(sender, instance, **kwargs):
+    record_tombstone('achievement', instance.pk, owner_id=instance.user_id)
+
+@receiver(post_delete, sender=Profile)
+def remember_deleted_profile(sender, instance, **kwargs):
+    record_tombstone('profile', instance.pk)
+
+@receiver(pre_delete, sender=User)
+def touch_unassigned_chores(sender, instance, **kwargs):
+    # The SET_NULL cascade is a plain UPDATE that would not bump updated_at
+    Chore.objects.filter(assignee=instance).update(updated_at=timezone.now())
+    versions.bump(versions.CHORES)
+    rollups.fold_user(instance.pk)
+
+# --- Data versions behind the list/detail ETags ---
 
 @receiver(post_save, sender=Chore)
-def check_completion_milestones(sender, instance, created, **kwargs):
-    # Only check when a chore is marked complete
-    if instance.completed_at and instance.assignee:
-        user = instance.assignee
-        profile = Profile.objects.get(user=user)
-        completed_chores = Chore.objects.filter(assignee=user, completed_at__isnull=False)
-        completed_count = completed_chores.count()
+@receiver(post_delete, sender=Chore)
+def bump_chore_version(sender, instance, **kwargs):
+    versions.bump(versions.CHORES)
+
+@receiver(m2m_changed, sender=Chore.dependencies.through)
+def refresh_dependency_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # The cleared dependencies are gone by post_clear
+        instance._cleared_dependency_ids = set(instance.dependencies.values_list('pk', flat=True))
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # instance is the dependency end of every changed edge
+        record_dependency_change({instance.pk})
+    elif action == 'post_clear':
+        record_dependency_change(instance.__dict__.pop('_cleared_dependency_ids', set()))
+    else:
+        record_dependency_change(pk_set)
+
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def bump_achievement_version(sender, instance, **kwargs):
+    versions.bump(versions.ACHIEVEMENTS, versions.user_achievements(instance.user_id))
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def bump_profile_version(sender, instance, update_fields=None, **kwargs):
+    versions.bump(versions.PROFILES)
+    # Streak saves are patched into the leaderboards with their completions
+    if update_fields is None or not set(update_fields) <= set(STREAK_FIELDS):
+        versions.bump(versions.LEADERBOARD)
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, **kwargs):
+    # Usernames and emails are nested into chore, profile and achievement payloads
+    versions.bump(versions.CHORES, versions.PROFILES, versions.LEADERBOARD, versions.ACHIEVEMENTS, versions.user_achievements(instance.pk))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_authenticated_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes, which are user saves; profile
+    # saves refresh the profile cached along with the user
+    versions.bump(versions.user_account(instance.pk if sender is User else instance.user_id))
+
+_batch = threading.local()
+
+@contextmanager
+def coalesced_completion_changes():
+    """Defer completion side effects raised inside the block and apply them once per user on exit.
+
+    Used by bulk operations so N saves/deletes cost one stats update and one
+    badge evaluation per affected user instead of one per chore.
+    """
+    if getattr(_batch, 'changes', None) is not None:
+        # Nested: the outermost block applies everything
+        yield
+        return
+    _batch.changes, _batch.tombstones, _batch.dependencies, _batch.rollups, _batch.events = [], [], [], Counter(), []
+    with versions.deferred_bumps():
+        try:
+            yield
+            changes, tombstones, dependencies, rollup_deltas, events = _batch.changes, _batch.tombstones, _batch.dependencies, _batch.rollups, _batch.events
+        finally:
+            _batch.changes = _batch.tombstones = _batch.dependencies = _batch.rollups = _batch.events = None
+        Tombstone.objects.bulk_create(tombstones)
+        rollups.apply_deltas(rollup_deltas)
+        live.publish(events)
+        if dependencies:
+            graph.dependencies_changed(None if None in dependencies else set().union(*dependencies))
+        apply_completion_changes(changes)
+
+@contextmanager
+def chore_write_transaction():
+    """A single chore write and everything it sets off, committed as one transaction.
+
+    Stats, streaks, badges, rollups and version bumps are applied once on
+    exit, just before the commit. On SQLite the transaction takes the write
+    lock when it begins (see DATABASES), so it never waits for the lock
+    halfway through.
+    """
+    with transaction.atomic(), coalesced_completion_changes():
+        yield
+
+@contextmanager
+def keeping_completion_stats():
+    """Chores deleted inside the block still count towards stats, streaks and the leaderboard.
+
+    Used by archiving, which moves completed chores out of the table rather
+    than undoing them.
+    """
+    _batch.keep_stats = True
+    try:
+        yield
+    finally:
+        _batch.keep_stats = False
+
+def record_tombstone(model, object_id, owner_id=None):
+    tombstone = Tombstone(model=model, object_id=object_id, owner_id=owner_id)
+    pending = getattr(_batch, 'tombstones', None)
+    if pending is not None:
+        pending.append(tombstone)
+    else:
+        tombstone.save()
+
+def record_dependency_change(chore_ids):
+    # chore_ids: dependency ends of the changed edges, or None when unknown
+    pending = getattr(_batch, 'dependencies', None)
+    if pending is not None:
+        pending.append(None if chore_ids is None else set(chore_ids))
+    else:
+        graph.dependencies_changed(chore_ids)
+
+def record_completion_changes(changes):
+    pending = getattr(_batch, 'changes', None)
+    if pending is not None:
+        pending.extend(changes)
+    else:
+        apply_completion_changes(changes)
+
+def record_rollup_changes(deltas):
+    pending = getattr(_batch, 'rollups', None)
+    if pending is not None:
+        pending.update(deltas)
+    else:
+        rollups.apply_deltas(deltas)
+
+def record_live_events(events):
+    pending = getattr(_batch, 'events', None)
+    if pending is not None:
+        pending.extend(events)
+    else:
+        live.publish(events)
+
+def apply_completion_changes(changes):
+    """Update the per-user stats for a list of (user_id, facts, sign) changes.
+
+    Streaks are recomputed for every affected user; badges are only
+    evaluated for users that gained a completion.
+    """
+    if not changes:
+        return
+    with metrics.COMPLETION_SECONDS.time():
+        _apply_completion_changes(changes)
+
+def _apply_completion_changes(changes):
+    by_user = {}
+    for user_id, facts, sign in changes:
+        by_user.setdefault(user_id, []).append((facts, sign))
+    streaks = {}
+    for user_id, facts_and_signs in by_user.items():
+        stats = update_stats(user_id, facts_and_signs)
+        added = [facts for facts, sign in facts_and_signs if sign > 0]
+        profile = check_milestones(stats, facts_and_signs, completed_at=added[-1]['completed_at'] if added else None)
+        if profile is not None:
+            streaks[user_id] = (profile.current_streak, profile.longest_streak)
+    leaderboard.record_changes([(user_id, facts['completed_at'], sign) for user_id, facts, sign in changes], streaks)
+
+def check_milestones(stats, facts_and_signs, completed_at=None):
+    with transaction.atomic():
+        profile = Profile.objects.select_for_update().filter(user_id=stats.user_id).first()
+        if profile is None:
+            return
         # --- Streak logic ---
-        today = instance.completed_at.date()
-        # Find the most recent previous completion (excluding this one)
-        prev = completed_chores.exclude(id=instance.id).order_by('-completed_at').first()
-        prev_date = prev.completed_at.date() if prev else None
-        if prev_date == today:
-            # Already completed a chore today, streak unchanged
-            pass
-        elif prev_date == today - timezone.timedelta(days=1):
-            # Consecutive day
-            profile.current_streak += 1
-        else:
-            # Streak broken or first completion
-            profile.current_streak = 1
-        if profile.current_streak > profile.longest_streak:
-            profile.longest_streak = profile.current_streak
-        profile.save()
-        # Unlock streak achievements
-        for milestone in STREAK_MILESTONES:
-            if profile.current_streak >= milestone:
-                title = f"{milestone}-Day Streak"
-                description = f"Completed chores {milestone} days in a row!"
-                icon = "🔥"
-                category = "streak"
-                rarity = "common" if milestone <= 5 else "rare" if milestone <= 7 else "epic" if milestone <= 30 else "legendary"
-                ach, created_ach = Achievement.objects.get_or_create(
-                    user=user,
-                    title=title,
-                    defaults={
-                        'description': description,
-                        'icon': icon,
-                        'category': category,
-                        'requirement': milestone,
-                        'progress': milestone,
-                        'completed': True,
-                        'completed_at': timezone.now(),
-                        'rarity': rarity,
-                        'points': milestone * 20,
-                    }
-                )
-                if not created_ach and not ach.completed:
-                    ach.completed = True
-                    ach.completed_at = timezone.now()
-                    ach.progress = milestone
-                    ach.save()
-        for milestone in MILESTONES:
-            if completed_count >= milestone:
-                title = f"{milestone} Chores Completed"
-                description = f"Completed {milestone} chores!"
-                icon = "🏅"
-                category = "completion"
-                rarity = "common" if milestone <= 10 else "rare" if milestone <= 50 else "epic" if milestone <= 100 else "legendary"
-                # Check if already unlocked
-                ach, created_ach = Achievement.objects.get_or_create(
-                    user=user,
-                    title=title,
-                    defaults={
-                        'description': description,
-                        'icon': icon,
-                        'category': category,
-                        'requirement': milestone,
-                        'progress': milestone,
-                        'completed': True,
-                        'completed_at': timezone.now(),
-                        'rarity': rarity,
-                        'points': milestone * 10,
-                    }
-                )
-                if not created_ach and not ach.completed:
-                    ach.completed = True
-                    ach.completed_at = timezone.now()
-                    ach.progress = milestone
-                    ach.save()
-        # --- Speed Achievements ---
-        for milestone, hours in zip(SPEED_MILESTONES, [1, 2]):
-            recent_chores = completed_chores.order_by('-completed_at')[:milestone]
-            recent_chores_list = list(recent_chores)
-            if len(recent_chores_list) == milestone:
-                time_span = (recent_chores_list[0].completed_at - recent_chores_list[-1].completed_at).total_seconds() / 3600.0
-                if time_span <= hours:
-                    title = 'Speed Demon' if milestone == 5 else 'Lightning Fast'
-                    description = f'Complete {milestone} chores in under {hours} hour{"s" if hours > 1 else ""}'
-                    icon = '⚡' if milestone == 5 else '⚡⚡'
-                    category = 'speed'
-                    rarity = 'rare' if milestone == 5 else 'epic'
-                    ach, created_ach = Achievement.objects.get_or_create(
-                        user=user,
-                        title=title,
-                        defaults={
-                            'description': description,
-                            'icon': icon,
-                            'category': category,
-                            'requirement': milestone,
-                            'progress': milestone,
-                            'completed': True,
-                            'completed_at': timezone.now(),
-                            'rarity': rarity,
-                            'points': milestone * 15,
-                        }
-                    )
-                    if not created_ach and not ach.completed:
-                        ach.completed = True
-                        ach.completed_at = timezone.now()
-                        ach.progress = milestone
-                        ach.save()
-        # --- Variety Achievements ---
-        categories = set(completed_chores.values_list('category', flat=True))
-        for milestone in VARIETY_MILESTONES:
-            if len(categories) >= milestone:
-                title = 'Variety Explorer' if milestone == 5 else 'Category Master'
-                description = f'Complete chores in {milestone} different categories'
-                icon = '🌈' if milestone == 5 else '🎨'
-                category = 'variety'
-                rarity = 'common' if milestone == 5 else 'rare'
-                ach, created_ach = Achievement.objects.get_or_create(
-                    user=user,
-                    title=title,
-                    defaults={
-                        'description': description,
-                        'icon': icon,
-                        'category': category,
-                        'requirement': milestone,
-                        'progress': milestone,
-                        'completed': True,
-                        'completed_at': timezone.now(),
-                        'rarity': rarity,
-                        'points': milestone * 10,
-                    }
-                )
-                if not created_ach and not ach.completed:
-                    ach.completed = True
-                    ach.completed_at = timezone.now()
-                    ach.progress = milestone
-                    ach.save()
-        # --- Special/Fun Achievements ---
-        # Perfect Week: complete at least 1 chore every day for 7 days
-        week_start = instance.completed_at - timezone.timedelta(days=instance.completed_at.weekday())
-        week_days = [week_start + timezone.timedelta(days=i) for i in range(7)]
-        days_with_chores = set(
-            c.completed_at.date() for c in completed_chores
-            if c.completed_at.date() >= week_start.date() and c.completed_at.date() <= (week_start + timezone.timedelta(days=6)).date()
-        )
-        if len(days_with_chores) == 7:
-            title = 'Perfect Week'
-            description = 'Complete at least one chore every day for a week.'
-            icon = '✨'
-            category = 'special'
-            rarity = 'epic'
-            ach, created_ach = Achievement.objects.get_or_create(
-                user=user,
-                title=title,
-                defaults={
-                    'description': description,
-                    'icon': icon,
-                    'category': category,
-                    'requirement': 1,
-                    'progress': 1,
-                    'completed': True,
-                    'completed_at': timezone.now(),
-                    'rarity': rarity,
-                    'points': 200,
-                }
-            )
-            if not created_ach and not ach.completed:
-                ach.completed = True
-                ach.completed_at = timezone.now()
-                ach.progress = 1
-                ach.save()
-        # Early Bird: 5 chores before 9am
-        early_bird_count = completed_chores.filter(completed_at__hour__lt=9).count()
-        if early_bird_count >= 5:
-            title = 'Early Bird'
-            description = 'Complete 5 chores before 9 AM.'
-            icon = '🌅'
-            category = 'special'
-            rarity = 'rare'
-            ach, created_ach = Achievement.objects.get_or_create(
-                user=user,
-                title=title,
-                defaults={
-                    'description': description,
-                    'icon': icon,
-                    'category': category,
-                    'requirement': 5,
-                    'progress': 5,
-                    'completed': True,
-                    'completed_at': timezone.now(),
-                    'rarity': rarity,
-                    'points': 75,
-                }
-            )
-            if not created_ach and not ach.completed:
-                ach.completed = True
-                ach.completed_at = timezone.now()
-                ach.progress = 5
-                ach.save()
-        # Night Owl: 5 chores after 8pm
-        night_owl_count = completed_chores.filter(completed_at__hour__gte=20).count()
-        if night_owl_count >= 5:
-            title = 'Night Owl'
-            description = 'Complete 5 chores after 8 PM.'
-            icon = '🦉'
-            category = 'special'
-            rarity = 'rare'
-            ach, created_ach = Achievement.objects.get_or_create(
-                user=user,
-                title=title,
-                defaults={
-                    'description': description,
-                    'icon': icon,
-                    'category': category,
-                    'requirement': 5,
-                    'progress': 5,
-                    'completed': True,
-                    'completed_at': timezone.now(),
-                    'rarity': rarity,
-                    'points': 75,
-                }
-            )
-            if not created_ach and not ach.completed:
-                ach.completed = True
-                ach.completed_at = timezone.now()
-                ach.progress = 5
-                ach.save()
-        # Weekend Warrior: 10 chores on weekends
-        weekend_count = completed_chores.filter(completed_at__week_day__in=[1, 7]).count()  # 1=Sunday, 7=Saturday
-        if weekend_count >= 10:
-            title = 'Weekend Warrior'
-            description = 'Complete 10 chores on weekends.'
-            icon = '🏖️'
-            category = 'special'
-            rarity = 'common'
-            ach, created_ach = Achievement.objects.get_or_create(
-                user=user,
-                title=title,
-                defaults={
-                    'description': description,
-                    'icon': icon,
-                    'category': category,
-                    'requirement': 10,
-                    'progress': 10,
-                    'completed': True,
-                    'completed_at': timezone.now(),
-                    'rarity': rarity,
-                    'points': 50,
-                }
-            )
-            if not created_ach and not ach.completed:
-                ach.completed = True
-                ach.completed_at = timezone.now()
-                ach.progress = 10
-                ach.save()
-        # Overdue Hero: complete an overdue chore
-        overdue_hero = completed_chores.filter(due_date__lt=models.F('completed_at')).exists()
-        if overdue_hero:
-            title = 'Overdue Hero'
-            description = 'Complete an overdue chore.'
-            icon = '🦸'
-            category = 'special'
-            rarity = 'rare'
-            ach, created_ach = Achievement.objects.get_or_create(
-                user=user,
-                title=title,
-                defaults={
-                    'description': description,
-                    'icon': icon,
-                    'category': category,
-                    'requirement': 1,
-                    'progress': 1,
-                    'completed': True,
-                    'completed_at': timezone.now(),
-                    'rarity': rarity,
-                    'points': 100,
-                }
-            )
-            if not created_ach and not ach.completed:
-                ach.completed = True
-                ach.completed_at = timezone.now()
-                ach.progress = 1
-                ach.save() 
\ No newline at end of file
+        # Streaks come from the day bitmap, so backdated and out-of-order completions count correctly
+        for facts, sign in facts_and_signs:
+            day = date.fromisoformat(facts['day'])
+            if sign > 0:
+                activity.mark_day(profile, day)
+            elif not activity.still_active(stats.user_id, day):
+                activity.mark_day(profile, day, active=False)
+        profile.current_streak, profile.longest_streak = activity.streaks(profile)
+        profile.save(update_fields=STREAK_FIELDS)
+    if completed_at is not None:
+        with metrics.BADGE_SECONDS.time():
+            unlock_achievements(stats.user_id, AchievementContext(stats=stats, profile=profile, completed_at=completed_at))
+    return profile
@@ -0,0 +1,123 @@
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Chore, UserStats
+
+# Hour boundaries used by the Early Bird / Night Owl badges (local time)
+EARLY_BEFORE_HOUR = 9
+NIGHT_FROM_HOUR = 20
+
+
+def completion_facts(completed_at, category, due_date):
+    """Reduce one completion to the counters it contributes to."""
+    local = timezone.localtime(completed_at) if timezone.is_aware(completed_at) else completed_at
+    return {
+        'completed_at': completed_at,
+        'day': local.date().isoformat(),
+        'early': local.hour < EARLY_BEFORE_HOUR,
+        'night': local.hour >= NIGHT_FROM_HOUR,
+        'weekend': local.weekday() >= 5,
+        'overdue': due_date is not None and due_date < completed_at,
+        'category': category or '',
+    }
+
+
+def apply_completion(stats, facts, sign=1):
+    """Add (sign=1) or revert (sign=-1) one completion on a stats record in memory.
+
+    Works on any object with the UserStats fields, so migrations and bulk
+    rebuilds can reuse it with historical models or unsaved instances.
+    """
+    stats.total_completed = max(stats.total_completed + sign, 0)
+    if facts['early']:
+        stats.early_count = max(stats.early_count + sign, 0)
+    if facts['night']:
+        stats.night_count = max(stats.night_count + sign, 0)
+    if facts['weekend']:
+        stats.weekend_count = max(stats.weekend_count + sign, 0)
+    if facts['overdue']:
+        stats.overdue_count = max(stats.overdue_count + sign, 0)
+
+    categories = dict(stats.category_counts or {})
+    count = categories.get(facts['category'], 0) + sign
+    if count > 0:
+        categories[facts['category']] = count
+    else:
+        categories.pop(facts['category'], None)
+    stats.category_counts = categories
+
+    stamp = facts['completed_at'].isoformat()
+    recent = list(stats.recent_completions or [])
+    if sign > 0:
+        recent.append(stamp)
+        recent.sort(key=parse_datetime, reverse=True)
+        recent = recent[:UserStats.RECENT_COMPLETIONS_SIZE]
+    elif stamp in recent:
+        recent.remove(stamp)
+    stats.recent_completions = recent
+
+
+def recent_completion_times(stats):
+    return [parse_datetime(stamp) for stamp in stats.recent_completions]
+
+
+def category_set(stats):
+    return {name for name, count in stats.category_counts.items() if count > 0}
+
+
+def chore_completion_changes(previous, current):
+    """Compare two Chore.completion_state() snapshots.
+
+    Returns a list of (user_id, facts, sign) tuples describing which
+    completions have to be reverted and which have to be added.
+    """
+    def key(state):
+        if not state or not state['completed_at'] or not state['assignee_id']:
+            return None
+        return (state['assignee_id'], state['completed_at'], state['category'] or '', state['due_date'])
+
+    old, new = key(previous), key(current)
+    if old == new:
+        return []
+    changes = []
+    if old:
+        changes.append((old[0], completion_facts(*old[1:]), -1))
+    if new:
+        changes.append((new[0], completion_facts(*new[1:]), 1))
+    return changes
+
+
+def locked_stats(user_id):
+    """Fetch (or create) the stats row for a user, locked for the current transaction."""
+    stats = UserStats.objects.select_for_update().filter(user_id=user_id).first()
+    if stats is None:
+        stats, _ = UserStats.objects.get_or_create(user_id=user_id)
+    return stats
+
+
+def refill_recent_completions(stats):
+    """Reload the recent completions buffer from the user's newest completed chores.
+
+    A revert drops its stamp from the buffer, and nothing in the buffer says
+    which completion came before the oldest one kept. One query through
+    chore_assignee_done_idx finds them.
+    """
+    newest = (
+        Chore.objects.filter(assignee_id=stats.user_id, completed_at__isnull=False)
+        .order_by('-completed_at').values_list('completed_at', flat=True)[:UserStats.RECENT_COMPLETIONS_SIZE]
+    )
+    stats.recent_completions = [completed_at.isoformat() for completed_at in newest]
+
+
+def update_stats(user_id, facts_and_signs):
+    """Apply a batch of completion changes for one user and persist them."""
+    with transaction.atomic():
+        stats = locked_stats(user_id)
+        for facts, sign in facts_and_signs:
+            apply_completion(stats, facts, sign)
+        reverted = any(sign < 0 for _, sign in facts_and_signs)
+        if reverted and len(stats.recent_completions) < min(stats.total_completed, UserStats.RECENT_COMPLETIONS_SIZE):
+            refill_recent_completions(stats)
+        stats.save()
+    return stats
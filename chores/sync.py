@@ -0,0 +1,114 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .models import Achievement, Chore, Profile, Tombstone
+from .serializers import AchievementSerializer, ChoreSerializer, ProfileSerializer
+
+# Rows whose updated_at is this recent are re-sent on the next sync, so a
+# transaction that commits slightly after stamping updated_at is never skipped.
+CURSOR_LAG_SECONDS = getattr(settings, 'SYNC_CURSOR_LAG_SECONDS', 10)
+# Tombstones older than this are deleted; a cursor from before the cutoff may
+# have missed some, so its client is told to resync from scratch.
+TOMBSTONE_RETENTION_DAYS = getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30)
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+
+EPOCH = timezone.datetime(1970, 1, 1, tzinfo=timezone.get_fixed_timezone(0))
+
+
+def _collections(user):
+    """name -> (queryset, timestamp field, serializer class or None for tombstones)."""
+    return {
+        'chores': (
+            Chore.objects.select_related('assignee').prefetch_related(
+                Prefetch('dependencies', queryset=Chore.objects.only('id'))
+            ),
+            'updated_at', ChoreSerializer,
+        ),
+        'achievements': (Achievement.objects.select_related('user').filter(user=user), 'updated_at', AchievementSerializer),
+        'profiles': (Profile.objects.select_related('user'), 'updated_at', ProfileSerializer),
+        'deleted': (Tombstone.objects.filter(Q(owner_id__isnull=True) | Q(owner_id=user.pk)), 'deleted_at', None),
+    }
+
+
+def encode_cursor(positions):
+    raw = {name: [moment.isoformat(), pk] for name, (moment, pk) in positions.items()}
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(cursor, names):
+    positions = {name: (EPOCH, 0) for name in names}
+    if not cursor:
+        return positions
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        for name, (moment, pk) in raw.items():
+            if name in positions:
+                moment = parse_datetime(moment)
+                if moment is None:
+                    raise ValueError(cursor)
+                positions[name] = (moment, int(pk))
+    except (TypeError, ValueError, AttributeError, UnicodeDecodeError):
+        raise ValidationError({'since': 'Invalid cursor.'})
+    return positions
+
+
+def tombstone_cutoff(now=None):
+    return (now or timezone.now()) - timezone.timedelta(days=TOMBSTONE_RETENTION_DAYS)
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than the retention; returns how many."""
+    return Tombstone.objects.filter(deleted_at__lt=tombstone_cutoff(now)).delete()[0]
+
+
+def changes_since(user, cursor=None, limit=DEFAULT_LIMIT, context=None):
+    """Everything that changed after `cursor`, one keyset page per collection.
+
+    The cursor holds an (updated_at, id) position per collection, so each
+    query is a range scan on the matching (updated_at, id) index and the
+    cost scales with the number of changes, not the size of the data.
+    A cursor whose tombstone position is older than the retention starts
+    over from the beginning, with `reset` set so the client drops what it has.
+    """
+    limit = min(max(int(limit), 1), MAX_LIMIT)
+    collections = _collections(user)
+    positions = decode_cursor(cursor, collections)
+    now = timezone.now()
+    reset = bool(cursor) and positions['deleted'][0] < tombstone_cutoff(now)
+    if reset:
+        positions = decode_cursor(None, collections)
+    horizon = (now - timezone.timedelta(seconds=CURSOR_LAG_SECONDS), 0)
+    result, has_more = {}, False
+    for name, (queryset, field, serializer_class) in collections.items():
+        moment, pk = positions[name]
+        rows = list(
+            queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk}))
+            .order_by(field, 'id')[:limit + 1]
+        )
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        has_more = has_more or truncated
+        if truncated:
+            positions[name] = (getattr(rows[-1], field), rows[-1].pk)
+        else:
+            # Caught up: move to the lag horizon, even with no rows, so an
+            # idle collection's position still tracks the tombstone cutoff
+            positions[name] = max(positions[name], horizon)
+        if serializer_class is None:
+            deleted = {}
+            for row in rows:
+                deleted.setdefault(f'{row.model}s', []).append(row.object_id)
+            result[name] = deleted
+        else:
+            result[name] = serializer_class(rows, many=True, context=context).data
+    result['cursor'] = encode_cursor(positions)
+    result['has_more'] = has_more
+    result['reset'] = reset
+    return result
@@ -0,0 +1,178 @@
+"""Synthetic households for load tests and benchmarks.
+
+By default everything is written with bulk_create, so no per-chore signals
+run; use chores.recompute and chores.rollups (or the --recompute option of
+generate_dataset) to build the stats, streaks, badges and rollups afterwards.
+With signals=True chores are saved one by one through the regular write path
+instead, which exercises (and pays for) everything a real write sets off.
+"""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Chore, Profile
+from . import rollups, signals as chore_signals, versions
+
+DependencyEdge = Chore.dependencies.through
+
+CATEGORIES = {
+    'kitchen': 25, 'cleaning': 20, 'laundry': 15, 'bathroom': 10, 'trash': 10,
+    'garden': 6, 'pets': 6, 'shopping': 5, 'maintenance': 2, 'paperwork': 1,
+}
+PRIORITIES = {'low': 30, 'medium': 50, 'high': 20}
+PATTERNS = {'daily': 30, 'weekly': 50, 'monthly': 20}
+# Completions cluster in the morning and the evening
+HOURS = {hour: weight for hour, weight in enumerate([1, 1, 1, 1, 1, 2, 4, 8, 9, 6, 5, 5, 6, 5, 5, 6, 7, 9, 12, 14, 12, 8, 4, 2])}
+TITLES = {
+    'kitchen': ['Do the dishes', 'Wipe the counters', 'Clean the fridge', 'Empty the dishwasher'],
+    'cleaning': ['Vacuum the living room', 'Mop the floors', 'Dust the shelves'],
+    'laundry': ['Wash the towels', 'Fold the laundry', 'Change the bed sheets'],
+    'bathroom': ['Scrub the shower', 'Clean the toilet', 'Refill the soap'],
+    'trash': ['Take out the trash', 'Sort the recycling'],
+    'garden': ['Water the plants', 'Mow the lawn', 'Weed the flower beds'],
+    'pets': ['Feed the cat', 'Walk the dog', 'Clean the litter box'],
+    'shopping': ['Buy groceries', 'Restock cleaning supplies'],
+    'maintenance': ['Replace the air filter', 'Fix the leaking tap'],
+    'paperwork': ['Pay the bills', 'File the receipts'],
+}
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def bulk_create_chores(chores, batch_size=None):
+    """bulk_create that keeps the created_at/updated_at set on the instances.
+
+    auto_now and auto_now_add overwrite both on insert, so they are written
+    back with one bulk_update. Only these instances are touched; the fields
+    are left alone for every other thread.
+    """
+    timestamps = [(chore.created_at, chore.updated_at) for chore in chores]
+    Chore.objects.bulk_create(chores, batch_size=batch_size)
+    for chore, (created_at, updated_at) in zip(chores, timestamps):
+        chore.created_at, chore.updated_at = created_at, updated_at
+    Chore.objects.bulk_update(chores, ['created_at', 'updated_at'], batch_size=batch_size)
+    return chores
+
+
+def save_chores(chores, edges):
+    """Save the chores and add the (chore, dependency) edges with every signal running.
+
+    Call inside signals.chore_write_transaction(), so the side effects are
+    applied once per batch. The historical created_at/updated_at are put back
+    afterwards, with the rollup rows moved to the original creation days.
+    """
+    timestamps = [(chore.created_at, chore.updated_at) for chore in chores]
+    for chore in chores:
+        chore.save()
+    for chore, dependency in edges:
+        chore.dependencies.add(dependency)
+    for chore, (created_at, updated_at) in zip(chores, timestamps):
+        saved = chore.completion_state()
+        chore.created_at, chore.updated_at = created_at, updated_at
+        chore._completion_snapshot = chore.completion_state()
+        chore_signals.record_rollup_changes(rollups.chore_deltas(saved, chore._completion_snapshot))
+    Chore.objects.bulk_update(chores, ['created_at', 'updated_at'], batch_size=1000)
+    return chores
+
+
+def build_chores(rng, assignee_id, count, now, days=365, completion_rate=0.8, recurring_rate=0.1, dependency_rate=0.05):
+    """Return (chores, edges) for one user; edges are (chore index, dependency index) pairs."""
+    chores, edges = [], []
+    for index in range(count):
+        category = _weighted(rng, CATEGORIES)
+        created_at = now - timezone.timedelta(days=rng.uniform(0, days))
+        due_date = created_at + timezone.timedelta(days=rng.randint(1, 14)) if rng.random() < 0.7 else None
+        completed_at = None
+        if rng.random() < completion_rate:
+            # Most chores are done within a few days, some only well after they were due
+            day = created_at + timezone.timedelta(days=min(rng.expovariate(1 / 2.0), 30))
+            local = timezone.localtime(day).replace(hour=_weighted(rng, HOURS), minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+            if created_at < local <= now:
+                completed_at = local
+        recurring = rng.random() < recurring_rate
+        chores.append(Chore(
+            title=rng.choice(TITLES[category]),
+            assignee_id=assignee_id,
+            category=category,
+            priority=_weighted(rng, PRIORITIES),
+            created_at=created_at,
+            updated_at=completed_at or created_at,
+            due_date=due_date,
+            completed_at=completed_at,
+            is_recurring=recurring,
+            recurrence_pattern=_weighted(rng, PATTERNS) if recurring else '',
+            # Past occurrences are history, not work for the scheduler
+            rolled_over_at=now if recurring and completed_at else None,
+        ))
+        if index and rng.random() < dependency_rate:
+            dependency = rng.randrange(max(index - 20, 0), index)
+            # Never leave a completed chore waiting on a pending one
+            done, required = chores[index].completed_at, chores[dependency].completed_at
+            if not done or (required and required <= done):
+                edges.append((index, dependency))
+    return chores, edges
+
+
+def create_users(prefix, count):
+    password = make_password(None)  # unusable, and hashed once rather than per user
+    users = User.objects.bulk_create([User(username=f'{prefix}{i}', password=password) for i in range(count)])
+    if len(users) and users[0].pk is None:
+        users = list(User.objects.filter(username__startswith=prefix).order_by('id'))
+    Profile.objects.bulk_create([
+        Profile(user_id=user.pk, display_name=user.username, role='admin' if i == 0 else 'member')
+        for i, user in enumerate(users)
+    ])
+    return users
+
+
+def generate(users, chores_per_user, seed=0, prefix='synthetic', batch_size=5000, progress=None, signals=False, **distribution):
+    """Create `users` users with `chores_per_user` chores each; returns (users, chores, edges) created.
+
+    With `signals`, chores go through save() and the dependency signals, so
+    stats, badges, rollups, live events and tombstones are kept as they go.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    created = edges_created = 0
+    with transaction.atomic():
+        people = create_users(f'{prefix}-{seed}-', users)
+    pending_chores, pending_edges = [], []
+
+    def flush():
+        nonlocal created, edges_created
+        if signals:
+            with chore_signals.chore_write_transaction():
+                save_chores(pending_chores, pending_edges)
+        else:
+            with transaction.atomic():
+                bulk_create_chores(pending_chores, batch_size=1000)
+                DependencyEdge.objects.bulk_create([
+                    DependencyEdge(from_chore_id=chore.pk, to_chore_id=dependency.pk) for chore, dependency in pending_edges
+                ], batch_size=1000)
+        created += len(pending_chores)
+        edges_created += len(pending_edges)
+        pending_chores.clear()
+        pending_edges.clear()
+        if progress:
+            progress(created, users * chores_per_user)
+
+    for user in people:
+        chores, edges = build_chores(rng, user.pk, chores_per_user, now, **distribution)
+        pending_chores.extend(chores)
+        pending_edges.extend((chores[index], chores[dependency]) for index, dependency in edges)
+        if len(pending_chores) >= batch_size:
+            flush()
+    if pending_chores:
+        flush()
+
+    has_dependents = Exists(DependencyEdge.objects.filter(to_chore_id=OuterRef('pk')))
+    Chore.objects.filter(has_dependents, blocks_others=False).update(blocks_others=True)
+    # bulk_create skips the signals
+    versions.bump(versions.CHORES, versions.PROFILES, versions.LEADERBOARD, versions.DEPENDENCIES)
+    return len(people), created, edges_created
@@ -1,118 +1,1496 @@
-from django.test import TestCase
-from django.core.management.base import BaseCommand
+import asyncio
+import multiprocessing
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from cryptography.hazmat.primitives import serialization
+from py_vapid import Vapid, b64urlencode
+from django.conf import settings
+from django.test import AsyncClient, TestCase, override_settings
 from django.contrib.auth.models import User
-from chores.models import Profile, Chore
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from chores.models import Achievement, Profile, Chore, DailyRollup, LiveEvent, PushJob, PushSubscription, Tombstone, UserStats
+from chores.recompute import STATS_FIELDS, replay
+from chores.achievements import AchievementContext, RULES, unlock_achievements
+from chores.activity import active_days_in, perfect_week
+from chores.archive import archive_completed, read_segment
+from chores.authentication import UserCache
+from chores.filters import filter_chores
+from chores.pagination import KeysetCursorPagination
+from chores.push import RETRY, WebPushSender
+from chores.recurrence import materialize_due, next_occurrence
+from chores.rollups import build_rows
+from chores.views import ChoreViewSet
+from chores import benchmarks, live, metrics, push, sync, versions
 from django.utils import timezone
 
-# Create your tests here.
+class UserStatsTests(TestCase):
+    """The stats kept up to date by the signals equal a recount of the chore table after every kind of change."""
 
-class Command(BaseCommand):
-    help = 'Simulate and unlock all badge types for a user.'
+    def setUp(self):
+        self.user = User.objects.create_user('counter')
+        self.other = User.objects.create_user('other-counter')
+        for user in (self.user, self.other):
+            Profile.objects.create(user=user, display_name=user.username)
+        start = timezone.make_aware(timezone.datetime(2025, 1, 6, 7, 30))  # a Monday morning
+        self.chores = [
+            Chore.objects.create(
+                title=f'Chore {i}', assignee=self.user, category=f'cat{i % 3}',
+                due_date=start if i == 2 else None, completed_at=start + timezone.timedelta(days=i, hours=i * 3),
+            )
+            for i in range(6)
+        ]
 
-    def add_arguments(self, parser):
-        parser.add_argument('username', type=str, help='Username to simulate badges for')
+    def recount(self, user):
+        completions = Chore.objects.filter(assignee=user, completed_at__isnull=False).order_by('completed_at')
+        return replay(user.pk, completions.values_list('completed_at', 'category', 'due_date'), with_badges=False)['stats']
 
-    def handle(self, *args, **options):
-        username = options['username']
-        try:
-            user = User.objects.get(username=username)
-            profile = Profile.objects.get(user=user)
-        except User.DoesNotExist:
-            self.stdout.write(self.style.ERROR(f'User {username} does not exist.'))
-            return
-        except Profile.DoesNotExist:
-            self.stdout.write(self.style.ERROR(f'Profile for {username} does not exist.'))
-            return
+    def assertMatchesRecount(self):
+        for user in (self.user, self.other):
+            stats = UserStats.objects.filter(user=user).first() or UserStats(user=user)
+            self.assertEqual({field: getattr(stats, field) for field in STATS_FIELDS}, self.recount(user), user.username)
+
+    def test_add(self):
+        self.assertMatchesRecount()
+        self.assertEqual(UserStats.objects.get(user=self.user).total_completed, 6)
+
+    def test_revert(self):
+        self.chores[2].completed_at = None
+        self.chores[2].save()
+        self.assertMatchesRecount()
+        self.assertEqual(UserStats.objects.get(user=self.user).overdue_count, 0)
+
+    def test_reassign(self):
+        self.chores[1].assignee = self.other
+        self.chores[1].save()
+        self.assertMatchesRecount()
+        self.assertEqual(UserStats.objects.get(user=self.other).total_completed, 1)
+
+    def test_recategorize(self):
+        self.chores[0].category = 'garden'
+        self.chores[0].save()
+        self.assertMatchesRecount()
+        self.assertIn('garden', UserStats.objects.get(user=self.user).category_counts)
+
+    def test_delete(self):
+        self.chores[4].delete()
+        self.assertMatchesRecount()
+        self.assertEqual(UserStats.objects.get(user=self.user).total_completed, 5)
+
+    def legacy_titles(self, user):
+        # The badges the original post_save handler derived from full recounts of the chore table
+        done = Chore.objects.filter(assignee=user, completed_at__isnull=False)
+        count = done.count()
+        days = sorted({moment.date() for moment in done.values_list('completed_at', flat=True)})
+        longest = run = 0
+        for index, day in enumerate(days):
+            run = run + 1 if index and day - days[index - 1] == timezone.timedelta(days=1) else 1
+            longest = max(longest, run)
+        titles = {f'{milestone} Chores Completed' for milestone in [1, 10, 50, 100, 500] if count >= milestone}
+        titles |= {f'{milestone}-Day Streak' for milestone in [2, 5, 7, 30, 100] if longest >= milestone}
+        times = sorted(done.values_list('completed_at', flat=True))
+        for milestone, hours, title in [(5, 1, 'Speed Demon'), (10, 2, 'Lightning Fast')]:
+            if any(times[i + milestone - 1] - times[i] <= timezone.timedelta(hours=hours) for i in range(len(times) - milestone + 1)):
+                titles.add(title)
+        categories = len(set(done.values_list('category', flat=True)))
+        titles |= {'Variety Explorer' if milestone == 5 else 'Category Master' for milestone in [5, 10] if categories >= milestone}
+        if any(all(monday + timezone.timedelta(days=i) in days for i in range(7)) for monday in days if monday.weekday() == 0):
+            titles.add('Perfect Week')
+        if done.filter(completed_at__hour__lt=9).count() >= 5:
+            titles.add('Early Bird')
+        if done.filter(completed_at__hour__gte=20).count() >= 5:
+            titles.add('Night Owl')
+        if done.filter(completed_at__week_day__in=[1, 7]).count() >= 10:
+            titles.add('Weekend Warrior')
+        if done.filter(due_date__lt=models.F('completed_at')).exists():
+            titles.add('Overdue Hero')
+        return titles
+
+    def test_milestones_match_the_original_handler(self):
+        start = timezone.make_aware(timezone.datetime(2025, 1, 12, 6, 0))
+        for i in range(6):
+            Chore.objects.create(title=f'Early {i}', assignee=self.user, category=f'kind{i}', completed_at=start + timezone.timedelta(days=i))
+        for i in range(5):
+            Chore.objects.create(title=f'Late {i}', assignee=self.other, completed_at=start + timezone.timedelta(hours=15 + i / 10))
+        for user in (self.user, self.other):
+            unlocked = set(Achievement.objects.filter(user=user, completed=True).values_list('title', flat=True))
+            self.assertEqual(unlocked, self.legacy_titles(user), user.username)
+        self.assertTrue({'Perfect Week', 'Early Bird', 'Overdue Hero', '7-Day Streak'} <= self.legacy_titles(self.user))
+        self.assertIn('Speed Demon', self.legacy_titles(self.other))
+
+    def test_revert_refills_recent_completions(self):
+        start = timezone.make_aware(timezone.datetime(2025, 3, 1, 10, 0))
+        done = [
+            Chore.objects.create(title=f'Quick {i}', assignee=self.other, completed_at=start + timezone.timedelta(minutes=5 * i))
+            for i in range(11)
+        ]
+        done[-1].completed_at = None
+        done[-1].save()
+        stats = UserStats.objects.get(user=self.other)
+        self.assertEqual(len(stats.recent_completions), UserStats.RECENT_COMPLETIONS_SIZE)
+        self.assertMatchesRecount()
+        context = AchievementContext(stats=stats, profile=Profile.objects.get(user=self.other), completed_at=done[-2].completed_at)
+        self.assertTrue(RULES['Lightning Fast'].predicate(context))
+
+
+class UnlockAchievementsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('unlocker')
+        self.profile = Profile.objects.create(user=self.user, display_name='Unlocker')
+        # Ten completions, nothing else: exactly the two completion milestones hold
+        self.context = AchievementContext(
+            stats=UserStats(user=self.user, total_completed=10, category_counts={'': 10}),
+            profile=self.profile, completed_at=timezone.now(),
+        )
+
+    def achievement_queries(self):
+        return [query['sql'].split()[0] for query in self.queries.captured_queries if 'chores_achievement' in query['sql']]
+
+    def unlock(self):
+        with CaptureQueriesContext(connection) as self.queries:
+            return unlock_achievements(self.user.pk, self.context)
+
+    def titles(self):
+        return dict(Achievement.objects.filter(user=self.user).values_list('title', 'completed'))
+
+    def test_one_select_and_one_insert_for_newly_earned_titles(self):
+        RULES['1 Chores Completed'].build(self.user.pk, timezone.now()).save()
+        new = self.unlock()
+        self.assertEqual([achievement.title for achievement in new], ['10 Chores Completed'])
+        self.assertEqual(self.achievement_queries(), ['SELECT', 'INSERT'])
+        self.assertEqual(self.titles(), {'1 Chores Completed': True, '10 Chores Completed': True})
+
+    def test_placeholders_are_completed_not_duplicated(self):
+        Achievement.objects.bulk_create([
+            Achievement(user=self.user, title=title, description='', icon='', category='completion', requirement=requirement, progress=0)
+            for title, requirement in [('1 Chores Completed', 1), ('10 Chores Completed', 10)]
+        ])
+        self.assertEqual(self.unlock(), [])
+        self.assertEqual(self.achievement_queries(), ['SELECT', 'UPDATE'])
+        self.assertEqual(self.titles(), {'1 Chores Completed': True, '10 Chores Completed': True})
+        self.assertEqual(Achievement.objects.get(user=self.user, title='10 Chores Completed').progress, 10)
+
+    def test_badges_already_held_cost_no_writes(self):
+        for title in ('1 Chores Completed', '10 Chores Completed'):
+            RULES[title].build(self.user.pk, timezone.now()).save()
+        self.assertEqual(self.unlock(), [])
+        self.assertEqual(len(self.queries.captured_queries), 1)
+        self.assertEqual(self.achievement_queries(), ['SELECT'])
+
+
+class LeaderboardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
         now = timezone.now()
-        # --- Completion Milestones ---
-        for i in range(1, 501):
-            completed_at = now - timezone.timedelta(days=500 - i)
-            Chore.objects.create(
-                title=f'Completion Chore {i}',
-                assignee=user,
-                completed_at=completed_at,
-                created_at=completed_at,
-                updated_at=completed_at,
-                category='general'
-            )
-        # --- Streaks: 100-day streak ---
-        for i in range(100):
-            completed_at = now - timezone.timedelta(days=100 - i)
-            Chore.objects.create(
-                title=f'Streak Chore {i+1}',
-                assignee=user,
-                completed_at=completed_at,
-                created_at=completed_at,
-                updated_at=completed_at,
-                category='general'
-            )
-        # --- Speed: 10 chores in under 2 hours ---
-        for i in range(10):
-            completed_at = now - timezone.timedelta(hours=2 - (i * 0.2))
-            Chore.objects.create(
-                title=f'Speed Chore {i+1}',
-                assignee=user,
-                completed_at=completed_at,
-                created_at=completed_at,
-                updated_at=completed_at,
-                category='general'
-            )
-        # --- Variety: 10 unique categories ---
-        for i in range(10):
-            completed_at = now - timezone.timedelta(days=10 - i)
-            Chore.objects.create(
-                title=f'Variety Chore {i+1}',
-                assignee=user,
-                completed_at=completed_at,
-                created_at=completed_at,
-                updated_at=completed_at,
-                category=f'cat{i+1}'
-            )
-        # --- Special: Early Bird, Night Owl, Weekend Warrior, Overdue Hero, Perfect Week ---
-        # Early Bird: 5 chores before 9am
+        self.ann, self.bob, self.cat = (User.objects.create_user(name) for name in ('ann', 'bob', 'cat'))
+        for user in (self.ann, self.bob, self.cat):
+            Profile.objects.create(user=user, display_name=user.username.title())
+        for i in range(3):
+            Chore.objects.create(title=f'Ann {i}', assignee=self.ann, completed_at=now)
+        Chore.objects.create(title='Bob now', assignee=self.bob, completed_at=now)
+        for i in range(3):
+            # Before the current month, so they only count towards the all-time board
+            Chore.objects.create(title=f'Bob {i}', assignee=self.bob, completed_at=now - timezone.timedelta(days=70))
+        self.client.force_authenticate(self.cat)
+
+    def board(self, window='all'):
+        response = self.client.get(f'/api/profiles/leaderboard/?window={window}')
+        self.assertEqual(response.status_code, 200)
+        return [(entry['username'], entry['completed_chores'], entry['rank']) for entry in response.data]
+
+    def test_windows(self):
+        self.assertEqual(self.board('all'), [('bob', 4, 1), ('ann', 3, 2), ('cat', 0, 3)])
+        for window in ('week', 'month'):
+            self.assertEqual(self.board(window), [('ann', 3, 1), ('bob', 1, 2), ('cat', 0, 3)])
+        self.assertEqual(self.client.get('/api/profiles/leaderboard/?window=year').status_code, 400)
+
+    def test_pagination(self):
+        data = self.client.get('/api/profiles/leaderboard/?page=2&page_size=1').data
+        self.assertEqual((data['window'], data['count'], data['page'], data['page_size']), ('all', 3, 2, 1))
+        self.assertEqual([(entry['username'], entry['rank']) for entry in data['results']], [('ann', 2)])
+        self.assertEqual((data['me']['username'], data['me']['rank']), ('cat', 3))
+        self.assertEqual(self.client.get('/api/profiles/leaderboard/?page=x').status_code, 400)
+
+    def test_me(self):
+        data = self.client.get('/api/profiles/leaderboard/me/?window=week').data
+        self.assertEqual((data['window'], data['rank'], data['completed_chores']), ('week', 3, 0))
+        self.client.force_authenticate(User.objects.create_user('no-profile'))
+        self.assertEqual(self.client.get('/api/profiles/leaderboard/me/').status_code, 404)
+
+    def complete(self, user, title):
+        response = self.client.post('/api/chores/', {'title': title, 'assignee_id': user.pk, 'completed_at': timezone.now().isoformat()})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_other_chore_writes_keep_the_board(self):
+        self.board()
+        chore_id = self.client.post('/api/chores/', {'title': 'Later', 'assignee_id': self.cat.pk}).data['id']
+        self.client.patch(f'/api/chores/{chore_id}/', {'title': 'Much later'})
+        # The leaderboard version alone: no rebuild
+        with self.assertNumQueries(1):
+            self.assertEqual(self.board(), [('bob', 4, 1), ('ann', 3, 2), ('cat', 0, 3)])
+
+    def test_completions_are_patched_in_on_commit(self):
+        for window in ('week', 'all'):
+            self.board(window)
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = [self.complete(self.cat, f'Cat {i}') for i in range(2)]
+        with self.assertNumQueries(1):
+            self.assertEqual(self.board('week'), [('ann', 3, 1), ('cat', 2, 2), ('bob', 1, 3)])
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/profiles/leaderboard/me/').data
+        self.assertEqual((data['rank'], data['completed_chores'], data['streak']), (3, 2, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/chores/{ids[0]}/', {'completed_at': None}, format='json')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.board('week'), [('ann', 3, 1), ('bob', 1, 2), ('cat', 1, 3)])
+        self.assertEqual(self.board(), [('bob', 4, 1), ('ann', 3, 2), ('cat', 1, 3)])
+        # Streaks included, the patched boards are what a rebuild produces
+        patched = [self.client.get(f'/api/profiles/leaderboard/?window={window}').data for window in ('week', 'all')]
+        cache.clear()
+        self.assertEqual([self.client.get(f'/api/profiles/leaderboard/?window={window}').data for window in ('week', 'all')], patched)
+
+    def test_unpatched_completion_rebuilds(self):
+        self.board()
+        # Committed elsewhere: the patch never reaches this cache, the version still moves
+        self.complete(self.cat, 'Cat')
+        self.complete(self.cat, 'Cat again')
+        self.assertEqual(self.board(), [('bob', 4, 1), ('ann', 3, 2), ('cat', 2, 3)])
+
+    def test_profile_edits_rebuild(self):
+        self.board()
+        profile = Profile.objects.get(user=self.ann)
+        profile.display_name = 'Annie'
+        profile.save()
+        response = self.client.get('/api/profiles/leaderboard/')
+        self.assertEqual(response.data[1]['display_name'], 'Annie')
+
+    def test_rolled_back_change_never_shows(self):
+        before = self.board()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Chore.objects.create(title='Cat', assignee=self.cat, completed_at=timezone.now())
+            raise RuntimeError
+        self.assertEqual(self.board(), before)
+
+    def test_writes_that_skip_the_signals(self):
+        self.board()
+        UserStats.objects.filter(user=self.ann).update(total_completed=10)
+        self.assertEqual(self.board()[0], ('bob', 4, 1))
+        # Bulk writers bump the version themselves; every process then rebuilds its board
+        versions.bump(versions.LEADERBOARD)
+        self.assertEqual(self.board()[0], ('ann', 10, 1))
+
+
+class PushQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pushed')
+        self.subscription = self.subscribe('https://push.example.com/ok')
+
+    def subscribe(self, endpoint):
+        return PushSubscription.objects.create(user=self.user, endpoint=endpoint, p256dh='key', auth='auth')
+
+    def queue(self, subscription=None, **fields):
+        return PushJob.objects.create(subscription=subscription or self.subscription, payload={'title': 'Hi'}, **fields)
+
+    def test_claim_leases_due_jobs(self):
+        due = [self.queue(), self.queue()]
+        self.queue(next_attempt_at=timezone.now() + timezone.timedelta(hours=1))
+        self.queue(status='failed')
+        self.assertEqual({job.pk for job in push.claim_jobs(10)}, {job.pk for job in due})
+        # Leased to this worker: nobody else claims them until the lease runs out
+        self.assertEqual(push.claim_jobs(10), [])
+        PushJob.objects.filter(pk=due[0].pk).update(next_attempt_at=timezone.now())
+        self.assertEqual([job.pk for job in push.claim_jobs(10)], [due[0].pk])
+
+    def test_retries_back_off(self):
+        job = self.queue()
+        for attempt in (1, 2, 3):
+            started = timezone.now()
+            self.assertEqual(push.record_results([(job, push.RETRY, '503 Busy')]), {'sent': 0, 'pruned': 0, 'retried': 1})
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error), ('pending', attempt, '503 Busy'))
+            delay = (job.next_attempt_at - started).total_seconds()
+            expected = push.BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)
+            self.assertTrue(expected * 0.8 - 1 <= delay <= expected * 1.2 + 1, delay)
+
+    def test_gives_up_after_max_attempts(self):
+        job = self.queue(attempts=push.MAX_ATTEMPTS - 2)
+        push.record_results([(job, push.RETRY, 'timeout')])
+        self.assertEqual(PushJob.objects.get(pk=job.pk).status, 'pending')
+        with self.assertLogs('chores.push', 'WARNING'):
+            push.record_results([(job, push.RETRY, 'timeout')])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', push.MAX_ATTEMPTS))
+        PushJob.objects.filter(pk=job.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(push.claim_jobs(10), [])
+
+    def test_sent_jobs_are_deleted(self):
+        sent, other = self.queue(), self.queue()
+        self.assertEqual(push.record_results([(sent, push.SENT, '')])['sent'], 1)
+        self.assertEqual(list(PushJob.objects.values_list('pk', flat=True)), [other.pk])
+
+    def test_gone_subscription_is_deleted_with_its_jobs(self):
+        gone = self.subscribe('https://push.example.com/gone')
+        jobs = [self.queue(gone), self.queue(gone)]
+        kept = self.queue()
+        self.assertEqual(push.record_results([(jobs[0], push.GONE, '410 Gone')])['pruned'], 1)
+        self.assertFalse(PushSubscription.objects.filter(pk=gone.pk).exists())
+        self.assertEqual(list(PushJob.objects.values_list('pk', flat=True)), [kept.pk])
+
+    def test_gone_status_codes(self):
+        sender = push.WebPushSender(private_key='')
+        for status_code, outcome in ((201, push.SENT), (404, push.GONE), (410, push.GONE), (429, push.RETRY), (500, push.RETRY)):
+            with mock.patch('chores.push.WebPusher') as pusher:
+                pusher.return_value.send.return_value = mock.Mock(status_code=status_code, reason='', text='')
+                self.assertEqual(sender.send(self.subscription, {'title': 'Hi'})[0], outcome, status_code)
+
+    def test_worker_drains_the_queue(self):
+        gone = self.subscribe('https://push.example.com/gone')
+        flaky = self.subscribe('https://push.example.com/flaky')
+        for subscription in (self.subscription, gone, flaky):
+            self.queue(subscription)
+        self.queue(gone)
+        sender = push.WebPushSender(private_key='')
+        outcomes = {'ok': (push.SENT, ''), 'gone': (push.GONE, '410 Gone'), 'flaky': (push.RETRY, '500 Oops')}
+        with mock.patch('chores.management.commands.push_worker.get_sender', return_value=sender), \
+                mock.patch.object(sender, 'send', side_effect=lambda subscription, payload, data=None: outcomes[subscription.endpoint.rsplit('/', 1)[1]]):
+            output = StringIO()
+            call_command('push_worker', '--once', '--workers', '2', stdout=output)
+        self.assertIn('1 sent, 1 retried, 1 subscriptions pruned', output.getvalue())
+        job = PushJob.objects.get()
+        self.assertEqual((job.subscription_id, job.attempts, job.status), (flaky.pk, 1, 'pending'))
+        self.assertFalse(PushSubscription.objects.filter(pk=gone.pk).exists())
+
+
+class PushSenderTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        key = Vapid()
+        key.generate_keys()
+        # The base64 DER form VAPID_PRIVATE_KEY is usually given in
+        cls.private_key = b64urlencode(key.private_key.private_bytes(
+            serialization.Encoding.DER, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+        ))
+
+    def test_key_is_parsed_once(self):
+        with mock.patch.object(Vapid, 'from_string', wraps=Vapid.from_string) as from_string:
+            sender = push.WebPushSender(private_key=self.private_key)
+            for origin in ('https://a.example.com', 'https://b.example.com', 'https://a.example.com'):
+                sender.vapid_headers(origin)
+        from_string.assert_called_once()
+
+    def test_headers_are_reused_per_origin_until_the_renew_margin(self):
+        sender = push.WebPushSender(private_key=self.private_key)
+        now = 1_700_000_000
+        renew_at = now + sender.VAPID_LIFETIME_SECONDS - sender.VAPID_RENEW_MARGIN_SECONDS
+        with mock.patch('chores.push.time.time', return_value=now), \
+                mock.patch.object(sender.vapid, 'sign', wraps=sender.vapid.sign) as sign:
+            first = sender.vapid_headers('https://a.example.com')
+            self.assertIs(sender.vapid_headers('https://a.example.com'), first)
+            other = sender.vapid_headers('https://b.example.com')
+            self.assertNotEqual(other, first)
+            self.assertEqual(sign.call_count, 2)
+            self.assertEqual(sign.call_args_list[0].args[0], {
+                'sub': sender.subject, 'aud': 'https://a.example.com', 'exp': now + sender.VAPID_LIFETIME_SECONDS,
+            })
+            with mock.patch('chores.push.time.time', return_value=renew_at - 1):
+                self.assertIs(sender.vapid_headers('https://a.example.com'), first)
+            with mock.patch('chores.push.time.time', return_value=renew_at):
+                self.assertIsNot(sender.vapid_headers('https://a.example.com'), first)
+            self.assertEqual(sign.call_count, 3)
+
+    def test_no_key_means_no_headers(self):
+        self.assertEqual(push.WebPushSender(private_key='').vapid_headers('https://a.example.com'), {})
+
+    def test_one_pooled_session_per_origin(self):
+        sender = push.WebPushSender(private_key='', pool_size=4)
+        session = sender.session('https://a.example.com')
+        self.assertIs(sender.session('https://a.example.com'), session)
+        self.assertIsNot(sender.session('https://b.example.com'), session)
+        adapter = session.get_adapter('https://a.example.com/push/1')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        subscription = PushSubscription(endpoint='https://a.example.com/push/1', p256dh='key', auth='auth')
+        with mock.patch('chores.push.WebPusher') as pusher:
+            pusher.return_value.send.return_value = mock.Mock(status_code=201)
+            sender.send(subscription, {'title': 'Hi'})
+        self.assertIs(pusher.call_args.kwargs['requests_session'], session)
+        sender.close()
+        self.assertIsNot(sender.session('https://a.example.com'), session)
+
+
+class ChoreListQueryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lister', password='x')
+        Profile.objects.create(user=cls.user, display_name='Lister')
+        assignees = [User.objects.create_user(f'assignee{i}') for i in range(3)]
+        chores = [Chore.objects.create(title=f'Chore {i}', assignee=assignees[i % 3]) for i in range(30)]
+        for i, chore in enumerate(chores[1:], start=1):
+            chore.dependencies.add(chores[i - 1])
+        # Identical timestamps make the id tie-breaker part of the cursor matter
+        Chore.objects.filter(pk__in=[c.pk for c in chores[10:20]]).update(created_at=timezone.now())
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        counts = {size: self.list_queries(f'/api/chores/?page_size={size}')[1] for size in (1, 5, 30)}
+        self.assertEqual(len(set(counts.values())), 1, counts)
+        # One query for the chores (with assignees joined), one for the dependency ids,
+        # one for the data version behind the ETag
+        self.assertLessEqual(counts[30], 3)
+
+    def test_cursor_pages_cover_every_chore_once_in_order(self):
+        seen = []
+        url = '/api/chores/?page_size=7'
+        while url:
+            response, queries = self.list_queries(url)
+            self.assertLessEqual(queries, 3)
+            seen.extend((item['created_at'], item['id']) for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), Chore.objects.count())
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/chores/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+
+class ChoreFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('filterer', password='x')
+        cls.other = User.objects.create_user('other', password='x')
+        Profile.objects.create(user=cls.user, display_name='Filterer')
+        Profile.objects.create(user=cls.other, display_name='Other')
+        now = timezone.now()
+        cls.done = Chore.objects.create(title='Done', assignee=cls.user, category='kitchen', completed_at=now)
+        cls.late = Chore.objects.create(title='Late', assignee=cls.user, priority='high', due_date=now - timezone.timedelta(days=2))
+        cls.upcoming = Chore.objects.create(title='Upcoming', assignee=cls.other, category='garden', due_date=now + timezone.timedelta(days=3))
+        cls.unassigned = Chore.objects.create(title='Unassigned')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def titles(self, query):
+        response = self.client.get(f'/api/chores/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {item['title'] for item in response.data['results']}
+
+    def test_filters(self):
+        self.assertEqual(self.titles(f'assigneeId={self.user.pk}'), {'Done', 'Late'})
+        self.assertEqual(self.titles('assignee=me&status=pending'), {'Late'})
+        self.assertEqual(self.titles('assignee=none'), {'Unassigned'})
+        self.assertEqual(self.titles('status=completed'), {'Done'})
+        self.assertEqual(self.titles('overdue=true'), {'Late'})
+        self.assertEqual(self.titles('pending=true'), {'Late', 'Upcoming', 'Unassigned'})
+        self.assertEqual(self.titles('priority=high'), {'Late'})
+        self.assertEqual(self.titles('category=garden'), {'Upcoming'})
+        self.assertEqual(self.titles(f'due_after={timezone.now().date().isoformat()}'), {'Upcoming'})
+        self.assertEqual(self.titles(f'due_before={timezone.now().date().isoformat()}'), {'Late'})
+        self.assertEqual(len(self.titles('limit=2')), 2)
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ('status=someday', 'priority=urgent', 'assignee=bob', 'due_after=soon'):
+            self.assertEqual(self.client.get(f'/api/chores/?{query}').status_code, 400, query)
+
+
+class ChoreFilterIndexTests(TestCase):
+    """The common list filters must be answered from the Chore indexes (SQLite and Postgres)."""
+
+    def plan(self, params):
+        # Same shape as a list page: view ordering plus the pagination LIMIT
+        queryset = filter_chores(ChoreViewSet.queryset, params)[:KeysetCursorPagination.page_size + 1]
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be sequentially scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, params, *index_names):
+        plan = self.plan(params)
+        self.assertTrue(any(name in plan for name in index_names), f'{params} did not use {index_names}:\n{plan}')
+
+    def test_assignee_filters_use_composite_index(self):
+        self.assertUsesIndex({'assignee': '1'}, 'chore_assignee_done_idx')
+        self.assertUsesIndex({'assignee': '1', 'status': 'completed'}, 'chore_assignee_done_idx')
+
+    def test_due_date_range_uses_due_index(self):
+        self.assertUsesIndex({'due_after': '2025-01-01', 'due_before': '2025-02-01'}, 'chore_due_idx', 'chore_pending_due_idx')
+
+    def test_category_uses_category_index(self):
+        self.assertUsesIndex({'category': 'kitchen'}, 'chore_category_idx')
+
+    def test_overdue_uses_partial_pending_index(self):
+        self.assertUsesIndex({'overdue': 'true'}, 'chore_pending_due_idx')
+
+
+class BulkChoreOperationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bulker', password='x')
+        Profile.objects.create(user=cls.user, display_name='Bulker')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def bulk(self, payload):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/chores/bulk/', payload, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data, len(ctx.captured_queries)
+
+    def create(self, count):
+        data, queries = self.bulk({'action': 'create', 'chores': [
+            {'title': f'Chore {i}', 'assignee_id': self.user.pk} for i in range(count)
+        ]})
+        return [item['id'] for item in data['results']], queries
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        small_ids, small_create = self.create(2)
+        large_ids, large_create = self.create(40)
+        self.assertEqual(small_create, large_create)
+        _, small_complete = self.bulk({'action': 'complete', 'ids': small_ids})
+        _, large_complete = self.bulk({'action': 'complete', 'ids': large_ids})
+        self.assertLessEqual(large_complete, small_complete)
+
+    def test_stats_follow_complete_reassign_and_delete(self):
+        other = User.objects.create_user('other-bulker')
+        Profile.objects.create(user=other, display_name='Other')
+        ids, _ = self.create(5)
+        self.bulk({'action': 'complete', 'ids': ids})
+        self.assertEqual(UserStats.objects.get(user=self.user).total_completed, 5)
+        self.assertTrue(self.user.achievements.filter(title='1 Chores Completed').exists())
+        self.bulk({'action': 'reassign', 'ids': ids[:2], 'assignee_id': other.pk})
+        self.assertEqual(UserStats.objects.get(user=self.user).total_completed, 3)
+        self.assertEqual(UserStats.objects.get(user=other).total_completed, 2)
+        data, _ = self.bulk({'action': 'delete', 'ids': ids})
+        self.assertEqual(sorted(data['deleted']), sorted(ids))
+        self.assertEqual(UserStats.objects.get(user=self.user).total_completed, 0)
+        self.assertEqual(UserStats.objects.get(user=other).total_completed, 0)
+
+    def test_unknown_ids_roll_back_the_whole_batch(self):
+        ids, _ = self.create(2)
+        response = self.client.post('/api/chores/bulk/', {'action': 'complete', 'ids': ids + [10**9]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Chore.objects.filter(pk__in=ids, completed_at__isnull=False).exists())
+        response = self.client.post('/api/chores/bulk/', {'action': 'delete', 'ids': ids + [10**9]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ids'], f'Unknown chore ids: {[10**9]}')
+        self.assertEqual(Chore.objects.filter(pk__in=ids).count(), 2)
+
+
+class SyncChangesTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('syncer', password='x')
+        Profile.objects.create(user=cls.user, display_name='Syncer')
         for i in range(5):
-            dt = now.replace(hour=8, minute=0, second=0, microsecond=0) - timezone.timedelta(days=i)
+            Chore.objects.create(title=f'Chore {i}')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        patcher = mock.patch('chores.sync.CURSOR_LAG_SECONDS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sync(self, since='', limit=100):
+        response = self.client.get('/api/sync/changes/', {'since': since, 'limit': limit})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_pages_through_everything_then_returns_only_changes(self):
+        cursor, titles = '', []
+        while True:
+            data = self.sync(cursor, limit=2)
+            titles.extend(item['title'] for item in data['chores'])
+            cursor = data['cursor']
+            if not data['has_more']:
+                break
+        self.assertEqual(sorted(titles), [f'Chore {i}' for i in range(5)])
+
+        changed = Chore.objects.get(title='Chore 3')
+        changed.title = 'Renamed'
+        changed.save()
+        removed = Chore.objects.get(title='Chore 1')
+        removed_pk = removed.pk
+        removed.delete()
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.sync(cursor)
+        self.assertEqual([item['title'] for item in data['chores']], ['Renamed'])
+        self.assertEqual(data['deleted'], {'chores': [removed_pk]})
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+
+        data = self.sync(data['cursor'])
+        self.assertEqual(data['chores'], [])
+        self.assertEqual(data['deleted'], {})
+
+    def test_cursor_older_than_the_tombstone_retention_resyncs(self):
+        cursor = self.sync()['cursor']
+        Chore.objects.first().delete()
+        self.assertFalse(self.sync(cursor)['reset'])
+
+        later = timezone.now() + timezone.timedelta(days=sync.TOMBSTONE_RETENTION_DAYS, seconds=1)
+        self.assertEqual(sync.prune_tombstones(now=later), 1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            data = self.sync(cursor)
+            self.assertTrue(data['reset'])
+            self.assertEqual(len(data['chores']), 4)
+            # A client that keeps up is never reset, even with no deletions to move its cursor
+            self.assertFalse(self.sync(data['cursor'])['reset'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/sync/changes/?since=nope').status_code, 400)
+
+
+class ConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('poller', password='x')
+        Profile.objects.create(user=cls.user, display_name='Poller')
+        cls.chore = Chore.objects.create(title='Dishes', assignee=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return etag, response, ctx.captured_queries
+
+    def test_not_modified_without_touching_chores(self):
+        for url in ('/api/chores/', f'/api/chores/{self.chore.pk}/', '/api/profiles/me/', f'/api/achievements/?user={self.user.pk}'):
+            etag, response, queries = self.revalidate(url)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(len(queries), 1, url)
+            self.assertNotIn('chores_chore', queries[0]['sql'])
+
+    def test_changes_invalidate_the_etag(self):
+        chore_etag = self.client.get('/api/chores/')['ETag']
+        badge_etag = self.client.get(f'/api/achievements/?user={self.user.pk}')['ETag']
+        response = self.client.post('/api/chores/bulk/', {'action': 'complete', 'ids': [self.chore.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/api/chores/', HTTP_IF_NONE_MATCH=chore_etag).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/achievements/?user={self.user.pk}', HTTP_IF_NONE_MATCH=badge_etag).status_code, 200)
+
+
+class DependencyGraphTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', password='x')
+        Profile.objects.create(user=cls.user, display_name='Planner')
+        # wash <- dry <- fold, and an unrelated chore
+        cls.wash = Chore.objects.create(title='Wash')
+        cls.dry = Chore.objects.create(title='Dry')
+        cls.fold = Chore.objects.create(title='Fold')
+        cls.sweep = Chore.objects.create(title='Sweep')
+        cls.dry.dependencies.add(cls.wash)
+        cls.fold.dependencies.add(cls.dry)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def titles(self, data):
+        return [item['title'] for item in data]
+
+    def test_blocks_others_follows_the_edges(self):
+        blocking = set(Chore.objects.filter(blocks_others=True).values_list('title', flat=True))
+        self.assertEqual(blocking, {'Wash', 'Dry'})
+        response = self.client.patch(f'/api/chores/{self.fold.pk}/', {'dependencies': []}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(Chore.objects.filter(blocks_others=True).values_list('title', flat=True)), {'Wash'})
+        self.dry.delete()
+        self.assertFalse(Chore.objects.filter(blocks_others=True).exists())
+
+    def test_deletes_refresh_only_the_deleted_chores_dependencies(self):
+        version = versions.current([versions.DEPENDENCIES])
+        # No edges: the graph and every blocks_others flag are left alone
+        with CaptureQueriesContext(connection) as ctx:
+            self.sweep.delete()
+        self.assertFalse(any('blocks_others' in query['sql'] for query in ctx.captured_queries))
+        self.assertEqual(versions.current([versions.DEPENDENCIES]), version)
+        with CaptureQueriesContext(connection) as ctx:
+            self.fold.delete()
+        refreshes = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE') and 'blocks_others' in query['sql']]
+        self.assertTrue(refreshes)
+        self.assertTrue(all(f'IN ({self.dry.pk})' in sql for sql in refreshes), refreshes)
+        self.assertEqual(set(Chore.objects.filter(blocks_others=True).values_list('title', flat=True)), {'Wash'})
+        self.assertNotEqual(versions.current([versions.DEPENDENCIES]), version)
+
+    def test_cycles_are_rejected(self):
+        response = self.client.patch(f'/api/chores/{self.wash.pk}/', {'dependencies': [self.fold.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/chores/bulk/', {'action': 'update', 'chores': [
+            {'id': self.sweep.pk, 'dependencies': [self.wash.pk]},
+            {'id': self.wash.pk, 'dependencies': [self.sweep.pk]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.wash.dependencies.exists())
+
+    def test_completion_waits_for_dependencies(self):
+        response = self.client.patch(f'/api/chores/{self.fold.pk}/', {'completed_at': timezone.now().isoformat()}, format='json')
+        self.assertEqual(response.status_code, 400)
+        # Completing the whole chain in one operation is fine
+        response = self.client.post('/api/chores/bulk/', {'action': 'complete', 'ids': [self.fold.pk, self.dry.pk, self.wash.pk]}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ready_blocked_and_critical_path(self):
+        self.assertEqual(set(self.titles(self.client.get('/api/chores/ready/').data['results'])), {'Wash', 'Sweep'})
+        self.assertEqual(set(self.titles(self.client.get(f'/api/chores/{self.wash.pk}/blocked/').data)), {'Dry', 'Fold'})
+        response = self.client.get('/api/chores/critical-path/')
+        self.assertEqual(self.titles(response.data['results']), ['Wash', 'Dry', 'Fold'])
+        response = self.client.get(f'/api/chores/critical-path/?chore={self.dry.pk}')
+        self.assertEqual(self.titles(response.data['results']), ['Wash', 'Dry'])
+
+        self.client.post('/api/chores/bulk/', {'action': 'complete', 'ids': [self.wash.pk]}, format='json')
+        self.assertEqual(set(self.titles(self.client.get('/api/chores/ready/').data['results'])), {'Dry', 'Sweep'})
+        self.assertEqual(self.titles(self.client.get('/api/chores/critical-path/').data['results']), ['Dry', 'Fold'])
+
+
+class RecurrenceSchedulerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.make_aware(timezone.datetime(2026, 3, 10, 12, 0))
+
+    def materialize(self, **kwargs):
+        return materialize_due(now=self.now, **kwargs)
+
+    def test_next_occurrence(self):
+        due = timezone.make_aware(timezone.datetime(2026, 1, 31, 8, 0))
+        self.assertEqual(next_occurrence(due, 'monthly', due), timezone.make_aware(timezone.datetime(2026, 2, 28, 8, 0)))
+        # Missed periods are skipped
+        self.assertEqual(next_occurrence(due, 'monthly', self.now), timezone.make_aware(timezone.datetime(2026, 3, 31, 8, 0)))
+        self.assertEqual(next_occurrence(due, 'weekly', self.now), timezone.make_aware(timezone.datetime(2026, 3, 14, 8, 0)))
+        self.assertEqual(next_occurrence(due, 'daily', self.now), timezone.make_aware(timezone.datetime(2026, 3, 11, 8, 0)))
+
+    def test_rolls_over_due_chores_in_chunks_once(self):
+        for i in range(7):
+            Chore.objects.create(title=f'Daily {i}', is_recurring=True, recurrence_pattern='daily', due_date=self.now - timezone.timedelta(hours=i + 1))
+        Chore.objects.create(title='Later', is_recurring=True, recurrence_pattern='weekly', due_date=self.now + timezone.timedelta(days=1))
+        Chore.objects.create(title='One-off', due_date=self.now - timezone.timedelta(days=1))
+        self.assertEqual(self.materialize(chunk_size=3), (7, 7))
+        self.assertEqual(self.materialize(), (0, 0))
+        occurrences = Chore.objects.filter(occurrence_date__isnull=False)
+        self.assertEqual(occurrences.count(), 7)
+        self.assertTrue(all(chore.due_date > self.now and chore.series_id for chore in occurrences))
+
+        # A rerun over rows that were never marked rolled over writes nothing new
+        Chore.objects.filter(occurrence_date__isnull=True).update(rolled_over_at=None)
+        self.assertEqual(self.materialize(), (7, 0))
+        self.assertEqual(Chore.objects.filter(occurrence_date__isnull=False).count(), 7)
+
+    def test_occurrences_written_elsewhere_are_not_counted(self):
+        due = Chore.objects.create(title='Bins', is_recurring=True, recurrence_pattern='weekly', due_date=self.now - timezone.timedelta(hours=1))
+        # Another scheduler got to the series first
+        Chore.objects.create(title='Bins', is_recurring=True, recurrence_pattern='weekly', series_id=due.pk,
+                             due_date=due.due_date + timezone.timedelta(weeks=1), occurrence_date=timezone.localdate(due.due_date + timezone.timedelta(weeks=1)))
+        rollups = list(DailyRollup.objects.values_list('day', 'category', 'priority', 'created', 'completed'))
+        self.assertEqual(self.materialize(), (1, 0))
+        self.assertEqual(list(DailyRollup.objects.values_list('day', 'category', 'priority', 'created', 'completed')), rollups)
+
+    def test_written_occurrences_are_published_live(self):
+        user = User.objects.create_user('recurring-live')
+        Chore.objects.create(title='Bins', assignee=user, is_recurring=True, recurrence_pattern='weekly', due_date=self.now - timezone.timedelta(hours=1))
+        LiveEvent.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.materialize(), (1, 1))
+        occurrence = Chore.objects.get(occurrence_date__isnull=False)
+        events = [(event.kind, event.user_id, event.data['id']) for event in LiveEvent.objects.order_by('id')]
+        self.assertEqual(events, [('chore.created', None, occurrence.pk), ('chore.assigned', user.pk, occurrence.pk)])
+
+        # A rerun that writes nothing announces nothing
+        Chore.objects.filter(occurrence_date__isnull=True).update(rolled_over_at=None)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.materialize(), (1, 0))
+        self.assertEqual(LiveEvent.objects.count(), 2)
+
+
+class ArchiveTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('archivist', password='x')
+        Profile.objects.create(user=cls.user, display_name='Archivist')
+        now = timezone.now()
+        cls.old = [
+            Chore.objects.create(title=f'Old {i}', assignee=cls.user, category='garden', completed_at=now - timezone.timedelta(days=200 + i))
+            for i in range(5)
+        ]
+        cls.recent = Chore.objects.create(title='Recent', assignee=cls.user, completed_at=now - timezone.timedelta(days=10))
+        cls.pending = Chore.objects.create(title='Pending', assignee=cls.user, due_date=now - timezone.timedelta(days=300))
+        cls.pending.dependencies.add(cls.old[0])
+        cls.total = UserStats.objects.get(user=cls.user).total_completed
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch('chores.archive.ARCHIVE_DIR', Path(directory.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_moves_old_completed_chores_and_keeps_stats(self):
+        # Clamped to the 32-day minimum, so the recent chore stays
+        segments = archive_completed(older_than_days=1, batch_size=2)
+        self.assertEqual([segment.chore_count for segment in segments], [2, 2, 1])
+        self.assertEqual(set(Chore.objects.values_list('title', flat=True)), {'Recent', 'Pending'})
+        archived = [record for segment in segments for record in read_segment(segment)]
+        self.assertEqual(sorted(record['title'] for record in archived), [f'Old {i}' for i in range(5)])
+        self.assertEqual(UserStats.objects.get(user=self.user).total_completed, self.total)
+        self.assertEqual(Tombstone.objects.filter(model='chore').count(), 5)
+        self.assertFalse(Chore.objects.filter(blocks_others=True).exists())
+        self.assertEqual(archive_completed(), [])
+
+        stats = self.client.get('/api/archive/stats/').data
+        self.assertEqual(stats['segments'], 3)
+        self.assertEqual(stats['archived_chores'], 5)
+        self.assertEqual(stats['my_archived_chores'], 5)
+        self.assertEqual(stats['eligible_chores'], 0)
+        self.assertGreater(stats['raw_bytes'], 0)
+        self.assertEqual(stats['compression_savings_bytes'], stats['raw_bytes'] - stats['compressed_bytes'])
+
+        # Archived chores keep counting in the daily rollups, and a rebuild reads them back
+        rows = {(row.day, row.assignee_id, row.category, row.priority): row.completed for row in DailyRollup.objects.all()}
+        self.assertEqual(rows, {key: counters.get('completed', 0) for key, counters in build_rows().items()})
+        self.assertEqual(sum(rows.values()), 6)
+
+
+class ActivityBitmapTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('streaker')
+        self.profile = Profile.objects.create(user=self.user, display_name='Streaker')
+        self.today = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+
+    def complete(self, days_ago, **kwargs):
+        return Chore.objects.create(title=f'Day -{days_ago}', assignee=self.user, completed_at=self.today - timezone.timedelta(days=days_ago), **kwargs)
+
+    def streaks(self):
+        self.profile.refresh_from_db()
+        return self.profile.current_streak, self.profile.longest_streak
+
+    def test_out_of_order_completions(self):
+        for days_ago in (0, 2, 1, 5, 6):
+            self.complete(days_ago)
+        self.assertEqual(self.streaks(), (3, 3))
+        # Backdated past the start of the bitmap
+        self.complete(4)
+        self.complete(3)
+        self.assertEqual(self.streaks(), (7, 7))
+        self.assertLessEqual(len(bytes(self.profile.activity_bits)), 1)
+
+    def test_uncompleting_clears_the_day_only_when_it_was_the_last(self):
+        chores = [self.complete(days_ago) for days_ago in (0, 1, 2)]
+        extra = self.complete(1)
+        extra.completed_at = None
+        extra.save()
+        self.assertEqual(self.streaks(), (3, 3))
+        chores[1].completed_at = None
+        chores[1].save()
+        self.assertEqual(self.streaks(), (1, 1))
+        chores[1].delete()
+        chores[0].delete()
+        self.assertEqual(self.streaks(), (1, 1))
+
+    def test_perfect_week_and_windows(self):
+        monday = self.today - timezone.timedelta(days=self.today.weekday() + 7)
+        for offset in range(7):
+            Chore.objects.create(title=f'Week {offset}', assignee=self.user, completed_at=monday + timezone.timedelta(days=offset))
+        self.profile.refresh_from_db()
+        self.assertTrue(perfect_week(self.profile, monday.date()))
+        self.assertFalse(perfect_week(self.profile, self.today.date() + timezone.timedelta(days=7)))
+        self.assertEqual(active_days_in(self.profile, monday.date() + timezone.timedelta(days=9), 10), 7)
+        self.assertTrue(self.user.achievements.filter(title='Perfect Week', completed=True).exists())
+
+
+class RecomputeAchievementsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('replayer')
+        self.profile = Profile.objects.create(user=self.user, display_name='Replayer')
+        now = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0)
+        for days_ago in range(12):
+            Chore.objects.create(title=f'Day -{days_ago}', assignee=self.user, category=f'cat{days_ago % 6}', completed_at=now - timezone.timedelta(days=days_ago))
+
+    def recompute(self, *args):
+        out = StringIO()
+        call_command('recompute_achievements', '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def snapshot(self):
+        self.profile.refresh_from_db()
+        badges = set(self.user.achievements.filter(completed=True).values_list('title', flat=True))
+        stats = UserStats.objects.get(user=self.user)
+        return self.profile.current_streak, self.profile.longest_streak, bytes(self.profile.activity_bits), stats.total_completed, stats.category_counts, badges
+
+    def test_rebuilds_what_the_signals_produced(self):
+        expected = self.snapshot()
+        self.assertIn('0 of 1 users would change', self.recompute('--dry-run'))
+
+        Profile.objects.filter(pk=self.profile.pk).update(current_streak=1, longest_streak=1, activity_bits=b'', activity_epoch=None)
+        UserStats.objects.filter(user=self.user).update(total_completed=3, category_counts={})
+        self.user.achievements.filter(title__in=['1 Chores Completed', 'Variety Explorer']).delete()
+        out = self.recompute('--dry-run')
+        self.assertIn('+ Variety Explorer', out)
+        self.assertIn('streak: 1/1 -> 12/12', out)
+        self.assertNotEqual(self.snapshot(), expected)
+
+        self.recompute()
+        self.assertEqual(self.snapshot(), expected)
+
+
+class GenerateDatasetTests(TestCase):
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_dataset', '--users', '3', '--chores-per-user', '40', '--dependency-rate', '0.3', *args, stdout=out)
+        return out.getvalue()
+
+    def signature(self, prefix):
+        rows = Chore.objects.filter(assignee__username__startswith=prefix).order_by('id')
+        return [(row.title, row.category, row.priority, row.is_recurring, row.completed_at is None) for row in rows]
+
+    def test_deterministic_bulk_dataset(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.generate('--seed', '7', '--prefix', 'a')
+        self.assertEqual(Chore.objects.count(), 120)
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertTrue(Chore.objects.filter(blocks_others=True).exists())
+        # Historical timestamps survive the bulk insert
+        self.assertTrue(Chore.objects.filter(created_at__lt=timezone.now() - timezone.timedelta(days=30)).exists())
+        self.assertTrue(Chore.objects.filter(updated_at__lt=timezone.now() - timezone.timedelta(days=30)).exists())
+        self.assertFalse(UserStats.objects.exists())
+
+        self.generate('--seed', '7', '--prefix', 'b', '--recompute', '--workers', '1')
+        self.assertEqual(self.signature('a-7-'), self.signature('b-7-'))
+        self.assertEqual(UserStats.objects.count(), 6)
+        self.assertIn('already exist', self.generate_error('--seed', '7', '--prefix', 'a'))
+
+    def test_with_signals_keeps_stats_and_rollups_as_it_goes(self):
+        self.generate('--seed', '7', '--prefix', 'c', '--with-signals')
+        self.assertEqual(UserStats.objects.count(), 3)
+        completed = Chore.objects.filter(completed_at__isnull=False).count()
+        self.assertEqual(UserStats.objects.aggregate(total=models.Sum('total_completed'))['total'], completed)
+        self.assertTrue(Achievement.objects.filter(completed=True).exists())
+        self.assertTrue(Chore.objects.filter(blocks_others=True).exists())
+        self.assertTrue(Chore.objects.filter(created_at__lt=timezone.now() - timezone.timedelta(days=30)).exists())
+        # Rollup rows land on the historical creation days, as a rebuild would put them
+        rows = {(row.day, row.assignee_id, row.category, row.priority): (row.created, row.completed) for row in DailyRollup.objects.all()}
+        self.assertEqual(rows, {key: (counters.get('created', 0), counters.get('completed', 0)) for key, counters in build_rows().items()})
+
+    def generate_error(self, *args):
+        try:
+            self.generate(*args)
+        except CommandError as error:
+            return str(error)
+        return ''
+
+    def test_simulate_badges_unlocks_every_family(self):
+        user = User.objects.create_user('badger')
+        Profile.objects.create(user=user, display_name='Badger')
+        chores_version = versions.current([versions.CHORES])
+        call_command('simulate_badges', 'badger', stdout=StringIO())
+        categories = set(user.achievements.filter(completed=True).values_list('category', flat=True))
+        self.assertEqual(categories, {'completion', 'streak', 'speed', 'variety', 'special'})
+        self.assertNotEqual(versions.current([versions.CHORES]), chores_version)
+        created = DailyRollup.objects.filter(assignee_id=user.pk).aggregate(total=models.Sum('created'))['total']
+        self.assertEqual(created, Chore.objects.filter(assignee=user).count())
+
+
+class BenchmarkBudgetTests(TestCase):
+    def test_hot_paths_stay_within_query_budgets(self):
+        user = benchmarks.build_dataset(users=4, chores_per_user=150, seed=3)
+        results = benchmarks.run(user, iterations=5, warmup=2)
+        self.assertEqual(set(results), set(benchmarks.SCENARIOS))
+        # Latency depends on the machine; query counts must not depend on the dataset size
+        self.assertEqual(benchmarks.check(results, benchmarks.load_budgets(), latency=False), [])
+
+
+class QueryInstrumentationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('timer')
+        for i in range(6):
+            Profile.objects.create(user=cls.user if i == 0 else User.objects.create_user(f'member{i}'), display_name=f'Member {i}')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_disabled_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/chores/'))
+
+    def test_server_timing_and_repeated_query_log(self):
+        with override_settings(QUERY_INSTRUMENTATION=True, QUERY_REPEAT_THRESHOLD=5, QUERY_LOG_MAX_QUERIES=5), \
+                self.assertLogs('chores.queries', 'WARNING') as logs:
+            response = self.client.get('/api/profiles/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+, sql-1;dur=')
+        # The nested user is loaded once per profile
+        n_plus_one = [line for line in logs.output if 'Possible N+1' in line]
+        self.assertEqual(len(n_plus_one), 1)
+        self.assertIn('profile-list', n_plus_one[0])
+        self.assertIn('6 identical queries', n_plus_one[0])
+        self.assertTrue(any('queries' in line and 'slowest' in line for line in logs.output))
+
+
+@override_settings(METRICS_TOKEN='s3cret')
+class MetricsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('metered')
+        Profile.objects.create(user=cls.user, display_name='Metered')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def scrape(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def sample(self, text, name):
+        line = next((line for line in text.splitlines() if line.startswith(name + ' ')), None)
+        return float(line.rsplit(' ', 1)[1]) if line else 0.0
+
+    def test_completion_is_measured_end_to_end(self):
+        chore = Chore.objects.create(title='Sweep', assignee=self.user)
+        before = self.scrape()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/chores/{chore.pk}/', {'completed_at': timezone.now().isoformat()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        text = self.scrape()
+        for name in (
+            'dusty_request_duration_seconds_count{view="ChoreViewSet",action="partial_update",method="PATCH",status="2xx"}',
+            'dusty_completion_milestones_seconds_count',
+            'dusty_badge_evaluation_seconds_count',
+            'dusty_achievements_unlocked_total{category="completion"}',
+        ):
+            self.assertEqual(self.sample(text, name) - self.sample(before, name), 1, name)
+        self.assertIn('# TYPE dusty_request_duration_seconds histogram', text)
+
+    def test_rolled_back_unlocks_are_not_counted(self):
+        name = 'dusty_achievements_unlocked_total{category="completion"}'
+        before = self.sample(self.scrape(), name)
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError), transaction.atomic():
+            Chore.objects.create(title='Sweep', assignee=self.user, completed_at=timezone.now())
+            self.assertTrue(Achievement.objects.filter(user=self.user, completed=True).exists())
+            raise RuntimeError
+        self.assertEqual(self.sample(self.scrape(), name), before)
+
+    def test_push_sends_are_timed_per_origin(self):
+        subscription = PushSubscription(user=self.user, endpoint='http://127.0.0.1:9/push/abc', p256dh='bad', auth='bad')
+        outcome, _ = WebPushSender(private_key='').send(subscription, {'title': 'Hi'})
+        text = self.scrape()
+        self.assertIn(f'dusty_push_send_seconds_count{{origin="http://127.0.0.1:9",outcome="{outcome}"}}', text)
+
+    def test_totals_are_summed_across_processes(self):
+        name = 'dusty_achievements_unlocked_total{category="fleet-test"}'
+
+        def child():
+            metrics.ACHIEVEMENTS_UNLOCKED.inc(2, category='fleet-test')
+            metrics.registry.flush()
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.ACHIEVEMENTS_UNLOCKED.inc(category='fleet-test')
+            process = multiprocessing.get_context('fork').Process(target=child)
+            process.start()
+            process.join()
+            self.assertEqual(self.sample(metrics.registry.render(), name), 3)
+
+    def test_token_protects_the_endpoint(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+    def test_no_endpoint_without_a_token(self):
+        for overrides in ({'METRICS_TOKEN': None}, {'METRICS_ENABLED': False}):
+            with override_settings(**overrides):
+                self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 404)
+
+
+class DailyRollupTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('roller')
+        cls.other = User.objects.create_user('other-roller')
+        Profile.objects.create(user=cls.user, display_name='Roller')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def table(self):
+        counters = ['created', 'completed', 'completed_late', 'due_pending']
+        return {
+            (row.day, row.assignee_id, row.category, row.priority): {c: getattr(row, c) for c in counters if getattr(row, c)}
+            for row in DailyRollup.objects.all()
+            if any(getattr(row, c) for c in counters)
+        }
+
+    def assertMatchesRebuild(self):
+        self.assertEqual(self.table(), build_rows())
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        now = timezone.now()
+        late = Chore.objects.create(title='Late', assignee=self.user, category='kitchen', priority='high', due_date=now - timezone.timedelta(days=3))
+        early = Chore.objects.create(title='Early', assignee=self.user, category='garden', due_date=now + timezone.timedelta(days=3))
+        Chore.objects.create(title='Nobody', category='kitchen', priority='low')
+        self.assertMatchesRebuild()
+
+        late.completed_at = now
+        late.save()
+        early.completed_at = now - timezone.timedelta(days=1)
+        early.save()
+        early.completed_at = None
+        early.assignee = self.other
+        early.save()
+        self.assertMatchesRebuild()
+
+        ids = [self.client.post('/api/chores/bulk/', {'action': 'create', 'chores': [
+            {'title': f'Bulk {i}', 'assignee_id': self.user.pk, 'category': 'laundry', 'due_date': (now - timezone.timedelta(days=i)).isoformat()}
+            for i in range(4)
+        ]}, format='json').data['results'][i]['id'] for i in range(4)]
+        self.client.post('/api/chores/bulk/', {'action': 'complete', 'ids': ids[:3]}, format='json')
+        self.client.post('/api/chores/bulk/', {'action': 'delete', 'ids': ids[2:]}, format='json')
+        self.assertMatchesRebuild()
+
+        self.other.delete()
+        self.assertMatchesRebuild()
+
+    def test_stats_endpoint_sums_rollups_without_reading_chores(self):
+        now = timezone.now()
+        today = timezone.localdate()
+        for i, (category, priority, days_late) in enumerate([('kitchen', 'high', 2), ('kitchen', 'low', None), ('garden', 'high', None)]):
             Chore.objects.create(
-                title=f'Early Bird Chore {i+1}',
-                assignee=user,
-                completed_at=dt,
-                created_at=dt,
-                updated_at=dt,
-                category='special'
+                title=f'Done {i}', assignee=self.user, category=category, priority=priority, completed_at=now,
+                due_date=now - timezone.timedelta(days=days_late) if days_late else None,
             )
-        # Night Owl: 5 chores after 8pm
+        Chore.objects.create(title='Overdue', assignee=self.user, category='garden', due_date=now - timezone.timedelta(days=2))
+        Chore.objects.create(title='Not mine', category='garden')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/api/stats/?from={today}&to={today}&user=me')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in ctx.captured_queries if 'chores_chore' in query['sql']])
+        totals = response.data['totals']
+        self.assertEqual((totals['created'], totals['completed'], totals['completed_late']), (4, 3, 1))
+        self.assertEqual((totals['pending'], totals['overdue']), (1, 1))
+        self.assertEqual(totals['completion_rate'], 0.75)
+        self.assertEqual(response.data['by_category']['kitchen']['completed'], 2)
+        self.assertEqual(response.data['by_priority']['high']['late_ratio'], 0.5)
+        self.assertEqual(response.data['by_day'], [{'day': today, 'created': 4, 'completed': 3, 'completed_late': 1}])
+
+        self.assertEqual(self.client.get('/api/stats/').data['totals']['created'], 5)
+        self.assertEqual(self.client.get(f'/api/stats/?to={today - timezone.timedelta(days=1)}').data['totals']['created'], 0)
+        self.assertEqual(self.client.get('/api/stats/?from=yesterday').status_code, 400)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(f'/api/stats/?from={today}&to={today}&user=me', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_rebuild_command_restores_the_table(self):
+        Chore.objects.create(title='One', assignee=self.user, completed_at=timezone.now())
+        expected = self.table()
+        DailyRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.table(), expected)
+
+
+class AsyncReadViewTests(TestCase):
+    """The async read views answer like the DRF viewsets they stand in for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async-reader')
+        Profile.objects.create(user=cls.user, display_name='Async Reader')
+        for i in range(3):
+            Chore.objects.create(title=f'Chore {i}', assignee=cls.user)
+        Achievement.objects.create(user=cls.user, title='First Steps', description='One chore', icon='x', category='completion', requirement=1)
+
+    def setUp(self):
+        self.token = f'Bearer {AccessToken.for_user(self.user)}'
+
+    def sync_get(self, path):
+        return self.client.get(f'/api{path}', HTTP_AUTHORIZATION=self.token).json()
+
+    async def async_get(self, path, **headers):
+        return await AsyncClient().get(path, headers={'Authorization': self.token, **headers})
+
+    async def test_reads_match_the_viewsets(self):
+        paths = ['/chores/?page_size=2', '/profiles/me/', '/profiles/leaderboard/', f'/achievements/?user={self.user.pk}']
+        expected = [await sync_to_async(self.sync_get)(path) for path in paths]
+        with override_settings(ROOT_URLCONF='chores.async_urls'):
+            responses = [await self.async_get(path) for path in paths]
+        for path, response, sync_body in zip(paths, responses, expected):
+            self.assertEqual(response.status_code, 200, path)
+            body = response.json()
+            if path.startswith('/chores/'):
+                self.assertIsNotNone(body.pop('next'))
+                sync_body.pop('next')
+            self.assertEqual(body, sync_body, path)
+
+    async def test_unchanged_list_is_answered_with_304(self):
+        with override_settings(ROOT_URLCONF='chores.async_urls'):
+            first = await self.async_get('/chores/')
+            again = await self.async_get('/chores/', **{'If-None-Match': first['ETag']})
+            await Chore.objects.acreate(title='Another', assignee=self.user)
+            changed = await self.async_get('/chores/', **{'If-None-Match': first['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(changed.status_code, 200)
+
+    async def test_requires_a_valid_token(self):
+        with override_settings(ROOT_URLCONF='chores.async_urls'):
+            missing = await AsyncClient().get('/profiles/me/')
+            invalid = await AsyncClient().get('/profiles/me/', headers={'Authorization': 'Bearer nope'})
+        self.assertEqual(missing.status_code, 401)
+        self.assertEqual(invalid.status_code, 401)
+        self.assertIn('Bearer', missing['WWW-Authenticate'])
+
+    async def test_writes_go_to_the_viewset(self):
+        with override_settings(ROOT_URLCONF='chores.async_urls'):
+            response = await AsyncClient().post('/chores/', {'title': 'Posted'}, content_type='application/json', headers={'Authorization': self.token})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Chore.objects.filter(title='Posted').aexists())
+
+    async def test_async_push_sends_report_each_outcome(self):
+        subscriptions = [PushSubscription(user=self.user, endpoint=f'http://127.0.0.1:9/push/{i}', p256dh='bad', auth='bad') for i in range(3)]
+        report = await WebPushSender(private_key='', timeout=2).send_many_async(subscriptions, {'title': 'Hi'})
+        self.assertEqual(report.count(RETRY), 3)
+
+
+class LiveEventTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('live-user')
+        cls.other = User.objects.create_user('live-other')
+        Profile.objects.create(user=cls.user, display_name='Live')
+
+    def setUp(self):
+        self.token = str(AccessToken.for_user(self.user))
+        self.client.force_authenticate(self.user)
+
+    def events(self):
+        return [(event.kind, event.user_id, event.data.get('id')) for event in LiveEvent.objects.order_by('id')]
+
+    def test_chore_changes_and_unlocks_are_published_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            chore_id = self.client.post('/api/chores/', {'title': 'Dishes', 'assignee_id': self.user.pk}, format='json').data['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/chores/{chore_id}/', {'completed_at': timezone.now().isoformat()}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/chores/{chore_id}/')
+        events = self.events()
+        self.assertEqual(events[:3], [
+            ('chore.created', None, chore_id),
+            ('chore.assigned', self.user.pk, chore_id),
+            ('chore.completed', None, chore_id),
+        ])
+        self.assertIn(('achievement.unlocked', None, None), events)
+        self.assertEqual(events[-1], ('chore.deleted', None, chore_id))
+
+    def test_bulk_operations_publish_one_batch(self):
+        chores = [Chore.objects.create(title=f'Bulk {i}') for i in range(3)]
+        LiveEvent.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post('/api/chores/bulk/', {'action': 'reassign', 'ids': [c.pk for c in chores], 'assignee_id': self.other.pk}, format='json')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(sorted(kind for kind, _, _ in self.events()), ['chore.assigned'] * 3 + ['chore.updated'] * 3)
+
+    def test_expired_events_are_pruned_by_the_command_not_on_write(self):
+        stale = LiveEvent.objects.create(kind='chore.created', data={})
+        LiveEvent.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timezone.timedelta(hours=live.RETENTION_HOURS + 1))
+        with self.assertNumQueries(1):
+            live._write([LiveEvent(kind='chore.created', data={})])
+        output = StringIO()
+        call_command('prune_history', stdout=output)
+        self.assertIn('Pruned 1 live events and 0 tombstones', output.getvalue())
+        self.assertFalse(LiveEvent.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(LiveEvent.objects.count(), 1)
+
+    async def read(self, path, count, **headers):
+        """The first `count` messages of a stream, and the stream to keep reading."""
+        with override_settings(ROOT_URLCONF='chores.async_urls'):
+            response = await AsyncClient().get(path, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        return [(await anext(chunks)).decode() for _ in range(count)], chunks
+
+    async def test_stream_resumes_after_the_last_event_id(self):
+        first = await LiveEvent.objects.acreate(kind='chore.created', data={'id': 1})
+        await LiveEvent.objects.acreate(kind='chore.assigned', user=self.other, data={'id': 1})
+        second = await LiveEvent.objects.acreate(kind='chore.assigned', user=self.user, data={'id': 1})
+        messages, chunks = await self.read(f'/events/?token={self.token}', 2, **{'Last-Event-ID': str(first.pk - 1)})
+        self.assertTrue(messages[0].startswith('retry:'))
+        self.assertEqual(messages[1], f'id: {first.pk}\nevent: chore.created\ndata: {{"id":1}}\n\n')
+        self.assertTrue((await anext(chunks)).decode().startswith(f'id: {second.pk}\n'))
+
+        # Then it sleeps until something is published
+        waiting = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0.05)
+        self.assertFalse(waiting.done())
+        await sync_to_async(live._write)([LiveEvent(kind='achievement.unlocked', data={'title': 'x'})])
+        self.assertIn('event: achievement.unlocked', (await asyncio.wait_for(waiting, 5)).decode())
+        await chunks.aclose()
+
+    async def test_resuming_from_pruned_events_asks_for_a_reset(self):
+        for _ in range(3):
+            latest = await LiveEvent.objects.acreate(kind='chore.created', data={})
+        await LiveEvent.objects.filter(id__lt=latest.pk).adelete()
+        messages, chunks = await self.read(f'/events/?token={self.token}&last_event_id={latest.pk - 3}', 2)
+        self.assertEqual(messages[1], f'id: {latest.pk}\nevent: reset\ndata: {{}}\n\n')
+        await chunks.aclose()
+
+    async def test_stream_requires_a_token(self):
+        with override_settings(ROOT_URLCONF='chores.async_urls'):
+            response = await AsyncClient().get('/events/')
+        self.assertEqual(response.status_code, 401)
+
+
+class CachedAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cached-user')
+        self.profile = Profile.objects.create(user=self.user, display_name='Before')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_repeated_requests_skip_the_user_and_profile_queries(self):
+        self.client.get('/api/profiles/me/')
+        with self.assertNumQueries(1):  # the user's account version, with the ETag's data versions
+            response = self.client.get('/api/profiles/me/')
+        self.assertEqual(response.data['display_name'], 'Before')
+
+    def test_saves_and_deactivation_invalidate(self):
+        self.client.get('/api/profiles/me/')
+        self.profile.display_name = 'After'
+        self.profile.save()
+        self.assertEqual(self.client.get('/api/profiles/me/').data['display_name'], 'After')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/profiles/me/').status_code, 401)
+
+    def test_profile_changed_elsewhere_is_refetched(self):
+        self.client.get('/api/profiles/me/')
+        # Another process (or a bulk update) changed it; only the data version tells
+        Profile.objects.filter(pk=self.profile.pk).update(display_name='Elsewhere')
+        versions.bump(versions.PROFILES)
+        self.assertEqual(self.client.get('/api/profiles/me/').data['display_name'], 'Elsewhere')
+
+    def test_deactivation_elsewhere_takes_effect_on_the_next_request(self):
+        self.client.get('/api/profiles/me/')
+        # Another process saved the user: all this one sees is the bumped account version
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        versions.bump(versions.user_account(self.user.pk))
+        self.assertEqual(self.client.get('/api/profiles/me/').status_code, 401)
+
+    def test_cache_is_bounded(self):
+        cache = UserCache(max_size=2, ttl=60)
+        for key in 'abc':
+            cache.put(key, self.user, 0)
+        self.assertIsNone(cache.get('a', 0))
+        self.assertEqual(cache.get('c', 0).pk, self.user.pk)
+        # Filled under an older generation
+        self.assertIsNone(cache.get('c', 1))
+        self.assertNotIn('c', cache)
+
+
+class BootstrapTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('starter')
+        other = User.objects.create_user('housemate')
+        Profile.objects.create(user=self.user, display_name='Starter')
+        Profile.objects.create(user=other, display_name='Housemate')
+        now = timezone.now()
+        self.first = Chore.objects.create(title='Dishes', assignee=self.user, due_date=now)
+        second = Chore.objects.create(title='Laundry', assignee=self.user)
+        second.dependencies.add(self.first)
+        Chore.objects.create(title='Trash', assignee=self.user, completed_at=now)
+        Chore.objects.create(title='Mop', assignee=other)
+        Achievement.objects.create(user=self.user, title='First Steps', description='One chore', icon='x',
+                                   category='completion', requirement=1, progress=1, completed=True, completed_at=now)
+        Achievement.objects.create(user=self.user, title='Chore Master', description='Many chores', icon='x',
+                                   category='completion', requirement=100, progress=1)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_payload(self):
+        data = self.client.get('/api/bootstrap/').data
+        self.assertEqual(data['profile']['display_name'], 'Starter')
+        self.assertEqual([chore['title'] for chore in data['open_chores']], ['Dishes', 'Laundry'])
+        self.assertEqual(data['open_chores'][1]['dependencies'], [self.first.pk])
+        self.assertFalse(data['open_chores_truncated'])
+        self.assertEqual([chore['title'] for chore in data['recent_completions']], ['Trash'])
+        titles = [achievement['title'] for achievement in data['achievements']]
+        self.assertIn('First Steps', titles)
+        self.assertNotIn('Chore Master', titles)
+        self.assertEqual([user['username'] for user in data['users']], ['starter', 'housemate'])
+        self.assertEqual((data['leaderboard']['rank'], data['leaderboard']['completed_chores']), (1, 1))
+
+    def test_fixed_query_count(self):
+        self.client.get('/api/bootstrap/')
         for i in range(5):
-            dt = now.replace(hour=21, minute=0, second=0, microsecond=0) - timezone.timedelta(days=i)
-            Chore.objects.create(
-                title=f'Night Owl Chore {i+1}',
-                assignee=user,
-                completed_at=dt,
-                created_at=dt,
-                updated_at=dt,
-                category='special'
-            )
-        # Weekend Warrior: 10 chores on weekends
-        for i in range(10):
-            # Saturday (6) or Sunday (7)
-            day = 6 if i % 2 == 0 else 7
-            dt = now - timezone.timedelta(days=(now.weekday() - day + i))
-            Chore.objects.create(
-                title=f'Weekend Warrior Chore {i+1}',
-                assignee=user,
-                completed_at=dt,
-                created_at=dt,
-                updated_at=dt,
-                category='special'
-            )
-        # Overdue Hero: 1 overdue chore
-        dt = now - timezone.timedelta(days=2)
-        Chore.objects.create(
-            title='Overdue Hero Chore',
-            assignee=user,
-            completed_at=now,
-            created_at=dt,
-            updated_at=now,
-            due_date=dt,
-            category='special'
-        )
-        self.stdout.write(self.style.SUCCESS(f'Simulated all badge types for {username}.'))
+            Chore.objects.create(title=f'More {i}', assignee=self.user, completed_at=timezone.now() if i % 2 else None)
+            User.objects.create_user(f'extra-{i}')
+        Achievement.objects.filter(user=self.user).update(completed=True)
+        # The versions moved, so the profile and the leaderboard are read again this once
+        with self.assertNumQueries(8):
+            self.client.get('/api/bootstrap/')
+        # Versions, open chores, completions, their dependencies, badges and users
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/bootstrap/')
+        self.assertEqual(len(response.data['open_chores']), 5)
+        self.assertEqual(len(response.data['users']), 7)
+
+    def test_not_modified_until_a_version_moves(self):
+        etag = self.client.get('/api/bootstrap/')['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.first.completed_at = timezone.now()
+        self.first.save()
+        response = self.client.get('/api/bootstrap/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['recent_completions'][0]['title'], 'Dishes')
+
+
+class SQLiteProductionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer')
+        Profile.objects.create(user=cls.user, display_name='Writer')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_connections_get_the_production_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        connection.ensure_connection()
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_completion_and_its_side_effects_commit_together(self):
+        chore = Chore.objects.create(title='Vacuum', assignee=self.user)
+        with mock.patch('chores.signals.unlock_achievements', side_effect=RuntimeError('badges down')):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(f'/api/chores/{chore.pk}/', {'completed_at': timezone.now().isoformat()}, format='json')
+        chore.refresh_from_db()
+        self.assertIsNone(chore.completed_at)
+        self.assertFalse(UserStats.objects.filter(user=self.user, total_completed__gt=0).exists())
+        self.assertEqual(Profile.objects.get(user=self.user).current_streak, 0)
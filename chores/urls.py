@@ -1,5 +1,5 @@
 from rest_framework import routers
-from .views import ChoreViewSet, AchievementViewSet, ProfileViewSet, UserViewSet, PushSubscriptionViewSet
+from .views import metrics_export, ChoreViewSet, AchievementViewSet, ProfileViewSet, UserViewSet, PushSubscriptionViewSet, SyncViewSet, ArchiveViewSet, StatsViewSet, BootstrapViewSet
 from django.urls import path, include
 
 router = routers.DefaultRouter()
@@ -8,7 +8,12 @@ router.register(r'achievements', AchievementViewSet)
 router.register(r'profiles', ProfileViewSet)
 router.register(r'users', UserViewSet)
 router.register(r'push-subscriptions', PushSubscriptionViewSet)
+router.register(r'sync', SyncViewSet, basename='sync')
+router.register(r'archive', ArchiveViewSet, basename='archive')
+router.register(r'stats', StatsViewSet, basename='stats')
+router.register(r'bootstrap', BootstrapViewSet, basename='bootstrap')
 
 urlpatterns = [
+    path('metrics/', metrics_export, name='metrics'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
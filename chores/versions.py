@@ -0,0 +1,175 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import DataVersion
+
+CHORES = 'chores'
+PROFILES = 'profiles'
+ACHIEVEMENTS = 'achievements'
+DEPENDENCIES = 'dependencies'
+# What the leaderboards show: completions, streaks and members (see chores.leaderboard)
+LEADERBOARD = 'leaderboard'
+
+
+def user_achievements(user_id):
+    return f'{ACHIEVEMENTS}:{user_id}'
+
+
+def user_account(user_id):
+    # Bumped by every save or delete of the user or their profile; checked by the authentication cache
+    return f'users:{user_id}'
+
+
+def user_scopes(user_id):
+    """What the authentication cache reads for a user's request: their account version first.
+
+    The rest are there so the request's ETag needs no query of its own.
+    """
+    return [user_account(user_id), user_achievements(user_id), CHORES, PROFILES, ACHIEVEMENTS, DEPENDENCIES, LEADERBOARD]
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_bumps():
+    """Collect the bumps raised inside the block and write each scope once on exit."""
+    if getattr(_deferred, 'scopes', None) is not None:
+        yield
+        return
+    _deferred.scopes = set()
+    try:
+        yield
+        scopes = _deferred.scopes
+    finally:
+        _deferred.scopes = None
+    _bump(scopes)
+
+
+def bump(*scopes):
+    pending = getattr(_deferred, 'scopes', None)
+    if pending is not None:
+        pending.update(scopes)
+    else:
+        _bump(scopes)
+
+
+def _bump(scopes):
+    scopes = sorted(set(scopes))
+    if not scopes:
+        return
+    updated = DataVersion.objects.filter(scope__in=scopes).update(version=F('version') + 1)
+    if updated < len(scopes):
+        # First change to a scope: create it, then count the change
+        existing = set(DataVersion.objects.filter(scope__in=scopes).values_list('scope', flat=True))
+        missing = [scope for scope in scopes if scope not in existing]
+        DataVersion.objects.bulk_create([DataVersion(scope=scope) for scope in missing], ignore_conflicts=True)
+        DataVersion.objects.filter(scope__in=missing).update(version=F('version') + 1)
+
+
+def advance(scope):
+    """Bump one scope right away, even inside deferred_bumps(), and return its new version.
+
+    Run it in a transaction: the version read back is only this bump's while
+    the row stays locked.
+    """
+    _bump([scope])
+    return current([scope])[0]
+
+
+def current(scopes):
+    """Versions of the given scopes, in order; scopes never bumped are at 0."""
+    versions = dict(DataVersion.objects.filter(scope__in=scopes).values_list('scope', 'version'))
+    return [versions.get(scope, 0) for scope in scopes]
+
+
+async def acurrent(scopes):
+    versions = {scope: version async for scope, version in DataVersion.objects.filter(scope__in=scopes).values_list('scope', 'version')}
+    return [versions.get(scope, 0) for scope in scopes]
+
+
+def _etag(request, user, scopes, values, renderer_format):
+    # Handlers can tell from these whether data cached elsewhere is still current
+    request.data_versions = dict(zip(scopes, values))
+    # The URL and user pick out the representation, the versions date it
+    key = '|'.join([
+        request.get_full_path(),
+        str(user.pk),
+        renderer_format,
+        *(f'{scope}={version}' for scope, version in zip(scopes, values)),
+    ])
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def _already_read(user, scopes):
+    # Versions authentication read for this request (see user_scopes), if they cover every scope
+    known = getattr(user, 'data_versions', None) or {}
+    if all(scope in known for scope in scopes):
+        return [known[scope] for scope in scopes]
+    return None
+
+
+def etag_for(request, scopes):
+    renderer_format = getattr(getattr(request, 'accepted_renderer', None), 'format', '') or ''
+    values = _already_read(request.user, scopes)
+    return _etag(request, request.user, scopes, current(scopes) if values is None else values, renderer_format)
+
+
+async def aetag_for(request, user, scopes):
+    """etag_for() for the async views, which only ever render JSON."""
+    values = _already_read(user, scopes)
+    return _etag(request, user, scopes, await acurrent(scopes) if values is None else values, 'json')
+
+
+def not_modified(request, etag):
+    return _matches(etag, request.headers.get('If-None-Match'))
+
+
+def mark_conditional(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _matches(etag, header):
+    if not header:
+        return False
+    # Weak comparison: proxies that re-encode the body weaken the tag
+    return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in parse_etags(header)}
+
+
+class ConditionalGetMixin:
+    """ETags on list and detail responses, answered with a 304 from the version table alone.
+
+    Views list the scopes their payload depends on in `version_scopes` (or
+    override `get_version_scopes`). The versions are read before the data,
+    so a change that races a request only ever makes its ETag stale.
+    """
+    version_scopes = ()
+
+    def get_version_scopes(self):
+        return list(self.version_scopes)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().retrieve, *args, **kwargs)
+
+    def conditional_get(self, request, handler, *args, **kwargs):
+        etag = etag_for(request, self.get_version_scopes())
+        if not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        return mark_conditional(response, etag)
@@ -1,8 +1,13 @@
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
 from rest_framework import viewsets, permissions
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
 from .models import Chore, Achievement, Profile, PushSubscription
-from .serializers import ChoreSerializer, AchievementSerializer, ProfileSerializer, UserSerializer, PushSubscriptionSerializer
+from .serializers import ChoreSerializer, AchievementSerializer, ProfileSerializer, UserSerializer, PushSubscriptionSerializer, BulkChoreOperationSerializer
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
@@ -10,18 +15,43 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
 from rest_framework.parsers import JSONParser
-from .models import send_web_push
+from .push import notify_users
+from .pagination import KeysetCursorPagination
+from .filters import filter_chores
+from .bulk import run_bulk_operation
+from .signals import chore_write_transaction
+from .versions import ConditionalGetMixin
+from .authentication import profile_of
+from . import archive, bootstrap, graph as dependency_graph, leaderboard, metrics, rollups, sync, versions
+
+LEADERBOARD_PAGE_SIZE = 20
+LEADERBOARD_MAX_PAGE_SIZE = 100
 
 # Create your views here.
 
-class ChoreViewSet(viewsets.ModelViewSet):
-    queryset = Chore.objects.all().order_by('-created_at')
+class ChoreViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    # Assignees are joined and dependency ids prefetched, so a page costs a fixed number of queries
+    queryset = Chore.objects.select_related('assignee').prefetch_related(
+        Prefetch('dependencies', queryset=Chore.objects.only('id'))
+    ).order_by('-created_at', '-id')
     serializer_class = ChoreSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetCursorPagination
+    version_scopes = [versions.CHORES]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'ready'):
+            queryset = filter_chores(queryset, self.request.query_params, self.request.user)
+        return queryset
 
     def perform_create(self, serializer):
-        chore = serializer.save()
-        # Notify assignee if assigned
+        dependencies = serializer.validated_data.get('dependencies')
+        if serializer.validated_data.get('completed_at') and dependencies:
+            dependency_graph.check_completable({'new': [dependency.pk for dependency in dependencies]})
+        with chore_write_transaction():
+            chore = serializer.save()
+        # Notify assignee if assigned (delivered by the push_worker command)
         if chore.assignee:
             payload = {
                 'title': 'New Chore Assigned',
@@ -29,38 +59,144 @@ class ChoreViewSet(viewsets.ModelViewSet):
                 'tag': 'chore-assigned',
                 'data': {'chore_id': chore.id}
             }
-            for sub in chore.assignee.push_subscriptions.all():
-                send_web_push(sub, payload)
+            notify_users([chore.assignee_id], payload)
 
     def perform_update(self, serializer):
-        prev = Chore.objects.get(pk=serializer.instance.pk)
-        chore = serializer.save()
+        was_completed = serializer.instance.completed_at is not None
+        self._check_dependencies(serializer.instance, serializer.validated_data, was_completed)
+        with chore_write_transaction():
+            chore = serializer.save()
         # If chore is now completed and was not completed before, notify all admins
-        if chore.completed_at and not prev.completed_at:
-            admins = User.objects.filter(profile__role='admin')
+        if chore.completed_at and not was_completed:
+            profile = Profile.objects.filter(user_id=chore.assignee_id).first() if chore.assignee_id else None
             payload = {
                 'title': 'Chore Completed',
-                'body': f'Chore "{chore.title}" was completed by {chore.assignee.display_name if chore.assignee else "someone"}.',
+                'body': f'Chore "{chore.title}" was completed by {profile.display_name if profile else "someone"}.',
                 'tag': 'chore-completed',
                 'data': {'chore_id': chore.id}
             }
-            for admin in admins:
-                for sub in admin.push_subscriptions.all():
-                    send_web_push(sub, payload)
+            notify_users(User.objects.filter(profile__role='admin'), payload)
+
+    def perform_destroy(self, instance):
+        with chore_write_transaction():
+            instance.delete()
+
+    def _check_dependencies(self, chore, changes, was_completed):
+        # Answered from the cached dependency graph, not the chore table
+        dependencies = changes.get('dependencies')
+        completing = changes.get('completed_at') and not was_completed
+        if dependencies is None and not completing:
+            return
+        graph = dependency_graph.load()
+        if dependencies is not None:
+            dependency_graph.check_acyclic({chore.pk: [dependency.pk for dependency in dependencies]}, graph)
+        if completing:
+            required = [dependency.pk for dependency in dependencies] if dependencies is not None else graph.dependencies_of(chore.pk)
+            dependency_graph.check_completable({chore.pk: required})
+
+    @action(detail=False, methods=['get'])
+    def ready(self, request):
+        """Pending chores whose dependencies are all completed."""
+        return self.conditional_get(request, self._ready)
+
+    def _ready(self, request):
+        queryset = self.get_queryset().filter(completed_at__isnull=True).exclude(pk__in=dependency_graph.blocked_ids())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def blocked(self, request, pk=None):
+        """Pending chores that transitively wait on this one."""
+        return self.conditional_get(request, self._blocked, pk=pk)
+
+    def _blocked(self, request, pk=None):
+        chore = self.get_object()
+        blocked = dependency_graph.load().blocked_by(chore.pk) if not chore.completed_at else ()
+        chores = self.get_queryset().filter(pk__in=blocked, completed_at__isnull=True)
+        return Response(self.get_serializer(chores, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='critical-path')
+    def critical_path(self, request):
+        """The longest chain of pending chores, dependencies first; ?chore=<id> ends it at that chore."""
+        return self.conditional_get(request, self._critical_path)
+
+    def _critical_path(self, request):
+        end = request.query_params.get('chore')
+        if end is not None and not end.isdigit():
+            return Response({'detail': 'chore must be a chore id.'}, status=status.HTTP_400_BAD_REQUEST)
+        graph = dependency_graph.load()
+        chain = graph.longest_chain(dependency_graph.pending_ids(graph.nodes), int(end) if end else None)
+        chores = self.get_queryset().in_bulk(chain)
+        return Response({
+            'length': len(chain),
+            'results': self.get_serializer([chores[pk] for pk in chain if pk in chores], many=True).data,
+        })
 
-class AchievementViewSet(viewsets.ModelViewSet):
-    queryset = Achievement.objects.all()
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        operation = BulkChoreOperationSerializer(data=request.data)
+        operation.is_valid(raise_exception=True)
+        affected = run_bulk_operation(**operation.validated_data)
+        response = {'action': operation.validated_data['action'], 'count': len(affected)}
+        if operation.validated_data['action'] == 'delete':
+            response['deleted'] = affected
+        else:
+            chores = self.get_queryset().filter(pk__in=affected)
+            response['results'] = self.get_serializer(chores, many=True).data
+        return Response(response)
+
+class AchievementViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    queryset = Achievement.objects.select_related('user')
     serializer_class = AchievementSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class ProfileViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user_id = self._user_filter()
+        if self.action == 'list' and user_id is not None:
+            queryset = queryset.filter(user_id=user_id)
+        return queryset
+
+    def get_version_scopes(self):
+        user_id = self._user_filter()
+        if self.action == 'list' and user_id is not None:
+            return [versions.user_achievements(user_id)]
+        return [versions.ACHIEVEMENTS]
+
+    def _user_filter(self):
+        # The web client asks for ?user=<id> to get one user's badges
+        user_id = self.request.query_params.get('user', '')
+        return int(user_id) if user_id.isdigit() else None
+
+def leaderboard_payload(request, window, board):
+    """The leaderboard response body for a board; raises ValueError on a bad page or page_size."""
+    if 'page' not in request.query_params and 'page_size' not in request.query_params:
+        # Unpaginated callers get the plain ranked list
+        return leaderboard.page(window, board=board)[1]
+    page = max(int(request.query_params.get('page', 1)), 1)
+    page_size = min(max(int(request.query_params.get('page_size', LEADERBOARD_PAGE_SIZE)), 1), LEADERBOARD_MAX_PAGE_SIZE)
+    total, entries = leaderboard.page(window, (page - 1) * page_size, page_size, board=board)
+    return {
+        'window': window,
+        'count': total,
+        'page': page,
+        'page_size': page_size,
+        'results': entries,
+        'me': leaderboard.rank_of(window, request.user.id, board=board),
+    }
+
+class ProfileViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    version_scopes = [versions.PROFILES]
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
-        profile = self.get_queryset().filter(user=request.user).first()
+        return self.conditional_get(request, self._me)
+
+    def _me(self, request):
+        profile = profile_of(request.user, request.data_versions.get(versions.PROFILES))
         if profile:
             serializer = self.get_serializer(profile)
             return Response(serializer.data)
@@ -68,23 +204,103 @@ class ProfileViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='leaderboard')
     def leaderboard(self, request):
-        # Aggregate chores completed per user
-        profiles = self.get_queryset()
-        leaderboard = []
-        for profile in profiles:
-            user_chores = Chore.objects.filter(assignee=profile.user)
-            completed_count = user_chores.filter(completed_at__isnull=False).count()
-            # Placeholder for streak (to be implemented later)
-            leaderboard.append({
-                'user_id': profile.user.id,
-                'username': profile.user.username,
-                'display_name': profile.display_name,
-                'completed_chores': completed_count,
-                'streak': 0,  # To be implemented
-            })
-        # Sort by completed_chores descending
-        leaderboard.sort(key=lambda x: x['completed_chores'], reverse=True)
-        return Response(leaderboard)
+        window = self._leaderboard_window(request)
+        if window is None:
+            return Response({'detail': f'Unknown window. Use one of: {", ".join(leaderboard.WINDOWS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Authentication may have read the leaderboard version already
+            board = leaderboard.get_board(window, getattr(request.user, 'data_versions', None))
+            return Response(leaderboard_payload(request, window, board))
+        except ValueError:
+            return Response({'detail': 'page and page_size must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'], url_path='leaderboard/me')
+    def leaderboard_me(self, request):
+        window = self._leaderboard_window(request)
+        if window is None:
+            return Response({'detail': f'Unknown window. Use one of: {", ".join(leaderboard.WINDOWS)}.'}, status=status.HTTP_400_BAD_REQUEST)
+        entry = leaderboard.rank_of(window, request.user.id, leaderboard.get_board(window, getattr(request.user, 'data_versions', None)))
+        if entry is None:
+            return Response({'detail': 'Profile not found.'}, status=404)
+        return Response(dict(entry, window=window))
+
+    def _leaderboard_window(self, request):
+        window = request.query_params.get('window', leaderboard.DEFAULT_WINDOW)
+        return window if window in leaderboard.WINDOWS else None
+
+class SyncViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        try:
+            limit = int(request.query_params.get('limit', sync.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({'detail': 'limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.changes_since(
+            request.user, request.query_params.get('since'), limit, context={'request': request}
+        ))
+
+class ArchiveViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        return Response(archive.archive_stats(request.user))
+
+class StatsViewSet(ConditionalGetMixin, viewsets.ViewSet):
+    """Household or per-user statistics for a date range, summed from the daily rollups.
+
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD bound the range (both optional, inclusive);
+    ?user=me or ?user=<id> narrows it to one assignee, ?user=unassigned to nobody's.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    version_scopes = [versions.CHORES]
+
+    def list(self, request):
+        return self.conditional_get(request, self._stats)
+
+    def _stats(self, request):
+        try:
+            start, end = (self._date(request, name) for name in ('from', 'to'))
+        except ValueError as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.query_params.get('user')
+        if user is None or user == '':
+            assignee_id = None
+        elif user == 'me':
+            assignee_id = request.user.pk
+        elif user == 'unassigned':
+            assignee_id = 0
+        elif user.isdigit():
+            assignee_id = int(user)
+        else:
+            return Response({'detail': 'user must be "me", "unassigned" or a user id.'}, status=status.HTTP_400_BAD_REQUEST)
+        if start and end and start > end:
+            return Response({'detail': '"from" must not be after "to".'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(rollups.summarize(start, end, assignee_id))
+
+    def _date(self, request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'"{name}" must be a date (YYYY-MM-DD).')
+        return parsed
+
+class BootstrapViewSet(ConditionalGetMixin, viewsets.ViewSet):
+    """The caller's profile, chores, badges, household and rank in one round trip (see chores.bootstrap)."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_version_scopes(self):
+        return bootstrap.version_scopes(self.request.user)
+
+    def list(self, request):
+        return self.conditional_get(request, self._bootstrap)
+
+    def _bootstrap(self, request):
+        return Response(bootstrap.build(request.user, request.data_versions, context={'request': request}))
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
@@ -118,3 +334,17 @@ class PushSubscriptionViewSet(viewsets.ModelViewSet):
             sub.save()
         serializer = self.get_serializer(sub)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+def metrics_export(request):
+    """Prometheus text exposition of chores.metrics, summed over every worker process.
+
+    Scrapers send METRICS_TOKEN as a bearer token. Without one configured, or with
+    metrics turned off, there is no endpoint.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token or not getattr(settings, 'METRICS_ENABLED', True):
+        return HttpResponse('Not Found\n', status=404, content_type='text/plain')
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dusty_backend.settings')
+# Under ASGI the hot read endpoints are served by async views unless turned off
+os.environ.setdefault('DUSTY_ASYNC_READ_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -48,6 +48,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so it sees every query; removes itself unless QUERY_INSTRUMENTATION is on
+    'chores.middleware.QueryInstrumentationMiddleware',
+    'chores.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +61,22 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# Per-request SQL counts and timings as Server-Timing headers, plus slow request and N+1 logging
+QUERY_INSTRUMENTATION = os.environ.get('DUSTY_QUERY_INSTRUMENTATION', 'False') == 'True'
+QUERY_LOG_MIN_MS = int(os.environ.get('DUSTY_QUERY_LOG_MIN_MS', '500'))
+QUERY_LOG_MAX_QUERIES = int(os.environ.get('DUSTY_QUERY_LOG_MAX_QUERIES', '50'))
+QUERY_REPEAT_THRESHOLD = int(os.environ.get('DUSTY_QUERY_REPEAT_THRESHOLD', '5'))
+
+# Serve the hottest reads from async views (chores/async_views.py); asgi.py turns this on
+ASYNC_READ_VIEWS = os.environ.get('DUSTY_ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Request, completion and push metrics at /api/metrics/, served only to scrapers sending
+# METRICS_TOKEN as a bearer token. Point METRICS_DIR at a directory shared by the worker
+# processes (and emptied on deploy) to export fleet-wide totals.
+METRICS_ENABLED = os.environ.get('DUSTY_METRICS', 'True') == 'True'
+METRICS_DIR = os.environ.get('DUSTY_METRICS_DIR') or None
+METRICS_TOKEN = os.environ.get('DUSTY_METRICS_TOKEN') or None
+
 ROOT_URLCONF = 'dusty_backend.urls'
 
 TEMPLATES = [
@@ -82,10 +101,27 @@ WSGI_APPLICATION = 'dusty_backend.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 if os.environ.get('USE_SQLITE', 'True') == 'True':
+    # Set on every new connection. WAL lets readers run alongside the writer, and
+    # writers queue for up to busy_timeout ms instead of failing with "database is locked"
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'busy_timeout': int(os.environ.get('DUSTY_SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        # Durable across process crashes; a power cut can lose the last commits, never corrupt
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('DUSTY_SQLITE_MMAP_MB', '256')) * 1024 * 1024,
+        # Negative sizes are in KiB
+        'cache_size': -int(os.environ.get('DUSTY_SQLITE_CACHE_MB', '64')) * 1024,
+    }
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Transactions take the write lock when they begin. A deferred one that
+                # reads first fails outright when it can't upgrade, busy_timeout or not.
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
         }
     }
 else:
@@ -146,13 +182,19 @@ CORS_ALLOW_ALL_ORIGINS = True  # For development only
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # simplejwt's JWTAuthentication, remembering the user behind each token
+        'chores.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
 }
 
+# How long a process may keep serving a token's user (and profile) from memory.
+# Saves in the same process invalidate at once; other processes only after this.
+AUTH_CACHE_TTL_SECONDS = int(os.environ.get('DUSTY_AUTH_CACHE_TTL_SECONDS', '60'))
+AUTH_CACHE_SIZE = int(os.environ.get('DUSTY_AUTH_CACHE_SIZE', '10000'))
+
 # Increase JWT access token lifetime to 24 hours
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -162,3 +204,4 @@ SIMPLE_JWT = {
 
 VAPID_PUBLIC_KEY = os.environ.get('VAPID_PUBLIC_KEY')
 VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY')
+VAPID_SUBJECT = os.environ.get('VAPID_SUBJECT', 'mailto:admin@example.com')
@@ -252,9 +252,16 @@ const AppContent: React.FC = () => {
     if (!currentUser) return;
     setChoresLoading(true);
     try {
-      const response = await axios.get('http://localhost:8000/api/chores/');
+      // The chore list is cursor-paginated; follow `next` until the last page
+      const allChores: any[] = [];
+      let url: string | null = 'http://localhost:8000/api/chores/?page_size=200';
+      while (url) {
+        const response: { data: { next: string | null; results: any[] } } = await axios.get(url);
+        allChores.push(...response.data.results);
+        url = response.data.next;
+      }
       // Map backend fields to frontend camelCase
-      const mappedChores = response.data.map((chore: any) => ({
+      const mappedChores = allChores.map((chore: any) => ({
         ...chore,
         dueDate: chore.due_date,
         completedAt: chore.completed_at,
@@ -531,56 +538,8 @@ const AppContent: React.FC = () => {
     try {
       await axios.patch(`http://localhost:8000/api/chores/${choreId}/`, { completed_at: new Date().toISOString() });
       setChores(prev => prev.map(c => c.id === choreId ? { ...c, completedAt: new Date().toISOString() } : c));
-      // Find the completed chore
-      let completedChore = chores.find(c => c.id === choreId);
-      // If recurring, create the next instance
-      if (completedChore && completedChore.isRecurring && completedChore.recurrencePattern && completedChore.dueDate) {
-        // Fetch the latest version from the backend to get the correct assignee
-        try {
-          const { data: updatedChore } = await axios.get(`http://localhost:8000/api/chores/${choreId}/`);
-          completedChore = { ...completedChore, assigneeId: updatedChore.assignee_id };
-        } catch (err) {
-          // If fetch fails, fallback to local state
-        }
-        // Fix: ensure dueDate is a string before passing to new Date()
-        const dueDateStr = completedChore.dueDate || '';
-        let nextDueDate = dueDateStr ? new Date(dueDateStr) : new Date();
-        switch (completedChore.recurrencePattern) {
-          case 'daily':
-            nextDueDate.setDate(nextDueDate.getDate() + 1);
-            break;
-          case 'weekly':
-            nextDueDate.setDate(nextDueDate.getDate() + 7);
-            break;
-          case 'monthly':
-            nextDueDate.setMonth(nextDueDate.getMonth() + 1);
-            break;
-          default:
-            break;
-        }
-        // Format as YYYY-MM-DD
-        const nextDueDateStr = nextDueDate.toISOString().split('T')[0];
-        // Create new chore instance
-        const newChorePayload = {
-          title: completedChore.title,
-          description: completedChore.description,
-          assignee_id: completedChore.assigneeId ? Number(completedChore.assigneeId) : null,
-          due_date: nextDueDateStr + 'T20:00:00',
-          is_recurring: true,
-          recurrence_pattern: completedChore.recurrencePattern,
-          priority: completedChore.priority,
-          category: completedChore.category,
-          dependencies: completedChore.dependencies,
-          blocks_others: completedChore.blocksOthers,
-        };
-        try {
-          const resp = await axios.post('http://localhost:8000/api/chores/', newChorePayload);
-        } catch (err) {
-        }
-        fetchChores();
-      } else {
-        fetchChores();
-      }
+      // The server rolls recurring chores over to their next occurrence once they come due
+      fetchChores();
       // Fetch achievements and show notification for new ones
       const achievements = await fetchAchievements();
       const unlocked = achievements.filter((a: any) => a.completed && !a.notified);
@@ -591,7 +550,7 @@ const AppContent: React.FC = () => {
     } catch (err) {
       // Handle error
     }
-  }, [fetchChores, chores, fetchAchievements]);
+  }, [fetchChores, fetchAchievements]);
 
   const handleChoreClaim = useCallback(async (choreId: string) => {
     if (!currentUser) return;
@@ -1,4 +1,7 @@
 // Remove FirestoreService and DataArchivingService imports and usage. Implement optimization/archiving with Django API if needed.
+import axios from 'axios';
+
+const API_URL = 'http://localhost:8000/api/';
 
 export class DatabaseOptimizationService {
   private static instance: DatabaseOptimizationService;
@@ -81,15 +84,18 @@ export class DatabaseOptimizationService {
       }
     }
 
-    // Execute query
+    // Execute query (filtered and paginated server-side)
     const startTime = Date.now();
-    // Mock data for now, as FirestoreService is removed
+    const params: Record<string, string | number> = {};
+    if (queryOptions.assigneeId) params.assigneeId = queryOptions.assigneeId;
+    if (queryOptions.status) params.status = queryOptions.status;
+    if (queryOptions.priority) params.priority = queryOptions.priority;
+    if (queryOptions.category) params.category = queryOptions.category;
+    if (queryOptions.limit) params.limit = queryOptions.limit;
+    const response = await axios.get(`${API_URL}chores/`, { params });
     const result = {
-      chores: [
-        { id: '1', title: 'Task 1', assigneeId: 'user1', status: 'pending', priority: 'low', category: 'work' },
-        { id: '2', title: 'Task 2', assigneeId: 'user2', status: 'completed', priority: 'medium', category: 'home' },
-      ],
-      lastDoc: null,
+      chores: response.data.results,
+      lastDoc: response.data.next,
     };
     const queryTime = Date.now() - startTime;
 
@@ -168,24 +174,29 @@ export class DatabaseOptimizationService {
    * Schedule automatic data archiving
    */
   async scheduleDataArchiving(): Promise<void> {
-    try {
-      // Mock archiving for now, as DataArchivingService is removed
-      console.log('Data archiving scheduled successfully (mock)');
-    } catch (error) {
-      console.error('Failed to schedule data archiving:', error);
-    }
+    // Archiving runs on the server (`python manage.py archive_chores`); nothing to do client-side
   }
 
   /**
    * Get archive statistics
    */
   async getArchiveStats(): Promise<any> {
-    // Mock archive stats for now
-    return {
-      totalArchived: 0,
-      lastArchived: null,
-      totalSize: 0,
-    };
+    try {
+      const response = await axios.get(`${API_URL}archive/stats/`);
+      return {
+        totalArchived: response.data.archived_chores,
+        lastArchived: response.data.last_archived_at,
+        totalSize: response.data.compressed_bytes,
+        ...response.data,
+      };
+    } catch (error) {
+      console.error('Failed to load archive stats:', error);
+      return {
+        totalArchived: 0,
+        lastArchived: null,
+        totalSize: 0,
+      };
+    }
   }
 
   // ===== PERFORMANCE MONITORING =====